@@ -28,11 +28,7 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from os.path import abspath, join, split
-from sys     import path
-
-# Setup package directories
-(head, _) = split(abspath(__file__)) # removes __init__.py part
-(head, _) = split(head)              # removes odl part
-path.append(join(head, "ply"))       # add ply module
-path.append(join(head, "pyth"))      # add pyth module
+"""Parsing of the odl descriptions of Artisan exports, extraction of the
+models they describe, and generation of synthetic exports; the ply module,
+and for some RTF texts the pyth module, must be importable
+"""
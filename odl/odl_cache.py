@@ -0,0 +1,224 @@
+# Copyright (c) 2011, 2012, Jeroen Ketema, University of Twente
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+#  * Neither the name of the University of Twente nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Disk cache for data derived from exports, such as parsed odl models
+"""
+
+from hashlib  import sha1
+from os       import close, fdopen, listdir, makedirs, remove, rename, stat, \
+    utime
+from os.path  import isdir, isfile, join
+from tempfile import mkstemp
+
+from odl.odl_messages import stderr
+
+class OdlCache(object):
+    """Directory of cached data, each entry stored in a file named after its
+    key; the total size of the entries is bounded, and when it is exceeded
+    the least recently used entries are removed
+
+    Entries are written to a temporary file that is then renamed, so that
+    several processes can use the same cache directory at the same time:
+    they either see a complete entry or none at all
+
+    The total size is only determined by listing the directory when the
+    entries written since exceed the maximum size, and entries are then
+    removed until the cache is a tenth below its maximum size, so that
+    storing many small entries does not list the directory for each
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size  = max_size
+        self.size      = None # Total size of the entries, as last listed
+                              # and increased by the entries written since
+
+        if not isdir(directory):
+            try:
+                makedirs(directory)
+            except OSError:
+                if not isdir(directory): # Not created by another process
+                    raise
+
+    def Key(self, *parts):
+        """Returns the key for the given strings
+        """
+
+        digest = sha1()
+
+        for part in parts:
+            digest.update(str(len(part)) + ":" + part)
+
+        return digest.hexdigest()
+
+    def Get(self, key):
+        """Returns the data stored for the given key, or None if there is no
+        such data
+        """
+
+        file_name = join(self.directory, key)
+
+        try:
+            f = open(file_name, 'rb')
+        except IOError:
+            return None
+
+        data = f.read()
+        f.close()
+
+        try:
+            utime(file_name, None) # Mark the entry as recently used
+        except OSError:
+            pass                   # Removed in the meantime
+
+        return data
+
+    def Put(self, key, data):
+        """Stores data under the given key, removing the least recently used
+        entries when the cache has grown too large
+        """
+
+        if len(data) > self.max_size:
+            return
+
+        (fd, temp_name) = mkstemp(dir = self.directory, prefix = ".tmp")
+
+        try:
+            f = fdopen(fd, 'wb')
+        except OSError:
+            close(fd)
+            remove(temp_name)
+            raise
+
+        try:
+            f.write(data)
+            f.close()
+            rename(temp_name, join(self.directory, key))
+        except (IOError, OSError):
+            try:
+                remove(temp_name)
+            except OSError:
+                pass
+
+            if not isfile(join(self.directory, key)): # Not written by
+                                                      # another process
+                stderr.write("Warning: cannot write to cache directory " \
+                                 + self.directory + "\n")
+
+            return
+
+        if self.size != None:
+            self.size += len(data)
+
+        if self.size == None or self.size > self.max_size:
+            self.Evict()
+
+    def Evict(self):
+        """Removes the least recently used entries until the cache is a tenth
+        below its maximum size
+        """
+
+        entries = []
+        total   = 0
+
+        for name in listdir(self.directory):
+            if name.startswith(".tmp"):
+                continue
+
+            try:
+                info = stat(join(self.directory, name))
+            except OSError:
+                continue # Removed by another process
+
+            entries.append((info.st_mtime, name, info.st_size))
+            total += info.st_size
+
+        entries.sort()
+
+        for (_, name, size) in entries:
+            if total <= self.max_size - self.max_size // 10:
+                break
+
+            try:
+                remove(join(self.directory, name))
+            except OSError:
+                pass     # Removed by another process
+
+            total -= size
+
+        self.size = total
+
+class OdlMemoryCache(OdlCache):
+    """Cache with the same entries as OdlCache, but kept in memory, for a
+    process that converts the same export many times; its total size is
+    bounded in the same way
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries  = {}
+        self.clock    = 0
+        self.size     = 0
+
+    def Get(self, key):
+        entry = self.entries.get(key)
+
+        if entry == None:
+            return None
+
+        self.clock += 1
+        entry[0]    = self.clock
+        return entry[1]
+
+    def Put(self, key, data):
+        if len(data) > self.max_size:
+            return
+
+        if key in self.entries:
+            self.size -= len(self.entries[key][1])
+
+        self.clock += 1
+        self.entries[key] = [self.clock, data]
+        self.size += len(data)
+
+        if self.size > self.max_size:
+            self.Evict()
+
+    def Evict(self):
+        entries = [(used, key, len(data)) \
+                       for (key, (used, data)) in self.entries.items()]
+        entries.sort()
+
+        for (_, key, size) in entries:
+            if self.size <= self.max_size - self.max_size // 10:
+                break
+
+            del self.entries[key]
+            self.size -= size
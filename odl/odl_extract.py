@@ -28,21 +28,22 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from pyth.plugins.rtf15.reader     import Rtf15Reader
-from pyth.plugins.plaintext.writer import PlaintextWriter
-
-from os.path  import join
+from hashlib  import sha1
+from os       import listdir
+from os.path  import exists, join
+from re       import compile
 from StringIO import StringIO
-from sys      import stderr
-from uuid     import uuid4
+from time     import time
 from zipfile  import ZipFile
 
-destroy_event_id = str(uuid4())
+from odl.odl_messages import stderr
 
 class OdlExtractException(Exception):
     pass
 
-class PackageData:
+class PackageData(object):
+    __slots__ = ["name", "ident", "is_child", "child_id", "children"]
+
     def __init__(self):
         self.name     = None
         self.ident    = None
@@ -50,7 +51,10 @@ class PackageData:
         self.child_id = []
         self.children = []
 
-class TransitionData:
+class TransitionData(object):
+    __slots__ = ["ident", "source", "target", "event", "event_id", "action",
+                 "guard", "guard_id", "class_id"]
+
     def __init__(self):
         self.ident    = None
         self.source   = None
@@ -62,7 +66,9 @@ class TransitionData:
         self.guard_id = None
         self.class_id = None
 
-class AssociationData:
+class AssociationData(object):
+    __slots__ = ["owner", "upper", "lower", "name", "role"]
+
     def __init__(self):
         self.owner = [None, None]
         self.upper = [None, None]
@@ -70,7 +76,10 @@ class AssociationData:
         self.name  = [None, None]
         self.role  = [None, None]
 
-class StateData:
+class StateData(object):
+    __slots__ = ["vtype", "name", "class_id", "substates", "is_parallel",
+                 "superstate"]
+
     def __init__(self):
         self.vtype       = "uml:State"
         self.name        = None
@@ -79,7 +88,9 @@ class StateData:
         self.is_parallel = False
         self.superstate  = None
 
-class AttributeData:
+class AttributeData(object):
+    __slots__ = ["name", "ident", "default", "kind", "type"]
+
     def __init__(self):
         self.name    = None
         self.ident   = None
@@ -87,70 +98,68 @@ class AttributeData:
         self.kind    = None
         self.type    = None
 
-class ParameterData:
+class ParameterData(object):
+    __slots__ = ["name", "kind", "type"]
+
     def __init__(self):
         self.name = None
         self.kind = None
         self.type = None
 
-class EnumeratedTypeData:
+class EnumeratedTypeData(object):
+    __slots__ = ["name", "literals"]
+
     def __init__(self):
         self.name     = None
         self.literals = []
 
-class EnumeratedLiteralData:
+class EnumeratedLiteralData(object):
+    __slots__ = ["name", "ident"]
+
     def __init__(self):
         self.name  = None
         self.ident = None
 
 def GetVersion(data):
-    version = None
-
-    for data_item in data[1]:
-        if data_item[0] == "Version":
-            if version == None:
-                version = data_item
-            else:
-                raise OdlExtractException("Multiple versions found for item")
+    if data.versions > 1:
+        raise OdlExtractException("Multiple versions found for item")
 
-    if version == None:
+    if data.version == None:
         raise OdlExtractException("No version data found")
-    else:
-        return version
+
+    return data.version
+
+def GetVersionAttributes(data):
+    GetVersion(data) # Rejects objects without a single version
+
+    return data.attributes
 
 def GetId(data):
-    for item in data:
-        if item[0] == "Attribute" \
-                and item[1] == "_Art1_Id":
-            return item[2][0]
+    if "_Art1_Id" in data.object_attributes:
+        return data.object_attributes["_Art1_Id"][0]
 
     raise OdlExtractException("No model identifier found")
 
 def GetModel(odl_data):
-    for ident in odl_data:
-        if odl_data[ident][0] == "_Art1_Model":
-            model_id = GetId(odl_data[ident][1])
-            name = ident.replace(' ', '_').replace('-', '_').replace('&', "and")
-            return (model_id, name)
+    for ident in odl_data.ObjectsOfType("_Art1_Model"):
+        model_id = GetId(odl_data[ident])
+        name = ident.replace(' ', '_').replace('-', '_').replace('&', "and")
+        return (model_id, name)
 
     raise OdlExtractException("No model name found")
 
 def GetName(data):
-    version = GetVersion(data)
-    return version[1][6:].replace(' ', '_') \
+    return GetVersion(data)[6:].replace(' ', '_') \
         .replace('-', '_').replace('&', "and")
 
 def GetNamePlain(data):
-    version = GetVersion(data)
-    return version[1][6:]
+    return GetVersion(data)[6:]
 
 def GetConstruction(data):
-    version = GetVersion(data)
+    attributes = GetVersionAttributes(data)
 
-    for item in version[2]:
-        if item[0] == "Attribute" \
-                and item[1] == "_Art1_Construction":
-            return item[2][0]
+    if "_Art1_Construction" in attributes:
+        return attributes["_Art1_Construction"][0]
 
     raise OdlExtractException("Construction type not found")
 
@@ -160,145 +169,83 @@ def GetClasses(odl_data, used_classes):
 
     classes = {}
 
-    for ident in odl_data:
-        if odl_data[ident][0] == "_Art1_Class":
-            if ident in classes:
-                raise OdlExtractException("Class defined multiple times")
+    for ident in odl_data.ObjectsOfType("_Art1_Class"):
+        if ident in classes:
+            raise OdlExtractException("Class defined multiple times")
 
-            if used_classes != None and ident not in used_classes:
-                continue
+        if used_classes != None and ident not in used_classes:
+            continue
 
-            classes[ident] = GetName(odl_data[ident])
+        classes[ident] = GetName(odl_data[ident])
 
     return classes
 
-def GetGeneralizations(version, general, ident):
-    for data in version[2]:
-        if data[0] == "Relationship" \
-                and data[1] == "_Art1_Class_To_Generalization" \
-                and data[2] == "_Art1_Generalization":
-            general[data[3]] = ident
-
-    return general
-
-def GetSpecializations(version, special, ident):
-    special[ident] = []
-
-    for data in version[2]:
-        if data[0] == "Relationship" \
-                and data[1] == "_Art1_Class_To_Specialization" \
-                and data[2] == "_Art1_Specialization":
-            special[ident].append(data[3])
-
-    return special
-
-def GetSpecialInGeneral(version, special_gen, ident):
-    for data in version[2]:
-        if data[0] == "Relationship" \
-                and data[1] == "_Art1_Generalization_To_Specialization" \
-                and data[2] == "_Art1_Specialization":
-            special_gen[data[3]] = ident
-
-    return special_gen
-
 def GetSuperClasses(odl_data, classes):
-    general = {}
-    special = {}
-
-    for ident in classes:
-        version = GetVersion(odl_data[ident])
-        general = GetGeneralizations(version, general, ident)
-        special = GetSpecializations(version, special, ident)
-
-    special_gen = {}
-
-    for ident in odl_data:
-        if odl_data[ident][0] == "_Art1_Generalization":
-            version = GetVersion(odl_data[ident])
-            special_gen = GetSpecialInGeneral(version, special_gen, ident)
-
     super_classes = {}
 
-    for ident in special:
+    for ident in classes:
         super_classes[ident] = {}
 
-        for special_ident in special[ident]:
+        for special_ident in odl_data.Targets(ident, \
+                "_Art1_Class_To_Specialization", "_Art1_Specialization"):
             super_classes[ident][special_ident] = \
-                general[special_gen[special_ident]]
+                GetGeneralClass(special_ident, odl_data, classes)
 
     return super_classes
 
-def GetAttributeIds(version, attrib_ids, ident):
-    attrib_ids[ident] = []
-
-    for data in version[2]:
-        if data[0] == "Relationship" \
-                and data[1] == "_Art1_Class_To_Attribute" \
-                and data[2] == "_Art1_Attribute":
-            attrib_ids[ident].append(data[3])
+def GetGeneralClass(ident, odl_data, classes):
+    general = None
 
-    return attrib_ids
+    for general_ident in odl_data.Sources(ident, \
+            "_Art1_Generalization_To_Specialization"):
+        for class_ident in odl_data.Sources(general_ident, \
+                "_Art1_Class_To_Generalization"):
+            if class_ident in classes:
+                general = class_ident
 
-def IsDefaultValue(version):
-    for data in version[2]:
-        if data[0] == "Attribute" \
-                and data[1] == "_Art1_CustomPropertyName" \
-                and data[2][0] == "Default Value":
-            return True
+    if general == None:
+        raise OdlExtractException("No general class found for " \
+                                      + "specialization " + ident)
 
-    return False
+    return general
 
-def GetDefaultValue(ident, odl_data, source):
-    version = GetVersion(odl_data[ident])
+def IsDefaultValue(data):
+    name = GetVersionAttributes(data).get("_Art1_CustomPropertyName")
 
-    for data in version[2]:
-        if data[0] == "Relationship" \
-                and data[1] == "_Art1_ModelObject_To_CustomPropertyTextObject" \
-                and data[2] == "_Art1_CustomPropertyTextObject":
-            custom_version = GetVersion(odl_data[data[3]])
+    return name != None and name[0] == "Default Value"
 
-            if IsDefaultValue(custom_version):
-                return GetExternal(custom_version, odl_data, source)
+def GetDefaultValue(ident, odl_data, decoder, class_id):
+    for custom_ident in odl_data.Targets(ident, \
+            "_Art1_ModelObject_To_CustomPropertyTextObject", \
+            "_Art1_CustomPropertyTextObject"):
+        if IsDefaultValue(odl_data[custom_ident]):
+            return GetExternal(custom_ident, odl_data, decoder, class_id)
 
     return None
 
 def GetKindAndType(ident, odl_data):
-    version = GetVersion(odl_data[ident])
-
-    for data in version[2]:
-        if data[0] == "Relationship":
-            if data[1] == "_Art1_TypedAttribute_To_DataType" \
-                    or data[1] == "_Art1_TypedParameter_To_DataType":
-                return (data[2], data[3])
+    for (name, kind, target) in odl_data[ident].relationships:
+        if name == "_Art1_TypedAttribute_To_DataType" \
+                or name == "_Art1_TypedParameter_To_DataType":
+            return (kind, target)
 
     return (None, None)
 
-def GetAttributes(odl_data, classes, source):
+def GetAttributes(odl_data, classes, decoder):
     """Yields dictionary from class identifer to attribute data
     """
 
-    attrib_ids = {}
-
-    for ident in classes:
-        version    = GetVersion(odl_data[ident])
-        attrib_ids = GetAttributeIds(version, attrib_ids, ident)
-
-    names = {}
-
-    for ident in odl_data:
-        if odl_data[ident][0] == "_Art1_Attribute":
-            names[ident] = GetName(odl_data[ident])
-
     attributes = {}
 
-    for ident in attrib_ids:
+    for ident in classes:
         attributes[ident] = []
 
-        for attrib_id in attrib_ids[ident]:
+        for attrib_id in odl_data.Targets(ident, "_Art1_Class_To_Attribute", \
+                                              "_Art1_Attribute"):
             data         = AttributeData()
-            data.name    = names[attrib_id]
+            data.name    = GetName(odl_data[attrib_id])
             data.ident   = attrib_id
-            data.default = GetDefaultValue(attrib_id, odl_data, source)
+            data.default = GetDefaultValue(attrib_id, odl_data, decoder, ident)
             (data.kind, data.type) \
                          = GetKindAndType(attrib_id, odl_data)
 
@@ -336,82 +283,64 @@ def ParseMultiplicity(index, multiplicity, association):
 def GetAssociations(odl_data, classes):
     associations = {}
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Association":
-            continue
-
-        association = AssociationData()
-        version = GetVersion(odl_data[ident])
-
-        for item in version[2]:
-            if item[0] == "Attribute":
-                if item[1] == "_Art1_EndMultiplicityUml":
-                    ParseMultiplicity(0, item[2][0], association)
-                elif item[1] == "_Art1_StartMultiplicityUml":
-                    ParseMultiplicity(1, item[2][0], association)
-
-        if association.upper[0] == None:
-            association.upper[0] = "1"
-            association.lower[0] = "0"
+    for ident in classes:
+        for role_ident in odl_data.Targets(ident, "_Art1_Class_To_Role", \
+                                               "_Art1_Role"):
+            for assoc in odl_data.Targets(role_ident, \
+                    "_Art1_Role_To_Association", "_Art1_Association"):
+                if assoc not in associations:
+                    associations[assoc] = GetAssociation(assoc, odl_data, \
+                                                             classes)
 
-        if association.upper[1] == None:
-            association.upper[1] = "*"
+    associations_used = {}
 
-        associations[ident] = association
+    for ident in associations:
+        if associations[ident].owner[0] in classes \
+                and associations[ident].owner[1] in classes:
+            associations_used[ident] = associations[ident]
 
-    roles = {}
+    return associations_used
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Role":
-            continue
+def GetAssociation(ident, odl_data, classes):
+    association = AssociationData()
+    attributes  = GetVersionAttributes(odl_data[ident])
 
-        version = GetVersion(odl_data[ident])
-        name    = None
-        index   = None
-        assoc   = None
+    if "_Art1_EndMultiplicityUml" in attributes:
+        ParseMultiplicity(0, attributes["_Art1_EndMultiplicityUml"][0], \
+                              association)
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_Role_To_Association" \
-                    and item[2] == "_Art1_Association":
-                assoc = item[3]
-                name  = GetName(odl_data[ident])
-            elif item[0] == "Attribute" \
-                    and item[1] == "_Art1_AssociationEnd":
-                index = int(item[2][0])
+    if "_Art1_StartMultiplicityUml" in attributes:
+        ParseMultiplicity(1, attributes["_Art1_StartMultiplicityUml"][0], \
+                              association)
 
-        if index == None:
-            index = 0
+    if association.upper[0] == None:
+        association.upper[0] = "1"
+        association.lower[0] = "0"
 
-        roles[ident] = (assoc, index)
-        associations[assoc].name[index] = name
-        associations[assoc].role[index] = ident
+    if association.upper[1] == None:
+        association.upper[1] = "*"
 
-    for ident in classes:
-        version = GetVersion(odl_data[ident])
+    for role_ident in odl_data.Sources(ident, "_Art1_Role_To_Association"):
+        end   = GetVersionAttributes(odl_data[role_ident]) \
+            .get("_Art1_AssociationEnd")
+        index = 0
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_Class_To_Role" \
-                    and item[2] == "_Art1_Role":
-                associations[roles[item[3]][0]].owner[roles[item[3]][1]] = ident
+        if end != None:
+            index = int(end[0])
 
-    associations_used = {}
+        association.name[index] = GetName(odl_data[role_ident])
+        association.role[index] = role_ident
 
-    for ident in associations:
-        if associations[ident].owner[0] in classes \
-                and associations[ident].owner[1] in classes:
-            associations_used[ident] = associations[ident]
+        for class_ident in odl_data.Sources(role_ident, "_Art1_Class_To_Role"):
+            if class_ident in classes:
+                association.owner[index] = class_ident
 
-    return associations_used
+    return association
 
-def GetEvents(odl_data, used_events):
+def GetEvents(odl_data, used_events, destroy_event_id):
     events = { destroy_event_id : "<<Destroy>>" }
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Event":
-            continue
-
+    for ident in odl_data.ObjectsOfType("_Art1_Event"):
         if used_events != None and ident not in used_events:
             continue
 
@@ -419,304 +348,798 @@ def GetEvents(odl_data, used_events):
 
     return events
 
-def GetParameters(odl_data):
-    parameters = { destroy_event_id : [] }
+def GetEventParameters(odl_data):
+    """Yields dictionary from event identifier to parameter data
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Event":
-            continue
+    The parameters of all events are kept with the model, so that they are
+    only extracted once when converting several packages
+    """
+
+    if "parameters" in odl_data.lookups:
+        return odl_data.lookups["parameters"]
+
+    parameters = {}
 
-        version = GetVersion(odl_data[ident])
+    for ident in odl_data.ObjectsOfType("_Art1_Event"):
         parameters[ident] = []
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_Event_To_Parameter" \
-                    and item[2] == "_Art1_Parameter":
-                parameter = ParameterData()
-                parameter.name = GetName(odl_data[item[3]])
-                (parameter.kind, parameter.type) \
-                               = GetKindAndType(item[3], odl_data)
+        for param_id in odl_data.Targets(ident, "_Art1_Event_To_Parameter", \
+                                             "_Art1_Parameter"):
+            parameter = ParameterData()
+            parameter.name = GetName(odl_data[param_id])
+            (parameter.kind, parameter.type) \
+                           = GetKindAndType(param_id, odl_data)
 
-                if parameter.type == None:
-                    stderr.write("Warning: parameter \"" \
-                                     + GetNamePlain(odl_data[item[3]]) + "\" " \
-                                     + "of \"" + GetNamePlain(odl_data[ident]) \
-                                     + "\" does not have type\n")
+            if parameter.type == None:
+                stderr.write("Warning: parameter \"" \
+                                 + GetNamePlain(odl_data[param_id]) + "\" " \
+                                 + "of \"" + GetNamePlain(odl_data[ident]) \
+                                 + "\" does not have type\n")
 
-                parameters[ident].append(parameter)
+            parameters[ident].append(parameter)
+
+    odl_data.lookups["parameters"] = parameters
+    return parameters
+
+def GetParameters(odl_data, destroy_event_id):
+    parameters = dict(GetEventParameters(odl_data))
+    parameters[destroy_event_id] = []
 
     return parameters
 
 def GetStates(odl_data, classes):
     states = {}
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_State":
-            continue
+    for class_id in classes:
+        for ident in odl_data.Sources(class_id, "_Art1_States_To_Class"):
+            state_type    = GetVersionAttributes(odl_data[ident]) \
+                .get("_Art1_StateType")
+            data          = StateData()
+            data.name     = GetName(odl_data[ident])
+            data.class_id = class_id
 
-        version   = GetVersion(odl_data[ident])
-        data      = StateData()
-        data.name = GetName(odl_data[ident])
+            if state_type != None and state_type[0] == "0":
+                data.vtype = "uml:Pseudostate"
+            elif state_type != None and state_type[0] == "1":
+                data.vtype = "uml:FinalState"
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_States_To_Class" \
-                    and item[2] == "_Art1_Class":
-                data.class_id = item[3]
-            elif item[0] == "Attribute" \
-                    and item[1] == "_Art1_StateType":
-                if item[2][0] == "0":
-                    data.vtype = "uml:Pseudostate"
-                elif item[2][0] == "1":
-                    data.vtype = "uml:FinalState"
-            elif item[0] == "Relationship" \
-                    and item[1] == "_Art1_SuperState_To_SubStates" \
-                    and item[2] == "_Art1_State":
-                data.substates.append(item[3])
-
-        states[ident] = data
+            data.substates = odl_data.Targets(ident, \
+                "_Art1_SuperState_To_SubStates", "_Art1_State")
 
-    for ident in states:
+            states[ident] = data
+
+    # The states are visited in a fixed order, so that the concurrent
+    # substates of a state do not come in the order of the dictionary
+    for ident in sorted(states):
         for substate_id in states[ident].substates:
-            states[substate_id].superstate = ident
+            if substate_id in states:
+                states[substate_id].superstate = ident
 
-    for ident in states:
-        version = GetVersion(odl_data[ident])
+    for ident in sorted(states):
+        for composite_id in odl_data.Targets(ident, \
+                "_Art1_ConcurrentStates_To_CompositeState", "_Art1_State"):
+            if composite_id not in states:
+                continue
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_ConcurrentStates_To_CompositeState" \
-                    and item[2] == "_Art1_State":
-                states[item[3]].substates.append(ident)
-                states[item[3]].is_parallel = True
-                states[ident].superstate = item[3]
+            states[composite_id].substates.append(ident)
+            states[composite_id].is_parallel = True
+            states[ident].superstate = composite_id
 
-    used_states = {}
+    return states
 
-    for ident in states:
-        if states[ident].class_id in classes:
-            used_states[ident] = states[ident]
-
-    return used_states
-
-def GetReplaceData(version, odl_data):
-    start = None
-    name  = None
-    obj   = None
-
-    for data in version[2]:
-        if data[0] == "Attribute" \
-                and data[1] == "_Art1_TokenStart":
-            start = int(data[2][0])
-        elif data[0] == "Attribute" \
-                and data[1] == "_Art1_LastNameText":
-            name = data[2][0]
-            name = name[:len(name) - 1]
-        elif data[0] == "Relationship" \
-                and data[1] == "_Art1_ModelObjectToken_To_ModelObject":
-            obj = GetName(odl_data[data[3]])
+def GetReplaceData(ident, odl_data):
+    attributes = GetVersionAttributes(odl_data[ident])
+    start      = None
+    name       = None
+    obj        = None
+
+    if "_Art1_TokenStart" in attributes:
+        start = int(attributes["_Art1_TokenStart"][0])
+
+    if "_Art1_LastNameText" in attributes:
+        name = attributes["_Art1_LastNameText"][0]
+        name = name[:len(name) - 1]
+
+    for obj_ident in odl_data.Targets(ident, \
+            "_Art1_ModelObjectToken_To_ModelObject"):
+        obj = GetName(odl_data[obj_ident])
 
     return (start, name, obj)
 
-def ReplaceTextNames(external, version, odl_data, class_id):
-    old_external = external
-    replacements = {}
-
-    for data in version[2]:
-        if data[0] == "Relationship" \
-                and data[1] == "_Art1_TextObject_To_ModelObjectToken" \
-                and data[2] == "_Art1_ModelObjectToken":
-            replace = GetReplaceData(GetVersion(odl_data[data[3]]), odl_data)
-            replacements[replace[0]] = replace
-
-    i = len(external) - 1
-
-    while i >= 0:
-        if i in replacements:
-            length  = len(replacements[i][1])
-            replace = replacements[i][2]
-
-            # In some sporadic cases there is no link back to a model object.
-            # Use the token name itself with appropriate replacements
-            if replace == None:
-                name = replacements[i][1]
-                stderr.write("Warning: In \"" + GetName(odl_data[class_id]) \
-                                 + "\", token \"" + name + "\" not linked at " \
-                                 + "position " + str(i) + " of:\n\n" \
-                                 + old_external + "\n")
-
-                replace = name.replace(' ', '_').replace('-', '_'). \
-                    replace('&', "and")
-
-            if external[i:i + length] == replacements[i][1]:
-                external = external[:i] + replace + external[i + length:]
-            else:
-                raise OdlExtractException("Cannot replace token \"" \
-                                              + replacements[i][1] \
-                                              + "\" at position " \
-                                              + str(i) + " in:\n\n" \
-                                              + old_external)
+def GetTokens(ident, odl_data):
+    """Yields dictionary from position to replacement data of the tokens of
+    a text object
 
-        i -= 1
+    The replacement data of tokens is kept with the model, so that it is
+    only looked up once for every token
+    """
 
-    return external
+    table  = odl_data.lookups.setdefault("tokens", {})
+    tokens = {}
+
+    for token_ident in odl_data.Targets(ident, \
+            "_Art1_TextObject_To_ModelObjectToken", "_Art1_ModelObjectToken"):
+        if token_ident not in table:
+            table[token_ident] = GetReplaceData(token_ident, odl_data)
+
+        replace = table[token_ident]
+        tokens[replace[0]] = replace
+
+    return tokens
+
+def ReplaceTextNames(external, ident, odl_data, class_id):
+    replacements = GetTokens(ident, odl_data)
+    positions    = [i for i in replacements if i != None \
+                        and 0 <= i < len(external)]
+    positions.sort(reverse = True)
+
+    # Tokens are replaced from the end of the text to its start, which keeps
+    # the positions of the remaining tokens valid; the output is collected
+    # in reverse order and consists of the text after the last replaced
+    # token and the replacements and text between tokens
+    segments = []
+    end      = len(external)
+
+    for i in positions:
+        (_, name, replace) = replacements[i]
+        length = len(name)
+
+        # In some sporadic cases there is no link back to a model object.
+        # Use the token name itself with appropriate replacements
+        if replace == None:
+            stderr.write("Warning: In \"" + GetName(odl_data[class_id]) \
+                             + "\", token \"" + name + "\" not linked at " \
+                             + "position " + str(i) + " of:\n\n" \
+                             + external + "\n")
+
+            replace = name.replace(' ', '_').replace('-', '_'). \
+                replace('&', "and")
+
+        if i + length <= end:
+            current  = external[i:i + length]
+            segments.append(external[i + length:end])
+        else:
+            # The token overlaps the previous token, so it is compared with
+            # the text in which that token has been replaced already
+            segments.reverse()
+            tail     = external[i:end] + "".join(segments)
+            current  = tail[:length]
+            segments = [tail[length:]]
+
+        if current != name:
+            raise OdlExtractException("Cannot replace token \"" + name \
+                                          + "\" at position " + str(i) \
+                                          + " in:\n\n" + external)
+
+        segments.append(replace)
+        end = i
+
+    segments.append(external[:end])
+    segments.reverse()
+    return "".join(segments)
+
+# Tokens of the RTF subset written by Artisan
+rtf_token = compile(r"""(?x)
+      ([{}])                                    # 1: group start or end
+    | \\([\\{}])                                # 2: escaped character
+    | (\\[\r\n])                                # 3: paragraph
+    | \\'([0-9a-fA-F]{2})                       # 4: character by code
+    | (\\([a-zA-Z*-]*)([0-9][a-zA-Z0-9*-]*)?\ ?) # 5: control word (6, 7)
+    | ([^\\{}\r\n]+)                            # 8: text
+    | ([\r\n]+)                                 # 9: ignored
+""")
+
+# Characters that are undefined in cp1252, which pyth does not accept even
+# in groups that are skipped
+rtf_undefined = compile("[\x81\x8d\x8f\x90\x9d]")
+
+# Control words that produce text, as cp1252
+rtf_text = {
+    "line"      : "\n",
+    "tab"       : "\t",
+    "trowd"     : "\n",
+    "emdash"    : "\x97",
+    "endash"    : "\x96",
+    "lquote"    : "\x91",
+    "rquote"    : "\x92",
+    "ldblquote" : "\x93",
+    "rdblquote" : "\x94"
+}
+
+# Control words that only change formatting, with whether they take a
+# parameter: never (False), always (True), or optionally (None)
+rtf_format = {
+    "pard"       : False,
+    "plain"      : False,
+    "ansi"       : False,
+    "super"      : False,
+    "nosupersub" : False,
+    "sub"        : False,
+    "b"          : None,
+    "i"          : None,
+    "ul"         : None,
+    "up"         : True,
+    "dn"         : True
+}
+
+# Control words of groups that are skipped without looking at their contents
+rtf_ignored = set(["filetbl", "colortbl", "stylesheet", "listtable", \
+    "listoverridetable", "revtbl", "mmath", "header", "footer", "headerl", \
+    "headerr", "headerf", "footerl", "footerr", "footerf", "info", "docfmt", \
+    "pgdsctbl", "listtext", "revauthdel"])
+
+# Control words that are not part of the subset; other control words are
+# ignored, as by pyth
+rtf_unsupported = set(["mac", "pc", "pca", "u", "ilvl", "pict", "field"])
+
+class RtfUnsupported(Exception):
+    """Raised by DecodeSimpleRtf for RTF text outside the supported subset
+    """
 
-def GetExternal(version, odl_data, source, class_id):
-    external = ""
+    pass
 
-    for item in version[2]:
-        if item[0] == "Attribute" \
-                and item[1] == "_Art1_RTF":
-
-            if len(item[2]) == 2:
-                if isinstance(source, ZipFile):
-                    data = source.open(item[2][0]).read()
-                else:
-                    file_name = join(source, item[2][0])
-                    f = open(file_name, 'rb')
-                    data = f.read()
-                    f.close()
-                data = data.replace("\x0c", "")
-            elif len(item[2]) == 1:
-                data = item[2][0]
+class RtfGroup(object):
+    __slots__ = ["parts", "special", "fonts", "font", "table"]
 
-            if data == "":
-                return ""
+    def __init__(self, table):
+        self.parts   = []    # Text, with None for paragraph ends
+        self.special = None  # Font table or destination, both skipped
+        self.fonts   = None  # Fonts defined, if a font table
+        self.font    = False # Whether a font is defined in the group
+        self.table   = table
+
+def DecodeSimpleRtf(data):
+    """Decode RTF text to plain text, giving the same outcome as pyth for the
+    subset of RTF written by Artisan
 
-            f = StringIO()
-            f.write(data)
-            doc = Rtf15Reader.read(f, clean_paragraphs = False)
-            external = PlaintextWriter.write(doc).getvalue()
-            external = external.replace("\n\n", "\n")
+    Raises RtfUnsupported for other RTF text
+    """
 
-    return ReplaceTextNames(external, version, odl_data, class_id)
+    if data[:5] != "{\\rtf":
+        raise RtfUnsupported()
+
+    group = RtfGroup(None)
+    stack = [group]
+    table = None # Fonts of the last font table
+    pos   = 0
+    end   = len(data)
+
+    while pos < end:
+        match = rtf_token.match(data, pos)
+        pos   = match.end()
+        kind  = match.lastindex
+
+        if kind == 8:
+            if rtf_undefined.search(match.group(8)):
+                raise RtfUnsupported()
+
+            group.parts.append(match.group(8))
+        elif kind == 1:
+            if match.group(1) == "{":
+                group = RtfGroup(table)
+                stack.append(group)
+                continue
 
-def GetTypeEvent(version):
-    for item in version[2]:
-        if item[0] == "Attribute" \
-                and item[1] == "_Art1_EventType":
-            return int(item[2][0])
+            if len(stack) == 1:
+                raise RtfUnsupported()
+
+            closed = stack.pop()
+            group  = stack[-1]
+
+            if closed.special == None:
+                group.parts.extend(closed.parts)
+            elif closed.special == "fonttbl":
+                table = closed.fonts
+        elif kind == 5:
+            name   = match.group(6)
+            digits = match.group(7)
+
+            if match.group(5)[-1] != " " and data[pos:pos + 1] == "'":
+                raise RtfUnsupported()
+
+            if name in rtf_text:
+                if digits != None:
+                    raise RtfUnsupported()
+
+                group.parts.append(rtf_text[name])
+            elif name == "par":
+                if digits != None:
+                    raise RtfUnsupported()
+
+                group.parts.append(None)
+            elif name in rtf_format:
+                if (digits == None and rtf_format[name] == True) \
+                        or (digits != None and rtf_format[name] == False):
+                    raise RtfUnsupported()
+            elif name == "*":
+                group.special = group.special or "destination"
+            elif name == "fonttbl":
+                if digits != None or table != None:
+                    raise RtfUnsupported()
+
+                group.special = "fonttbl"
+                group.fonts   = set()
+            elif name == "f":
+                if len(stack) == 1 or digits == None \
+                        or not digits.isdigit():
+                    raise RtfUnsupported()
+
+                if group.special == "fonttbl":
+                    group.fonts.add(int(digits))
+                    group.font = True
+                elif stack[-2].special == "fonttbl":
+                    stack[-2].fonts.add(int(digits))
+                    group.font = True
+                elif group.table != None and int(digits) not in group.table:
+                    raise RtfUnsupported()
+            elif name == "fcharset":
+                # Only the ANSI character sets are supported
+                if len(stack) == 1 or digits not in ["0", "1"]:
+                    raise RtfUnsupported()
+
+                if (group.special == "fonttbl" \
+                        or stack[-2].special == "fonttbl") and not group.font:
+                    raise RtfUnsupported()
+            elif name == "ansicpg":
+                if digits != "1252":
+                    raise RtfUnsupported()
+            elif name in rtf_ignored:
+                # Skip to the end of the group, where pyth only looks at
+                # braces, even escaped ones
+                if len(stack) == 1:
+                    raise RtfUnsupported()
+
+                depth = 1
+
+                while depth > 0 and pos < end:
+                    if data[pos] == "{":
+                        depth += 1
+                    elif data[pos] == "}":
+                        depth -= 1
+
+                    pos += 1
+
+                if depth > 0:
+                    raise RtfUnsupported()
+
+                stack.pop()
+                group = stack[-1]
+            elif name in rtf_unsupported:
+                raise RtfUnsupported()
+        elif kind == 2:
+            group.parts.append(match.group(2))
+        elif kind == 3:
+            group.parts.append(None)
+        elif kind == 4:
+            char = chr(int(match.group(4), 16))
+
+            if rtf_undefined.match(char):
+                raise RtfUnsupported()
+
+            group.parts.append(char)
+
+    if len(stack) != 1:
+        raise RtfUnsupported()
+
+    text = "".join([part == None and "\n\n" or part for part in group.parts])
+    return text.decode("cp1252").encode("utf-8").replace("\n\n", "\n")
+
+def DecodeRtfWithPyth(data):
+    """Decode RTF text to plain text using pyth
+
+    Pyth is only imported here, as loading it is slow and it is not needed
+    unless a model contains RTF text outside the subset of DecodeSimpleRtf
+    """
 
-    return None
+    from pyth.plugins.rtf15.reader     import Rtf15Reader
+    from pyth.plugins.plaintext.writer import PlaintextWriter
+
+    f = StringIO()
+    f.write(data)
+    doc = Rtf15Reader.read(f, clean_paragraphs = False)
+    external = PlaintextWriter.write(doc).getvalue()
+    return external.replace("\n\n", "\n")
+
+def DecodeRtf(data):
+    """Decode RTF text to plain text
+    """
+
+    try:
+        return DecodeSimpleRtf(data)
+    except RtfUnsupported:
+        return DecodeRtfWithPyth(data)
+
+def GetRtfCorpus(odl_data, source):
+    """Yields the distinct non-empty RTF texts of all objects of a model
+    """
+
+    decoder = RtfDecoder(source)
+    texts   = set()
 
-def FillTransitionDetails(odl_data, source, transitions):
     for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_EventActionBlock":
+        rtf = odl_data[ident].attributes.get("_Art1_RTF")
+
+        if rtf != None:
+            texts.add(decoder.Read(rtf))
+
+    texts.discard("")
+    return sorted(texts)
+
+def CheckRtfDecoding(texts):
+    """Decodes RTF texts both with DecodeSimpleRtf and with pyth, and
+    reports the texts for which the outcomes differ; yields the number of
+    texts decoded by DecodeSimpleRtf, left to pyth, and decoded differently
+    """
+
+    simple    = 0
+    fallback  = 0
+    different = 0
+
+    for data in texts:
+        try:
+            external = DecodeSimpleRtf(data)
+        except RtfUnsupported:
+            fallback += 1
             continue
 
-        trans_ident = ident
-        version     = GetVersion(odl_data[ident])
-        etype       = GetTypeEvent(version)
-        event       = None
-        event_id    = None
+        simple += 1
+
+        if external != DecodeRtfWithPyth(data):
+            different += 1
+            stderr.write("Warning: RTF text decoded differently: " \
+                             + repr(data) + "\n")
+
+    stderr.write("RTF texts: " + str(simple) + " decoded directly, " \
+                     + str(fallback) + " left to pyth, " \
+                     + str(different) + " decoded differently\n")
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_EventActionBlock_To_Transition" \
-                    and item[2] == "_Art1_Transition":
-                trans_ident = item[3]
+    return (simple, fallback, different)
 
-        if trans_ident not in transitions:
+def GetRtfSamples(directory):
+    """Yields the names and texts of the RTF samples in a directory, the
+    files ending in .rtf, read as RtfDecoder reads the RTF texts of an
+    export, together with their decoding by pyth as stored next to them,
+    in the same file ending in .txt instead, or None if not stored
+    """
+
+    samples = []
+
+    for name in sorted(listdir(directory)):
+        if not name.endswith(".rtf"):
             continue
 
-        # Needed for warning handling in GetExternal
-        class_id = transitions[trans_ident].class_id
-
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_EventActionBlock_To_SignalEvent" \
-                    and item[2] == "_Art1_Event" \
-                    and etype == 0:
-                event    = "signal/" + GetName(odl_data[item[3]])
-                event_id = item[3]
-            elif item[0] == "Relationship" \
-                    and item[1] == "_Art1_EventActionBlock_To_ChangeEvent" \
-                    and item[2] == "_Art1_ChangeEvent":
-                change_version = GetVersion(odl_data[item[3]])
-
-                if etype == 2:
-                    event = "Time/" + GetExternal(change_version, odl_data, \
-                                                      source, class_id)
-                elif etype == 3:
-                    event = "Change/" + GetExternal(change_version, odl_data, \
-                                                        source, class_id)
-
-            elif item[0] == "Relationship" \
-                    and item[1] == "_Art1_EventActionBlock_To_GuardCondition" \
-                    and item[2] == "_Art1_GuardCondition":
-                guard_version = GetVersion(odl_data[item[3]])
-                guard    = GetExternal(guard_version, odl_data, source, \
-                                           class_id)
-                guard_id = item[3]
-
-        if etype == 4:
-            event = "Entry/"
-        elif etype == 5:
-            event = "Exit/"
-        elif etype == None:
-            event = "None"
-        elif etype == 7: # Special <<Destroy>> signal
-            event    = "signal/<<Destroy>>"
-            event_id = destroy_event_id
-            action   = "delete self"
-        elif etype == 8: # Apparently also represents the absence of a signal
-            event = "None"
-
-        if event == None:
-            raise OdlExtractException("Found unknown event type: " + str(etype))
-
-        if etype == 0 and trans_ident == ident:
-            event = "signal_in/" + event[7:]
-
-        if etype != 7:
-            action = GetExternal(version, odl_data, source, class_id)
-
-        transitions[trans_ident].action   = action
-        transitions[trans_ident].event    = event
-        transitions[trans_ident].event_id = event_id
-        transitions[trans_ident].guard    = guard
-        transitions[trans_ident].guard_id = guard_id
+        sample = open(join(directory, name), 'rb')
+        data   = sample.read().replace("\x0c", "")
+        sample.close()
 
-    return transitions
+        external = None
+        output   = join(directory, name[:-len(".rtf")] + ".txt")
 
-def GetTransitions(odl_data, source, states):
-    transitions = {}
+        if exists(output):
+            sample   = open(output, 'rb')
+            external = sample.read()
+            sample.close()
+
+        samples.append((name, data, external))
+
+    return samples
+
+def CheckRtfSamples(samples):
+    """Checks that pyth decodes the RTF samples as stored, that the samples
+    whose names start with "simple" are decoded by DecodeSimpleRtf, and
+    that DecodeSimpleRtf and pyth agree on every sample it decodes; yields
+    the number of failed samples
+    """
+
+    failed = 0
+
+    for (name, data, stored) in samples:
+        external = DecodeRtfWithPyth(data)
+
+        if stored != None and external != stored:
+            failed += 1
+            stderr.write("Warning: RTF sample decoded by pyth differently " \
+                             + "than stored: " + name + "\n")
+            continue
+
+        try:
+            simple = DecodeSimpleRtf(data)
+        except RtfUnsupported:
+            if name.startswith("simple"):
+                failed += 1
+                stderr.write("Warning: RTF sample left to pyth: " + name \
+                                 + "\n")
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Transition":
             continue
 
-        version    = GetVersion(odl_data[ident])
-        data       = TransitionData()
-        data.ident = ident
+        if simple != external:
+            failed += 1
+            stderr.write("Warning: RTF sample decoded differently: " \
+                             + name + "\n")
+
+    stderr.write("RTF samples: " + str(len(samples)) + " checked, " \
+                     + str(failed) + " failed\n")
+
+    return failed
+
+def BenchmarkRtfDecoding(texts):
+    """Decodes RTF texts with DecodeRtf and with pyth only, and reports the
+    number of texts and bytes per second of both
+    """
+
+    size   = sum([len(data) for data in texts])
+    result = []
+
+    for (name, decode) in [("DecodeRtf", DecodeRtf), \
+                               ("pyth", DecodeRtfWithPyth)]:
+        start = time()
+
+        for data in texts:
+            decode(data)
+
+        duration = max(time() - start, 1e-6)
+        result.append((name, len(texts), duration))
+
+        stderr.write("%-10s %6d texts in %7.3f s: %8.0f texts/s, " \
+                         "%7.3f MB/s\n" % (name, len(texts), duration, \
+                         len(texts) / duration, size / duration / (1 << 20)))
+
+    return result
+
+# Version of the decoded RTF texts as stored in caches; increase when the
+# outcome of decoding changes
+rtf_version = "1"
+
+class RtfDecoder(object):
+    """Decodes the RTF texts of an export, either stored in the odl
+    description or in separate files, to plain text
+
+    Identical texts are decoded only once, and if a cache is given, decoded
+    texts are kept in the cache to avoid decoding them again in later runs
+    """
+
+    def __init__(self, source, cache = None):
+        self.source     = source
+        self.cache      = cache
+        self.memo       = {}
+        self.fetched    = set()
+        self.hits       = 0
+        self.cache_hits = 0
+        self.misses     = 0
+
+    def Read(self, rtf):
+        """Returns the RTF text given by the _Art1_RTF attribute of an object
+        """
+
+        if len(rtf) == 2:
+            if isinstance(self.source, ZipFile):
+                data = self.source.open(rtf[0]).read()
+            else:
+                file_name = join(self.source, rtf[0])
+                f = open(file_name, 'rb')
+                data = f.read()
+                f.close()
+            return data.replace("\x0c", "")
+        elif len(rtf) == 1:
+            return rtf[0]
+
+    def Decode(self, rtf):
+        """Returns the plain text for the _Art1_RTF attribute of an object
+        """
+
+        data = self.Read(rtf)
+
+        if data == "":
+            return ""
+
+        digest = sha1(data).hexdigest()
+
+        if digest in self.fetched:
+            self.fetched.remove(digest) # Counted when prefetched
+            return self.memo[digest]
+
+        if digest in self.memo:
+            self.hits += 1
+            return self.memo[digest]
+
+        external = None
+
+        if self.cache != None:
+            key      = self.cache.Key("rtf", rtf_version, digest)
+            external = self.cache.Get(key)
+
+        if external != None:
+            self.cache_hits += 1
+        else:
+            self.misses += 1
+            external = DecodeRtf(data)
+
+            if self.cache != None:
+                self.cache.Put(key, external)
+
+        self.memo[digest] = external
+        return external
+
+    def Prefetch(self, rtfs, jobs):
+        """Decodes the given _Art1_RTF attributes in a pool of the given
+        number of worker processes, so that later calls of Decode for these
+        attributes return at once
+        """
+
+        from multiprocessing import Pool
+
+        digests = []
+        texts   = []
+        pending = set() # The digests, for fast membership tests
+
+        for rtf in rtfs:
+            data = self.Read(rtf)
+
+            if data == "":
+                continue
+
+            digest = sha1(data).hexdigest()
+
+            if digest in self.memo or digest in pending:
+                continue
+
+            if self.cache != None:
+                key      = self.cache.Key("rtf", rtf_version, digest)
+                external = self.cache.Get(key)
+
+                if external != None:
+                    self.memo[digest] = external
+                    self.fetched.add(digest)
+                    continue
+
+            pending.add(digest)
+            digests.append(digest)
+            texts.append(data)
+
+        if texts == []:
+            return
+
+        pool = Pool(jobs)
+
+        try:
+            externals = pool.map(DecodeRtf, texts, \
+                                     max(len(texts) // (4 * jobs), 1))
+        finally:
+            pool.terminate()
+
+        for (digest, external) in zip(digests, externals):
+            self.memo[digest] = external
+            self.fetched.add(digest)
+            self.misses += 1
+
+            if self.cache != None:
+                self.cache.Put(self.cache.Key("rtf", rtf_version, digest), \
+                                   external)
+
+    def Report(self):
+        """Reports how many RTF texts were decoded and how many were reused
+        """
+
+        stderr.write("RTF texts: " + str(self.misses) + " decoded, " \
+                         + str(self.hits) + " reused, " \
+                         + str(self.cache_hits) + " from cache\n")
+
+def GetExternal(ident, odl_data, decoder, class_id):
+    rtf      = GetVersionAttributes(odl_data[ident]).get("_Art1_RTF")
+    external = ""
+
+    if rtf != None:
+        external = decoder.Decode(rtf)
+
+    return ReplaceTextNames(external, ident, odl_data, class_id)
+
+def GetTypeEvent(data):
+    attributes = GetVersionAttributes(data)
+
+    if "_Art1_EventType" in attributes:
+        return int(attributes["_Art1_EventType"][0])
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_TransitionEnd_To_EndState" \
-                    and item[2] == "_Art1_State":
-                data.target = item[3]
+    return None
+
+def FillTransitionDetails(odl_data, decoder, transitions, destroy_event_id):
+    for trans_ident in transitions:
+        if odl_data[trans_ident].type == "_Art1_EventActionBlock":
+            blocks = [trans_ident]
+        else:
+            blocks = odl_data.Sources(trans_ident, \
+                "_Art1_EventActionBlock_To_Transition")
+
+        for ident in blocks:
+            FillTransitionDetail(ident, odl_data, decoder, \
+                                     transitions[trans_ident], \
+                                     destroy_event_id)
+
+    return transitions
 
-        transitions[ident] = data
+def FillTransitionDetail(ident, odl_data, decoder, transition, \
+                             destroy_event_id):
+    etype    = GetTypeEvent(odl_data[ident])
+    event    = None
+    event_id = None
+    guard    = ""
+    guard_id = None
+
+    # Needed for warning handling in GetExternal
+    class_id = transition.class_id
+
+    if etype == 0:
+        for event_ident in odl_data.Targets(ident, \
+                "_Art1_EventActionBlock_To_SignalEvent", "_Art1_Event"):
+            event    = "signal/" + GetName(odl_data[event_ident])
+            event_id = event_ident
+
+    for change_ident in odl_data.Targets(ident, \
+            "_Art1_EventActionBlock_To_ChangeEvent", "_Art1_ChangeEvent"):
+        if etype == 2:
+            event = "Time/" + GetExternal(change_ident, odl_data, decoder, \
+                                              class_id)
+        elif etype == 3:
+            event = "Change/" + GetExternal(change_ident, odl_data, decoder, \
+                                                class_id)
+
+    for guard_ident in odl_data.Targets(ident, \
+            "_Art1_EventActionBlock_To_GuardCondition", "_Art1_GuardCondition"):
+        guard    = GetExternal(guard_ident, odl_data, decoder, class_id)
+        guard_id = guard_ident
+
+    if etype == 4:
+        event = "Entry/"
+    elif etype == 5:
+        event = "Exit/"
+    elif etype == None:
+        event = "None"
+    elif etype == 7: # Special <<Destroy>> signal
+        event    = "signal/<<Destroy>>"
+        event_id = destroy_event_id
+        action   = "delete self"
+    elif etype == 8: # Apparently also represents the absence of a signal
+        event = "None"
+
+    if event == None:
+        raise OdlExtractException("Found unknown event type: " + str(etype))
+
+    if etype == 0 and transition.ident == ident:
+        event = "signal_in/" + event[7:]
+
+    if etype != 7:
+        action = GetExternal(ident, odl_data, decoder, class_id)
+
+    transition.action   = action
+    transition.event    = event
+    transition.event_id = event_id
+    transition.guard    = guard
+    transition.guard_id = guard_id
+
+def GetTransitions(odl_data, decoder, states, destroy_event_id):
+    transitions = {}
 
     for ident in states:
-        version = GetVersion(odl_data[ident])
-
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_StartState_To_TransitionStart" \
-                    and item[2] == "_Art1_Transition":
-                transitions[item[3]].source   = ident
-                transitions[item[3]].class_id = states[ident].class_id
-            elif item[0] == "Relationship" \
-                    and item[1] == "_Art1_State_To_EventActionBlock" \
-                    and item[2] == "_Art1_EventActionBlock":
-                data = TransitionData()
-                data.ident    = item[3]
-                data.source   = ident
-                data.target   = ident
-                data.class_id = states[ident].class_id
-                transitions[item[3]] = data
+        for trans_ident in odl_data.Targets(ident, \
+                "_Art1_StartState_To_TransitionStart", "_Art1_Transition"):
+            data          = TransitionData()
+            data.ident    = trans_ident
+            data.source   = ident
+            data.class_id = states[ident].class_id
+
+            for target in odl_data.Targets(trans_ident, \
+                    "_Art1_TransitionEnd_To_EndState", "_Art1_State"):
+                data.target = target
+
+            transitions[trans_ident] = data
+
+        for block_ident in odl_data.Targets(ident, \
+                "_Art1_State_To_EventActionBlock", "_Art1_EventActionBlock"):
+            data          = TransitionData()
+            data.ident    = block_ident
+            data.source   = ident
+            data.target   = ident
+            data.class_id = states[ident].class_id
+            transitions[block_ident] = data
 
     used_transitions = {}
 
@@ -725,53 +1148,121 @@ def GetTransitions(odl_data, source, states):
                 and transitions[ident].target != None:
             used_transitions[ident] = transitions[ident]
 
-    return FillTransitionDetails(odl_data, source, used_transitions).values()
+    return FillTransitionDetails(odl_data, decoder, used_transitions, \
+                                     destroy_event_id).values()
+
+def GetRtfTexts(odl_data, classes, states):
+    """Yields the _Art1_RTF attributes of the default values of the
+    attributes of the given classes and of the events, guards and actions
+    of the transitions of the given states, i.e., exactly the RTF texts
+    decoded by GetAttributes and GetTransitions
+    """
+
+    idents = []
+
+    for ident in classes:
+        for attrib_id in odl_data.Targets(ident, "_Art1_Class_To_Attribute", \
+                                              "_Art1_Attribute"):
+            for custom_ident in odl_data.Targets(attrib_id, \
+                    "_Art1_ModelObject_To_CustomPropertyTextObject", \
+                    "_Art1_CustomPropertyTextObject"):
+                if IsDefaultValue(odl_data[custom_ident]):
+                    idents.append(custom_ident)
+                    break
+
+    blocks = []
+    seen   = set()
+
+    for ident in states:
+        blocks.extend(odl_data.Targets(ident, \
+            "_Art1_State_To_EventActionBlock", "_Art1_EventActionBlock"))
+
+        for trans_ident in odl_data.Targets(ident, \
+                "_Art1_StartState_To_TransitionStart", "_Art1_Transition"):
+            # Transitions without target are left out by GetTransitions
+            if trans_ident in seen or odl_data.Targets(trans_ident, \
+                    "_Art1_TransitionEnd_To_EndState", "_Art1_State") == []:
+                continue
+
+            seen.add(trans_ident)
+            blocks.extend(odl_data.Sources(trans_ident, \
+                "_Art1_EventActionBlock_To_Transition"))
+
+    # Decoded in the same cases as by FillTransitionDetail
+    for block_ident in blocks:
+        etype   = GetTypeEvent(odl_data[block_ident])
+        changes = odl_data.Targets(block_ident, \
+            "_Art1_EventActionBlock_To_ChangeEvent", "_Art1_ChangeEvent")
+
+        if etype == 2 or etype == 3:
+            idents.extend(changes)
+
+        idents.extend(odl_data.Targets(block_ident, \
+            "_Art1_EventActionBlock_To_GuardCondition", \
+            "_Art1_GuardCondition"))
+
+        if etype == 0:
+            known = odl_data.Targets(block_ident, \
+                "_Art1_EventActionBlock_To_SignalEvent", "_Art1_Event") != []
+        elif etype == 2 or etype == 3:
+            known = changes != []
+        else:
+            known = etype in [4, 5, None, 8]
+
+        if known:
+            idents.append(block_ident)
+
+    return [odl_data[ident].attributes["_Art1_RTF"] for ident in idents \
+                if "_Art1_RTF" in odl_data[ident].attributes]
 
 def GetBasicTypes(odl_data):
-    basic_types = {}
+    if "basic_types" in odl_data.lookups:
+        return odl_data.lookups["basic_types"]
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_BasicType":
-            continue
+    basic_types = {}
 
+    for ident in odl_data.ObjectsOfType("_Art1_BasicType"):
         basic_types[ident] = GetName(odl_data[ident])
 
+    odl_data.lookups["basic_types"] = basic_types
     return basic_types
 
 def GetEnumeratedTypes(odl_data):
-    enumerated_types = {}
+    if "enumerated_types" in odl_data.lookups:
+        return odl_data.lookups["enumerated_types"]
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Typedef":
-            continue
+    enumerated_types = {}
 
+    for ident in odl_data.ObjectsOfType("_Art1_Typedef"):
         construction = GetConstruction(odl_data[ident])
 
         if construction != "0":
             continue
 
-        version   = GetVersion(odl_data[ident])
         data      = EnumeratedTypeData()
         data.name = GetName(odl_data[ident])
 
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_Enumeration_To_EnumerationLiteral" \
-                    and item[2] == "_Art1_EnumerationLiteral":
-                literal = EnumeratedLiteralData()
-                literal.name  = GetName(odl_data[item[3]])
-                literal.ident = item[3]
-                data.literals.append(literal)
+        for literal_ident in odl_data.Targets(ident, \
+                "_Art1_Enumeration_To_EnumerationLiteral", \
+                "_Art1_EnumerationLiteral"):
+            literal = EnumeratedLiteralData()
+            literal.name  = GetName(odl_data[literal_ident])
+            literal.ident = literal_ident
+            data.literals.append(literal)
 
         enumerated_types[ident] = data
 
+    odl_data.lookups["enumerated_types"] = enumerated_types
     return enumerated_types
 
 def GetAliasTypes(odl_data):
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Typedef":
-            continue
+    # Unhandled types are only reported once for every model
+    if "alias_types" in odl_data.lookups:
+        return
 
+    odl_data.lookups["alias_types"] = True
+
+    for ident in odl_data.ObjectsOfType("_Art1_Typedef"):
         construction = GetConstruction(odl_data[ident])
 
         if construction != "1":
@@ -782,10 +1273,13 @@ def GetAliasTypes(odl_data):
         stderr.write("Warning: alias type \"" + name + "\" unhandled\n")
 
 def GetSequenceTypes(odl_data):
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Typedef":
-            continue
+    # Unhandled types are only reported once for every model
+    if "sequence_types" in odl_data.lookups:
+        return
+
+    odl_data.lookups["sequence_types"] = True
 
+    for ident in odl_data.ObjectsOfType("_Art1_Typedef"):
         construction = GetConstruction(odl_data[ident])
 
         if construction != "2":
@@ -796,10 +1290,13 @@ def GetSequenceTypes(odl_data):
         stderr.write("Warning: sequence type \"" + name + "\" unhandled\n")
 
 def GetArrayTypes(odl_data):
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Typedef":
-            continue
+    # Unhandled types are only reported once for every model
+    if "array_types" in odl_data.lookups:
+        return
 
+    odl_data.lookups["array_types"] = True
+
+    for ident in odl_data.ObjectsOfType("_Art1_Typedef"):
         construction = GetConstruction(odl_data[ident])
 
         if construction != "3":
@@ -810,25 +1307,18 @@ def GetArrayTypes(odl_data):
         stderr.write("Warning: array type " + name + " unhandled\n")
 
 def FindSubpackageOf(ident, path, odl_data):
-    version = GetVersion(odl_data[ident])
-
-    for item in version[2]:
-        if item[0] == "Relationship" \
-                and item[1] == "_Art1_Package_To_PackageItem" \
-                and item[2] == "_Art1_Package" \
-                and GetName(odl_data[item[3]]) == path[0]:
+    for package_ident in odl_data.Targets(ident, \
+            "_Art1_Package_To_PackageItem", "_Art1_Package"):
+        if GetName(odl_data[package_ident]) == path[0]:
             if len(path) == 1:
-                return item[3]
+                return package_ident
             else:
-                return FindSubpackageOf(item[3], path[1:], odl_data)
+                return FindSubpackageOf(package_ident, path[1:], odl_data)
 
     raise Exception("Subpackage " + path[0] + " not found")
 
 def FindPackage(path, odl_data):
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Package":
-            continue
-
+    for ident in odl_data.ObjectsOfType("_Art1_Package"):
         if GetName(odl_data[ident]) == path[0]:
             if len(path) == 1:
                 return ident
@@ -838,15 +1328,11 @@ def FindPackage(path, odl_data):
     raise Exception("Package " + path[0] + " not found")
 
 def FindAllSubpackages(ident, odl_data):
-    version = GetVersion(odl_data[ident])
-
     subpackages = [ident]
 
-    for item in version[2]:
-        if item[0] == "Relationship" \
-                and item[1] == "_Art1_Package_To_PackageItem" \
-                and item[2] == "_Art1_Package":
-            subpackages += FindAllSubpackages(item[3], odl_data)
+    for package_ident in odl_data.Targets(ident, \
+            "_Art1_Package_To_PackageItem", "_Art1_Package"):
+        subpackages += FindAllSubpackages(package_ident, odl_data)
 
     return subpackages
 
@@ -854,13 +1340,8 @@ def FindClassesInPackages(packages, odl_data):
     used_classes = []
 
     for ident in packages:
-        version = GetVersion(odl_data[ident])
-
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_Package_To_PackageItem" \
-                    and item[2] == "_Art1_Class":
-                used_classes.append(item[3])
+        used_classes += odl_data.Targets(ident, \
+            "_Art1_Package_To_PackageItem", "_Art1_Class")
 
     return used_classes
 
@@ -868,50 +1349,51 @@ def FindEventsInPackages(packages, odl_data):
     used_events = []
 
     for ident in packages:
-        version = GetVersion(odl_data[ident])
-
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_Package_To_PackageItem" \
-                    and item[2] == "_Art1_Event":
-                used_events.append(item[3])
+        used_events += odl_data.Targets(ident, \
+            "_Art1_Package_To_PackageItem", "_Art1_Event")
 
     return used_events
 
-def FindPackageClasses(path, odl_data):
+def FindPackageContents(path, odl_data):
+    """Yields the sets of classes and events in a package and its
+    subpackages, resolving the path of the package only once
+    """
+
     path_list = path.replace(' ', '_').replace('-', '_').replace('&', "and") \
         .rsplit('/')
     ident     = FindPackage(path_list, odl_data)
     packages  = FindAllSubpackages(ident, odl_data)
 
-    return FindClassesInPackages(packages, odl_data)
+    return (set(FindClassesInPackages(packages, odl_data)), \
+                set(FindEventsInPackages(packages, odl_data)))
+
+def FindPackageClasses(path, odl_data):
+    return FindPackageContents(path, odl_data)[0]
 
 def FindPackageEvents(path, odl_data):
-    path_list = path.replace(' ', '_').replace('-', '_').replace('&', "and") \
-        .rsplit('/')
-    ident     = FindPackage(path_list, odl_data)
-    packages  = FindAllSubpackages(ident, odl_data)
+    return FindPackageContents(path, odl_data)[1]
 
-    return FindEventsInPackages(packages, odl_data)
+def ExtractModelData(odl_data):
+    """Extracts the parts of the model that are the same for every package,
+    so that they are kept with the model before converting several packages
+    """
+
+    GetEventParameters(odl_data)
+    GetBasicTypes(odl_data)
+    GetEnumeratedTypes(odl_data)
+    GetAliasTypes(odl_data)
+    GetSequenceTypes(odl_data)
+    GetArrayTypes(odl_data)
 
 def GetPackageHierarchy(odl_data):
     packages = {}
 
-    for ident in odl_data:
-        if odl_data[ident][0] != "_Art1_Package":
-            continue
-
+    for ident in odl_data.ObjectsOfType("_Art1_Package"):
         package = PackageData()
-        package.name  = GetNamePlain(odl_data[ident])
-        package.ident = ident
-
-        version = GetVersion(odl_data[ident])
-
-        for item in version[2]:
-            if item[0] == "Relationship" \
-                    and item[1] == "_Art1_Package_To_PackageItem" \
-                    and item[2] == "_Art1_Package":
-                package.child_id.append(item[3])
+        package.name     = GetNamePlain(odl_data[ident])
+        package.ident    = ident
+        package.child_id = odl_data.Targets(ident, \
+            "_Art1_Package_To_PackageItem", "_Art1_Package")
 
         packages[ident] = package
 
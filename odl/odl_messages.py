@@ -0,0 +1,71 @@
+# Copyright (c) 2011, 2012, Jeroen Ketema, University of Twente
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+#  * Neither the name of the University of Twente nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Stream for the messages of the tool, such as warnings, which by default
+go to standard error but can be collected instead
+"""
+
+from threading import local
+import sys
+
+class OdlMessageStream(object):
+    """Stands in for standard error: messages are passed on to the current
+    standard error, unless the thread writing them collects its messages
+    """
+
+    def __init__(self):
+        self.local = local()
+
+    def write(self, data):
+        collected = getattr(self.local, "collected", None)
+
+        if collected == None:
+            sys.stderr.write(data)
+        else:
+            collected.append(data)
+
+    def flush(self):
+        sys.stderr.flush()
+
+    def StartCollecting(self):
+        """Collects the messages of the current thread, until stopped,
+        instead of passing them on; returns the list they are collected in
+        """
+
+        self.local.collected = []
+        return self.local.collected
+
+    def StopCollecting(self):
+        """Passes the messages of the current thread on again
+        """
+
+        self.local.collected = None
+
+stderr = OdlMessageStream()
@@ -31,9 +31,20 @@
 """Odl lexer and parser
 """
 
-from os.path import join
-from sys     import stderr
-from zipfile import ZipFile
+from copy      import copy
+from hashlib   import sha1
+from itertools import chain
+from marshal   import dumps, loads
+from os        import makedirs
+from os.path   import abspath, dirname, expanduser, getsize, isdir, join
+from re        import compile
+from platform  import python_version
+from sys       import modules
+from threading import local, Lock
+from time      import time
+from zipfile   import ZipFile
+
+from odl.odl_messages import stderr
 
 # Odl lexer
 
@@ -52,8 +63,9 @@ reserved = {
     'Copy'          : 'COPY'
 }
 
+# Sorted, as the signature of the parse tables depends on the order
 tokens = ['STRING'] \
-    + list(reserved.values())
+    + sorted(reserved.values())
 
 literals = [ '{', '}', ',', ';' ]
 
@@ -78,14 +90,466 @@ def t_newline(t):
     r'\n+'
     t.lexer.lineno += 1
 
+class OdlIncompleteInput(Exception):
+    """Raised by the lexer when the input ends in an unterminated string,
+    while more input is still to follow
+    """
+
+    pass
+
 def t_error(t):
     """Error handling rule
     """
-    stderr.write("Warning: illegal character '" + t.value[0] \
-        + "' in odl file on line " + str(t.lexer.lineno) + "\n")
+
+    if t.value[0] == "\"" and not getattr(t.lexer, "final", True):
+        raise OdlIncompleteInput()
+
+    OdlIllegalCharacter(t.value[0], t.lexer.lineno)
     t.lexer.skip(1)
 
-odl_lexer = lex.lex()
+def OdlIllegalCharacter(character, lineno):
+    """Warns about an illegal character on the given line
+    """
+
+    stderr.write("Warning: illegal character '" + character \
+        + "' in odl file on line " + str(lineno) + "\n")
+
+# Longest string that is waited for when it continues beyond the input read
+# so far; the opening quote of a longer string is reported as illegal, as
+# when the input ends in an unterminated string, so that a malformed
+# description is not buffered to its end
+max_string_size = 16 << 20
+
+string_body = compile(r'[^"\\]*(?:\\["\\][^"\\]*)*')
+
+def OdlStringScan(data, start, scan):
+    """Scans, from position scan on, the body of a string that is opened at
+    the given position of data but continues beyond the input lexed so far;
+    returns the position up to which the body was scanned, to continue from
+    once more input is read, or None if the opening quote is illegal, as
+    the string can never be completed or is longer than max_string_size
+    """
+
+    scan = string_body.match(data, scan).end()
+
+    if scan < len(data) and data[scan] == "\"":
+        return scan # Complete, but beyond the input lexed so far
+    elif scan >= len(data) - 1 and len(data) - start <= max_string_size:
+        return scan # At the end of data, possibly before a backslash
+    else:
+        return None
+
+# The lexer and parser are only built when first needed, under a lock so
+# that only one thread builds them; every thread then uses its own copy, as
+# the lexer and parser keep the state of the input they are working on
+odl_lexer  = None
+odl_parser = None
+build_lock = Lock()
+per_thread = local()
+
+def OdlLexer():
+    """Returns the odl lexer of the current thread
+    """
+
+    global odl_lexer
+
+    lexer = getattr(per_thread, "lexer", None)
+
+    if lexer != None:
+        return lexer
+
+    build_lock.acquire()
+
+    try:
+        if odl_lexer == None:
+            odl_lexer = lex.lex(module = modules[__name__])
+    finally:
+        build_lock.release()
+
+    per_thread.lexer = odl_lexer.clone()
+    return per_thread.lexer
+
+def OdlTokens(lexer, chunks):
+    """Yields the tokens of an odl description that is given in chunks
+
+    Only complete lines are passed to the lexer, so that identifiers and
+    comments are never split; strings that are continued in later chunks
+    are detected by the lexer and lexed again once their end is read
+    """
+
+    data    = ""
+    pending = None # Position up to which a continued string was scanned
+    lexer.final  = False
+    lexer.lineno = 1
+
+    for chunk in chunks:
+        data += chunk
+
+        if pending != None:
+            pending = OdlStringScan(data, 0, pending)
+
+            # Lexed again once the line holding its end is complete
+            if pending != None and (data[pending:pending + 1] != "\"" \
+                                        or data.find("\n", pending) == -1):
+                continue
+
+            pending = None
+
+        end = data.rfind("\n") + 1
+
+        if end == 0:
+            continue
+
+        lexer.input(data[:end])
+
+        while True:
+            try:
+                token = lexer.token()
+            except OdlIncompleteInput:
+                start   = lexer.lexpos
+                pending = OdlStringScan(data, start, start + 1)
+
+                if pending == None:
+                    OdlIllegalCharacter("\"", lexer.lineno)
+                    lexer.skip(1)
+                    continue
+
+                end      = start
+                pending -= start
+                break
+
+            if token == None:
+                break
+
+            yield token
+
+        data = data[end:]
+
+    lexer.final = True
+    lexer.input(data)
+
+    while True:
+        token = lexer.token()
+
+        if token == None:
+            break
+
+        yield token
+
+# Odl tokenizer, yields the same tokens as the odl lexer above, but is
+# considerably faster, as it needs no function call for most tokens
+
+class OdlToken(object):
+    """Token as yielded by the odl tokenizer, with the attributes the parser
+    expects of a lexer token; line numbers are only determined for warnings
+    """
+
+    __slots__ = ["type", "value", "lineno", "lexpos", "lexer"]
+
+    def __init__(self, ttype, value, lexpos):
+        self.type   = ttype
+        self.value  = value
+        self.lineno = 0
+        self.lexpos = lexpos
+
+# Tokens for reserved words and literals are shared, as their value is
+# fully determined by their type (which also leaves their position unknown)
+shared_tokens = {}
+
+for word in reserved:
+    shared_tokens[word] = OdlToken(reserved[word], word, 0)
+
+for literal in literals:
+    shared_tokens[literal] = OdlToken(literal, literal, 0)
+
+token_regex = compile(r'''(?x)
+      "([^"\\]*(?:\\["\\][^"\\]*)*)" # 1: string
+    | ([a-zA-Z][a-zA-Z0-9_]*)        # 2: identifier or reserved word
+    | ([{},;])                       # 3: literal
+    | //[^\n]*                       #    comment, ignored like white space
+    | ([^ \r\t\n])                   # 4: illegal character
+''')
+
+def OdlTokenize(chunks, lineno = 1):
+    """Yields the tokens of an odl description that is given in chunks
+
+    Like OdlTokens, but without using the odl lexer; warnings give line
+    numbers counted from the given line
+    """
+
+    data    = ""
+    offset  = 0
+    pending = None # Position up to which a continued string was scanned
+    shared  = shared_tokens
+
+    for chunk in chain(chunks, [None]):
+        final = chunk == None
+
+        if not final:
+            data += chunk
+
+            if pending != None:
+                pending = OdlStringScan(data, 0, pending)
+
+                # Lexed again once the line holding its end is complete
+                if pending != None and (data[pending:pending + 1] != "\"" \
+                                            or data.find("\n", pending) == -1):
+                    continue
+
+                pending = None
+
+            end = data.rfind("\n") + 1
+
+            if end == 0:
+                continue
+        else:
+            end = len(data)
+
+        for match in token_regex.finditer(data, 0, end):
+            kind = match.lastindex
+
+            if kind == 1:
+                value = match.group(1)
+
+                if "\\" in value:
+                    value = value.replace("\\\\", "\\")
+                    value = value.replace("\\\"", "\"")
+
+                if "\x0c" in value:
+                    value = value.replace("\x0c", "")
+
+                yield OdlToken("STRING", value, offset + match.start())
+            elif kind == 2:
+                value = match.group(2)
+
+                if value in shared:
+                    yield shared[value]
+                else:
+                    yield OdlToken("ID", value, offset + match.start())
+            elif kind == 3:
+                yield shared[match.group(3)]
+            elif kind == 4:
+                value = match.group(4)
+
+                if value == "\"" and not final:
+                    pending = OdlStringScan(data, match.start(), \
+                                                match.start() + 1)
+
+                    if pending != None:
+                        # String continues in the next chunk
+                        end      = match.start()
+                        pending -= end
+                        break
+
+                OdlIllegalCharacter(value, \
+                    lineno + data.count("\n", 0, match.start()))
+
+        lineno += data.count("\n", 0, end)
+        offset += end
+        data    = data[end:]
+
+# Odl model
+
+class OdlObject(object):
+    """Object from an odl description: its type, the attributes of the
+    object itself, the number of its versions, and the name, attributes,
+    and relationships of its (first) version
+    """
+
+    __slots__ = ["type", "object_attributes", "versions", "version", \
+                     "attributes", "relationships"]
+
+    def __init__(self, otype, ident, details):
+        self.type              = intern(otype)
+        self.object_attributes = {}
+        self.versions          = 0
+        self.version           = None
+        self.attributes        = {}
+        self.relationships     = []
+
+        for item in details:
+            if item[0] == "Attribute":
+                self.object_attributes[intern(item[1])] = item[2]
+            elif item[0] == "Version":
+                self.versions += 1
+
+                if self.versions > 1:
+                    continue # Objects with several versions are rejected
+                             # when their version is used
+
+                self.version = item[1]
+
+                for data in item[2]:
+                    if data[0] == "Attribute":
+                        self.attributes[intern(data[1])] = data[2]
+                    elif data[0] == "Relationship":
+                        self.relationships.append((intern(data[1]), \
+                            intern(data[2]), intern(data[3])))
+
+    def Dump(self):
+        """Returns the object as a tuple that can be marshalled
+        """
+
+        return (self.type, self.object_attributes, self.versions, \
+                    self.version, self.attributes, self.relationships)
+
+def OdlLoadObject(dump):
+    """Returns the object from a tuple created by OdlObject.Dump
+    """
+
+    data = OdlObject.__new__(OdlObject)
+    (data.type, data.object_attributes, data.versions, data.version, \
+         data.attributes, data.relationships) = dump
+    return data
+
+# Version of the model as stored in caches; increase when the layout of the
+# model or the outcome of parsing changes
+model_version = "2"
+
+class OdlModel(dict):
+    """Dictionary from object identifier to OdlObject, which additionally
+    maintains an index from object type to the identifiers of that type and
+    a reverse index of the relationships between objects (the forward
+    direction is given by the relationships of the objects themselves)
+    """
+
+    def __init__(self):
+        dict.__init__(self)
+        self.types   = {}
+        self.sources = {}
+        self.lookups = {} # Tables derived from the model by its users,
+                          # which are cleared whenever the model changes
+
+    def Add(self, ident, data):
+        if ident in self:
+            self.Remove(ident)
+
+        self.lookups.clear()
+        self[ident] = data
+        self.types.setdefault(data.type, []).append(ident)
+
+        for (name, _, target) in data.relationships:
+            self.sources.setdefault((target, name), []).append(ident)
+
+    def Remove(self, ident):
+        data = self[ident]
+        self.lookups.clear()
+        self.types[data.type].remove(ident)
+
+        for (name, _, target) in data.relationships:
+            self.sources[(target, name)].remove(ident)
+
+        del self[ident]
+
+    def ObjectsOfType(self, otype):
+        """Yields the identifiers of all objects of the given type
+        """
+
+        return self.types.get(otype, [])
+
+    def Targets(self, ident, name, otype = None):
+        """Yields the targets of the relationships with the given name that
+        start in the given object, optionally restricted to targets of the
+        given type
+        """
+
+        return [target for (relationship, target_type, target) \
+                    in self[ident].relationships \
+                    if relationship == name \
+                        and (otype == None or target_type == otype)]
+
+    def Sources(self, ident, name):
+        """Yields the sources of the relationships with the given name that
+        end in the given object
+        """
+
+        return self.sources.get((ident, name), [])
+
+    def Dump(self):
+        """Returns the model, including its indices, as a tuple that can be
+        marshalled
+        """
+
+        objects = dict([(ident, self[ident].Dump()) for ident in self])
+        return (objects, self.types, self.sources)
+
+def OdlLoadModel(dump):
+    """Returns the model from a tuple created by OdlModel.Dump
+    """
+
+    (objects, types, sources) = dump
+
+    odl_data = OdlModel()
+    odl_data.types   = types
+    odl_data.sources = sources
+
+    for ident in objects:
+        dict.__setitem__(odl_data, ident, OdlLoadObject(objects[ident]))
+
+    return odl_data
+
+class OdlRecorder(object):
+    """View of a model that records the objects, reverse relationships, and
+    types read through it, so that it can later be checked whether the same
+    computation on a changed model would read the same data
+    """
+
+    def __init__(self, model):
+        self.model   = model
+        self.lookups = {} # Not shared with the model, as reads through the
+                          # tables of the model would not be recorded
+        self.objects = set()
+        self.sources = set()
+        self.types   = set()
+
+    def __getitem__(self, ident):
+        self.objects.add(ident)
+        return self.model[ident]
+
+    def __contains__(self, ident):
+        self.objects.add(ident)
+        return ident in self.model
+
+    def ObjectsOfType(self, otype):
+        self.types.add(otype)
+        return self.model.ObjectsOfType(otype)
+
+    def Targets(self, ident, name, otype = None):
+        self.objects.add(ident)
+        return self.model.Targets(ident, name, otype)
+
+    def Sources(self, ident, name):
+        self.sources.add((ident, name))
+        return self.model.Sources(ident, name)
+
+def OdlDigest(model, objects, sources, types):
+    """Returns the SHA-1 digest of the given objects, reverse relationships,
+    and types of a model, for instance as recorded by an OdlRecorder
+    """
+
+    digest = sha1()
+
+    for ident in objects:
+        data = model.get(ident)
+
+        if data == None:
+            digest.update(repr((ident, None)) + "\0")
+        else:
+            object_attributes = data.object_attributes.items()
+            object_attributes.sort()
+            attributes = data.attributes.items()
+            attributes.sort()
+            digest.update(repr((ident, data.type, object_attributes, \
+                                    data.versions, data.version, attributes, \
+                                    data.relationships)) + "\0")
+
+    for (ident, name) in sources:
+        digest.update(repr(model.Sources(ident, name)) + "\0")
+
+    for otype in types:
+        digest.update(repr(model.ObjectsOfType(otype)) + "\0")
+
+    return digest.hexdigest()
 
 # Odl parser
 
@@ -100,12 +564,12 @@ def p_top_entries(p):
         p[0] = p[1]
 
         if p[2] != None:
-            p[0][p[2][0]] = p[2][1]
+            p[0].Add(p[2][0], p[2][1])
     else:
-        p[0] = {}
+        p[0] = OdlModel()
 
         if p[1] != None:
-            p[0][p[1][0]] = p[1][1]
+            p[0].Add(p[1][0], p[1][1])
 
 def p_top_entry(p):
     """top_entry : configuration
@@ -118,13 +582,13 @@ def p_configuration(p):
     """configuration : CONFIGURATION STRING STRING details
     """
 
-    p[0] = (p[3], (p[2], p[4]))
+    p[0] = (intern(p[3]), OdlObject(p[2], p[3], p[4]))
 
 def p_object(p):
     """object : OBJECT STRING STRING details
     """
 
-    p[0] = (p[3], (p[2], p[4]))
+    p[0] = (intern(p[3]), OdlObject(p[2], p[3], p[4]))
 
 def p_details(p):
     """details : '{' '}'
@@ -161,7 +625,10 @@ def p_attribute(p):
     """attribute : ATTRIBUTE STRING attribute_details
     """
 
-    p[0] = ("Attribute", p[2], p[3])
+    if isinstance(p[3], list):
+        p[0] = ("Attribute", p[2], tuple(p[3]))
+    else:
+        p[0] = ("Attribute", p[2], p[3])
 
 def p_attribute_details(p):
     """attribute_details : TRUE
@@ -215,23 +682,459 @@ def p_error(p):
     """
 
     stderr.write("Warning: syntax error at token " + p.type + "\n")
-    yacc.errok() # Discard the token and tell the parser it is okay
+    OdlParser().errok() # Discard the token and tell the parser it is okay
+
+# Parse tables are shipped with the package, and are never rewritten by a
+# conversion; when the grammar changed, regenerated tables are kept in the
+# user's cache directory instead, so that they are only regenerated once
+package_dir = dirname(abspath(__file__))
+cache_dir   = join(expanduser("~"), ".cache", "artisanConvert")
+
+def OdlShippedTablesCurrent(module):
+    """Returns whether the parse tables shipped with the package were
+    generated from the current grammar
+    """
+
+    try:
+        from odl import odl_parsetab
+    except ImportError:
+        return False
+
+    info = yacc.ParserReflect(dict([(name, getattr(module, name)) \
+                                        for name in dir(module)]))
+    info.get_all()
+
+    return getattr(odl_parsetab, "_tabversion", None) == yacc.__tabversion__ \
+        and getattr(odl_parsetab, "_lr_signature", None) == info.signature()
+
+def OdlBuildParser():
+    """Builds the odl parser from the stored parse tables, regenerating the
+    tables if the grammar changed
+    """
+
+    module = modules[__name__]
+
+    if OdlShippedTablesCurrent(module):
+        return yacc.yacc(module = module, debug = 0, \
+                             tabmodule = "odl.odl_parsetab", \
+                             write_tables = 0)
+    else:
+        if not isdir(cache_dir):
+            makedirs(cache_dir)
+
+        return yacc.yacc(module = module, debug = 0, \
+                             picklefile = join(cache_dir, "odl_parsetab.p"))
+
+def OdlWriteTables():
+    """Regenerates the parse tables shipped with the package, if they were
+    not generated from the current grammar
+    """
+
+    yacc.yacc(module = modules[__name__], debug = 0, \
+                  tabmodule = "odl.odl_parsetab", outputdir = package_dir)
+
+    # Leave out the path of the file, which yacc writes in the first lines
+    file_name = join(package_dir, "odl_parsetab.py")
+    f     = open(file_name, 'r')
+    lines = f.readlines()
+    f.close()
+
+    if lines[2].startswith("# This file is automatically generated"):
+        f = open(file_name, 'w')
+        f.writelines(lines[2:])
+        f.close()
+
+def OdlParser():
+    """Returns the odl parser of the current thread
+    """
+
+    global odl_parser
+
+    parser = getattr(per_thread, "parser", None)
+
+    if parser != None:
+        return parser
+
+    build_lock.acquire()
+
+    try:
+        if odl_parser == None:
+            odl_parser = OdlBuildParser()
+    finally:
+        build_lock.release()
+
+    # The parse tables are shared, as they are never changed
+    per_thread.parser = copy(odl_parser)
+    return per_thread.parser
+
+# (Apparently meaningless) substring that affects lexing
+continuation = "\"\\\r\n    \""
+
+chunk_size = 1 << 20
+
+def OdlOpenFile(source):
+    """Opens the odl description of a model
+    """
+
+    contents = "Contents.odl"
 
-odl_parser = yacc.yacc()
+    if isinstance(source, ZipFile):
+        return source.open(contents)
+    else:
+        return open(join(source, contents), 'rb')
 
-def OdlParseFile(source):
-    """Parse odl description of model
+def OdlDescriptionSize(source):
+    """Returns the size of the odl description of a model, which for a zip
+    file is taken from its central directory without reading the contents
     """
 
     contents = "Contents.odl"
 
     if isinstance(source, ZipFile):
-        data = source.open(contents).read()
+        return source.getinfo(contents).file_size
+    else:
+        return getsize(join(source, contents))
+
+def OdlHashFile(source, size = chunk_size):
+    """Returns the SHA-1 digest of the odl description of a model
+    """
+
+    f      = OdlOpenFile(source)
+    digest = sha1()
+
+    while True:
+        chunk = f.read(size)
+
+        if chunk == "":
+            break
+
+        digest.update(chunk)
+
+    f.close()
+    return digest.hexdigest()
+
+def OdlReadChunks(source, size = chunk_size):
+    """Yields the contents of the odl description of a model in chunks of
+    (roughly) the given size, with all continuation substrings removed
+    """
+
+    f    = OdlOpenFile(source)
+    data = ""
+
+    while True:
+        chunk = f.read(size)
+
+        if chunk == "":
+            break
+
+        data += chunk
+
+        # Keep back a tail that might be the start of a continuation
+        # substring; extend it if a continuation substring crosses it
+        end   = max(len(data) - len(continuation) + 1, 0)
+        index = data.find(continuation, max(end - len(continuation) + 1, 0))
+
+        if index != -1 and index < end:
+            end = index + len(continuation)
+
+        yield data[:end].replace(continuation, "")
+        data = data[end:]
+
+    f.close()
+    yield data.replace(continuation, "")
+
+# Scanner for the starts of top-level entries, which are always written at
+# the start of a line; strings and comments are skipped as by the tokenizer
+entry_regex = compile(r'(?:Object|Configuration) ')
+block_regex = compile(r'''(?x)
+      "[^"\\]*(?:\\.[^"\\]*)*"           #    string
+    | //[^\n]*                           #    comment
+    | (")                                # 1: string continued in next chunk
+    | (\n)(?=(?:Object|Configuration)\ ) # 2: start of the next entry
+''')
+
+def OdlBlocks(chunks):
+    """Yields the top-level entries of an odl description that is given in
+    chunks, as pairs of the line on which an entry starts and its text
+
+    Entries are found by a scan that only skips strings and comments, which
+    is much faster than lexing. Anything preceding the first entry, such as
+    comments, is included with that entry
+    """
+
+    data   = ""
+    pos    = 0
+    lineno = 1
+    first  = True
+
+    for chunk in chain(chunks, [None]):
+        if chunk != None:
+            data += chunk
+            end   = data.rfind("\n") # The line after a newline must be
+                                     # complete to recognise an entry
+        else:
+            end   = len(data)
+
+        if end <= pos:
+            continue
+
+        begin = 0
+
+        for match in block_regex.finditer(data, pos, end):
+            if match.lastindex == 1:
+                end = match.start()
+                break
+
+            if match.lastindex == 2:
+                if first and entry_regex.match(data) == None:
+                    first = False
+                    continue
+
+                first = False
+                block = data[begin:match.end()]
+                yield (lineno, block)
+
+                lineno += block.count("\n")
+                begin   = match.end()
+
+        pos  = end - begin
+        data = data[begin:]
+
+    if data.strip() != "":
+        yield (lineno, data)
+
+# Identifier of a top-level entry, taken from its first line
+ident_regex = compile(r'''(?x)
+    (?:Object|Configuration)\ "[^"\\]*(?:\\.[^"\\]*)*"
+    \ "([^"\\]*(?:\\.[^"\\]*)*)"
+''')
+
+# Lexer passed to the parser along with the tokens of the odl tokenizer; the
+# parser only requires that some lexer is given, but never uses it, so that
+# the odl lexer need not be built
+no_lexer = object()
+
+def OdlParseText(text, lineno):
+    """Parses part of an odl description, starting on the given line, and
+    yields an OdlModel of the top-level entries in it
+    """
+
+    tokens = OdlTokenize([text], lineno)
+
+    def NextToken():
+        for token in tokens:
+            return token
+
+        return None
+
+    return OdlParser().parse(lexer = no_lexer, tokenfunc = NextToken)
+
+def OdlParseEntries(blocks, idents):
+    """Parses consecutive blocks of an odl description, given as pairs of
+    the line on which a block starts and its text, yields the objects of
+    the top-level entries with the given identifiers in the blocks, or None
+    if the blocks do not consist of exactly these entries
+    """
+
+    text   = "".join([block for (_, block) in blocks])
+    result = OdlParseText(text, blocks[0][0])
+
+    if result == None or len(result) != len(idents):
+        return None
+
+    for ident in idents:
+        if ident not in result:
+            return None
+
+    return [result[ident] for ident in idents]
+
+# Version of the parsed blocks as stored in caches; increase when the layout
+# of the stored blocks changes
+blocks_version = "1"
+
+def OdlParseBlocks(source, size, cache):
+    """Parse odl description of model block by block, yields an OdlModel or
+    None if the description cannot be split into blocks
+
+    Every top-level entry of the description forms a block; the parsed
+    blocks are stored in the cache by their SHA-1 digest, and blocks that
+    did not change since the same input was last parsed are taken from the
+    cache instead of being parsed again. Consecutive changed blocks are
+    parsed together, up to the given size
+    """
+
+    if isinstance(source, ZipFile):
+        name = abspath(source.filename)
+    else:
+        name = abspath(source)
+
+    key      = cache.Key("blocks", blocks_version, model_version, \
+                             python_version(), name)
+    dump     = cache.Get(key)
+    previous = {}
+
+    if dump != None:
+        try:
+            previous = loads(dump)
+        except (EOFError, ValueError, TypeError):
+            stderr.write("Warning: ignoring corrupt cache entry " + key \
+                             + "\n")
+
+    odl_data = OdlModel()
+    blocks   = {}
+    reused   = 0
+    parsed   = 0
+    pending  = [] # Changed blocks that are not yet parsed
+    length   = 0
+
+    for (lineno, block) in chain(OdlBlocks(OdlReadChunks(source, size)), \
+                                     [(None, None)]):
+        if block != None:
+            digest = sha1(block).digest()
+            record = blocks.get(digest)
+
+            if record == None:
+                record = previous.get(digest)
+
+            if record == None:
+                match = ident_regex.match(block)
+
+            if record == None and match != None:
+                ident = match.group(1)
+
+                if "\\" in ident:
+                    ident = ident.replace("\\\\", "\\")
+                    ident = ident.replace("\\\"", "\"")
+
+                if "\x0c" in ident:
+                    ident = ident.replace("\x0c", "")
+
+                pending.append((digest, lineno, block, ident))
+                length += len(block)
+
+                if length < size:
+                    continue
+
+        if pending != []:
+            entries = [(start, text) for (_, start, text, _) in pending]
+            idents  = [name for (_, _, _, name) in pending]
+            objects = OdlParseEntries(entries, idents)
+
+            if objects == None:
+                objects = []
+
+                for (entry, name) in zip(entries, idents):
+                    data = OdlParseEntries([entry], [name])
+
+                    if data == None:
+                        stderr.write("Warning: odl description cannot be " \
+                                         + "split into blocks at line " \
+                                         + str(entry[0]) + "\n")
+                        return None
+
+                    objects.extend(data)
+
+            for ((changed, _, _, name), data) in zip(pending, objects):
+                blocks[changed] = (name, data.Dump())
+                odl_data.Add(name, data)
+
+            parsed += len(pending)
+            pending = []
+            length  = 0
+
+        if block == None:
+            break
+
+        if record != None:
+            blocks[digest] = record
+            odl_data.Add(record[0], OdlLoadObject(record[1]))
+            reused += 1
+        elif match == None:
+            # The block does not start with an entry, as the first block
+            # might not, so that its identifier is only known once parsed
+            result = OdlParseText(block, lineno)
+
+            if result == None or len(result) != 1:
+                stderr.write("Warning: odl description cannot be split " \
+                                 + "into blocks at line " + str(lineno) \
+                                 + "\n")
+                return None
+
+            (ident, data) = result.items()[0]
+            blocks[digest] = (ident, data.Dump())
+            odl_data.Add(ident, data)
+            parsed += 1
+
+    stderr.write("Blocks: " + str(reused) + " reused, " + str(parsed) \
+                     + " reparsed\n")
+    cache.Put(key, dumps(blocks, 2))
+    return odl_data
+
+def OdlParseFile(source, size = chunk_size, cache = None, blocks = False):
+    """Parse odl description of model, yields an OdlModel
+
+    The description is read and lexed in chunks of the given size, so that
+    the complete description never needs to be kept in memory. If a cache
+    is given, the model is taken from the cache when the same description
+    was parsed before, and it is stored in the cache otherwise; if in
+    addition blocks is set, only the blocks of the description that changed
+    since the same input was last parsed are parsed (see OdlParseBlocks)
+    """
+
+    if cache != None:
+        key  = cache.Key("model", model_version, python_version(), \
+                             OdlHashFile(source, size))
+        dump = cache.Get(key)
+
+        if dump != None:
+            try:
+                return OdlLoadModel(loads(dump))
+            except (EOFError, ValueError, TypeError):
+                stderr.write("Warning: ignoring corrupt cache entry " \
+                                 + key + "\n")
+
+    if cache != None and blocks:
+        odl_data = OdlParseBlocks(source, size, cache)
     else:
-        f    = open(join(source, contents), 'rb')
-        data = f.read()
+        odl_data = None
+
+    if odl_data == None:
+        tokens = OdlTokenize(OdlReadChunks(source, size))
+
+        def NextToken():
+            for token in tokens:
+                return token
+
+            return None
+
+        odl_data = OdlParser().parse(lexer = no_lexer, \
+                                         tokenfunc = NextToken)
+
+    if cache != None and odl_data != None:
+        cache.Put(key, dumps(odl_data.Dump(), 2))
+
+    return odl_data
+
+def OdlBenchmarkLexers(source, size = chunk_size):
+    """Lexes the odl description of a model with the odl lexer and with the
+    odl tokenizer, and reports the number of tokens per second of both
+    """
+
+    chunks = list(OdlReadChunks(source, size))
+    result = []
+
+    for (name, tokens) in [("odl_lexer", OdlTokens(OdlLexer(), chunks)), \
+                               ("OdlTokenize", OdlTokenize(chunks))]:
+        start = time()
+        count = 0
+
+        for token in tokens:
+            count += 1
+
+        duration = time() - start
+        result.append((name, count, duration))
 
-    # Replace (apparently meaningless) substring that affects lexing
-    data = data.replace("\"\\\r\n    \"", "")
+        stderr.write("%-12s %9d tokens in %7.3f s: %10.0f tokens/s\n" \
+                         % (name, count, duration, count / duration))
 
-    return odl_parser.parse(data, lexer = odl_lexer)
+    return result
@@ -0,0 +1,53 @@
+# This file is automatically generated. Do not edit.
+_tabversion = '3.2'
+
+_lr_method = 'LALR'
+
+_lr_signature = '-\x83@`\xf2\x08w\xfd~\xc8\xc9\x12u9\xe2\x96'
+    
+_lr_action_items = {'COPY':([33,],[40,]),'FALSE':([36,],[42,]),'STRING':([1,5,7,10,17,24,27,28,35,36,37,41,47,50,],[7,10,11,13,30,35,36,37,41,43,47,48,51,52,]),'RELATIONSHIP':([15,20,34,39,],[24,24,-10,-9,]),'ATTRIBUTE':([15,20,34,39,],[27,27,-10,-9,]),'OBJECT':([0,2,9,12,],[5,5,-2,-1,]),',':([43,45,52,],[-22,50,-21,]),'OPERATION':([22,],[33,]),'VERSION':([15,20,34,39,],[17,17,-10,-9,]),'FILE':([15,20,34,39,],[22,22,-10,-9,]),';':([3,4,6,8,14,16,18,19,21,23,25,26,29,31,32,38,40,42,43,44,45,46,48,49,51,52,],[9,-4,-3,12,-5,-6,-12,-14,-11,34,-13,-15,-7,39,-8,-24,-26,-18,-22,-16,-20,-17,-25,-19,-23,-21,]),'CONFIGURATION':([0,2,9,12,15,20,34,39,],[1,1,-2,-1,28,28,-10,-9,]),'}':([15,20,34,39,],[29,32,-10,-9,]),'{':([11,13,30,43,],[15,15,15,15,]),'TRUE':([36,],[46,]),'$end':([2,9,12,],[0,-2,-1,]),}
+
+_lr_action = { }
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = { }
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'configuration_in':([15,20,],[18,18,]),'relationship':([15,20,],[19,19,]),'top_entries':([0,],[2,]),'detail_entries':([15,],[20,]),'top_entry':([0,2,],[3,8,]),'object':([0,2,],[4,4,]),'detail':([15,20,],[23,31,]),'attribute_details':([36,],[44,]),'string_list':([36,],[45,]),'version':([15,20,],[25,25,]),'details':([11,13,30,43,],[14,16,38,49,]),'file':([15,20,],[26,26,]),'attribute':([15,20,],[21,21,]),'configuration':([0,2,],[6,6,]),}
+
+_lr_goto = { }
+for _k, _v in _lr_goto_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = { }
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> top_entries","S'",1,None,None,None),
+  ('top_entries -> top_entries top_entry ;','top_entries',3,'p_top_entries','odl/odl_parser.py',559),
+  ('top_entries -> top_entry ;','top_entries',2,'p_top_entries','odl/odl_parser.py',560),
+  ('top_entry -> configuration','top_entry',1,'p_top_entry','odl/odl_parser.py',575),
+  ('top_entry -> object','top_entry',1,'p_top_entry','odl/odl_parser.py',576),
+  ('configuration -> CONFIGURATION STRING STRING details','configuration',4,'p_configuration','odl/odl_parser.py',582),
+  ('object -> OBJECT STRING STRING details','object',4,'p_object','odl/odl_parser.py',588),
+  ('details -> { }','details',2,'p_details','odl/odl_parser.py',594),
+  ('details -> { detail_entries }','details',3,'p_details','odl/odl_parser.py',595),
+  ('detail_entries -> detail_entries detail ;','detail_entries',3,'p_detail_entries','odl/odl_parser.py',604),
+  ('detail_entries -> detail ;','detail_entries',2,'p_detail_entries','odl/odl_parser.py',605),
+  ('detail -> attribute','detail',1,'p_detail','odl/odl_parser.py',615),
+  ('detail -> configuration_in','detail',1,'p_detail','odl/odl_parser.py',616),
+  ('detail -> version','detail',1,'p_detail','odl/odl_parser.py',617),
+  ('detail -> relationship','detail',1,'p_detail','odl/odl_parser.py',618),
+  ('detail -> file','detail',1,'p_detail','odl/odl_parser.py',619),
+  ('attribute -> ATTRIBUTE STRING attribute_details','attribute',3,'p_attribute','odl/odl_parser.py',625),
+  ('attribute_details -> TRUE','attribute_details',1,'p_attribute_details','odl/odl_parser.py',634),
+  ('attribute_details -> FALSE','attribute_details',1,'p_attribute_details','odl/odl_parser.py',635),
+  ('attribute_details -> STRING details','attribute_details',2,'p_attribute_details','odl/odl_parser.py',636),
+  ('attribute_details -> string_list','attribute_details',1,'p_attribute_details','odl/odl_parser.py',637),
+  ('string_list -> string_list , STRING','string_list',3,'p_string_list','odl/odl_parser.py',646),
+  ('string_list -> STRING','string_list',1,'p_string_list','odl/odl_parser.py',647),
+  ('configuration_in -> CONFIGURATION STRING STRING STRING','configuration_in',4,'p_configuration_in','odl/odl_parser.py',657),
+  ('version -> VERSION STRING details','version',3,'p_version','odl/odl_parser.py',663),
+  ('relationship -> RELATIONSHIP STRING STRING STRING','relationship',4,'p_relationship','odl/odl_parser.py',669),
+  ('file -> FILE OPERATION COPY','file',3,'p_file','odl/odl_parser.py',675),
+]
@@ -0,0 +1,554 @@
+# Copyright (c) 2011, 2012, Jeroen Ketema, University of Twente
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+#  * Neither the name of the University of Twente nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Generator of synthetic Artisan exports of a chosen size, for measuring
+how the time taken by a conversion grows with the size of the export
+"""
+
+from copy    import copy
+from random  import Random
+from zipfile import ZipFile, ZIP_DEFLATED
+
+class OdlShape(object):
+    """Size of a synthetic export: the number of top-level packages, each of
+    which has a subpackage, and of classes, which are spread over all
+    packages; and for every class, the number of attributes, associations
+    to other classes, and events; the number of states in every region of
+    its state machine, the number of levels of nested states, and the
+    number of concurrent regions of its composite states; the share of the
+    transitions with a guard; and the number of characters of the actions
+    """
+
+    def __init__(self, packages = 2, classes = 50, attributes = 4, \
+                     associations = 1, events = 3, states = 3, depth = 2, \
+                     regions = 2, guards = 0.5, text_size = 200):
+        self.packages     = packages
+        self.classes      = classes
+        self.attributes   = attributes
+        self.associations = associations
+        self.events       = events
+        self.states       = states
+        self.depth        = depth
+        self.regions      = regions
+        self.guards       = guards
+        self.text_size    = text_size
+
+    def Scaled(self, factor):
+        """Returns the shape of an export that is the given factor larger,
+        having as many more packages and classes of the same size
+        """
+
+        shape = copy(self)
+        shape.packages = self.packages * factor
+        shape.classes  = self.classes * factor
+        return shape
+
+def OdlParseShape(text):
+    """Returns the shape given by a comma-separated list of settings of the
+    form name=value, such as "classes=100,depth=3", where the names are
+    those of the attributes of OdlShape; the other attributes keep their
+    default values
+    """
+
+    shape = OdlShape()
+
+    for setting in text.split(","):
+        (name, _, value) = setting.partition("=")
+        name = name.strip()
+
+        if name not in shape.__dict__:
+            raise ValueError("unknown setting " + name + " of shape")
+
+        if name == "guards":
+            setattr(shape, name, float(value))
+        else:
+            setattr(shape, name, int(value))
+
+        if getattr(shape, name) < 0 or shape.packages < 1:
+            raise ValueError("invalid value " + value + " of " + name)
+
+    return shape
+
+def OdlQuote(text):
+    return "\"" + text.replace("\\", "\\\\").replace("\"", "\\\"") + "\""
+
+def OdlRtf(text):
+    """Returns the RTF text, as written by Artisan, of the given plain text
+    """
+
+    return "{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0\\fnil Arial;}}" \
+        + "\\pard\\f0\\fs20 " + text.replace("\n", "\\par ") + "\\par }"
+
+# Basic types of every synthetic export, and the enumerated type with its
+# literals, by which the attributes of the classes are typed
+basic_types = [("BT1", "Integer"), ("BT2", "Boolean"), ("BT3", "String")]
+enum_type   = ("TD1", "Colour")
+literals    = [("EL1", "red"), ("EL2", "green"), ("EL3", "blue")]
+
+# Words from which the actions of transitions are made up
+words = ["start", "stop", "reset", "update", "notify", "check", "send", \
+             "store", "load", "count", "signal", "wait"]
+
+class OdlSyntheticExport(object):
+    """Synthetic export of the given shape; exports of the same shape and
+    seed are the same
+    """
+
+    def __init__(self, shape, seed = 1):
+        self.shape   = shape
+        self.random  = Random(seed)
+        self.entries = []
+        self.files   = {}
+        self.count   = 0
+        self.classes = {} # Names and relationships of the classes
+        self.states  = {} # Names, attributes, and relationships of the
+                          # states of the current class
+
+        self.Generate()
+
+    def NewIdent(self, prefix):
+        self.count += 1
+        return prefix + str(self.count)
+
+    def Object(self, otype, ident, name = None, attributes = [], \
+                   relationships = []):
+        """Adds an entry for an object with the given name, by default its
+        identifier, attributes, given as pairs of a name and a list of
+        values, and relationships, given as triples of a name, a type, and a
+        target
+        """
+
+        if name == None:
+            name = ident
+
+        lines = ["Object " + OdlQuote(otype) + " " + OdlQuote(ident) + " {", \
+                     "    Attribute \"_Art1_Id\" " + OdlQuote(ident) + ";", \
+                     "    Version " + OdlQuote("Name: " + name) + " {"]
+
+        for (attribute, values) in attributes:
+            lines.append("        Attribute " + OdlQuote(attribute) + " " \
+                             + ", ".join([OdlQuote(value) \
+                                              for value in values]) + ";")
+
+        for (relationship, target_type, target) in relationships:
+            lines.append("        Relationship " + OdlQuote(relationship) \
+                             + " " + OdlQuote(target_type) + " " \
+                             + OdlQuote(target) + ";")
+
+        lines.append("    };")
+        lines.append("};")
+        self.entries.append("\n".join(lines))
+
+    def Text(self, size):
+        """Returns an action of about the given number of characters
+        """
+
+        statements = []
+        length     = 0
+
+        while length < size:
+            statement = self.random.choice(words) + "_" \
+                + self.random.choice(words) + "(" \
+                + str(self.random.randint(0, 99)) + ");"
+            statements.append(statement)
+            length += len(statement) + 1
+
+        return "\n".join(statements)
+
+    def Generate(self):
+        """Adds the entries of the export: its types, packages, and classes
+        """
+
+        shape = self.shape
+
+        self.entries.append("Object \"_Art1_Model\" \"Synthetic Model\" {\n" \
+                                + "    Attribute \"_Art1_Id\" \"MODEL\";\n" \
+                                + "};")
+        self.entries.append("Configuration \"_Art1_Config\" \"Config\" {\n" \
+                                + "    Attribute \"_Art1_Version\" \"1\";\n" \
+                                + "};")
+
+        for (ident, name) in basic_types:
+            self.Object("_Art1_BasicType", ident, name)
+
+        self.Object("_Art1_Typedef", enum_type[0], enum_type[1], \
+                        [("_Art1_Construction", ["0"])], \
+                        [("_Art1_Enumeration_To_EnumerationLiteral", \
+                              "_Art1_EnumerationLiteral", ident) \
+                             for (ident, _) in literals])
+
+        for (ident, name) in literals:
+            self.Object("_Art1_EnumerationLiteral", ident, name)
+
+        # Every top-level package has a subpackage, and the classes are
+        # spread over all packages; the items of a package are only known
+        # once all classes are generated
+        packages = []
+
+        for index in range(shape.packages):
+            packages.append(("PK" + str(index), "Package " + str(index), []))
+            packages.append(("SP" + str(index), "Subpackage " + str(index), \
+                                 []))
+
+        classes = ["C" + str(index) for index in range(shape.classes)]
+        roles   = dict([(ident, []) for ident in classes])
+
+        for (index, ident) in enumerate(classes):
+            (_, _, items) = packages[index % len(packages)]
+
+            # The first class of every package is the superclass of the
+            # other classes of the package
+            if index >= len(packages):
+                superclass = classes[index % len(packages)]
+            else:
+                superclass = None
+
+            self.Class(index, ident, superclass, classes, roles, items)
+
+        for (index, (ident, name, items)) in enumerate(packages):
+            relationships = [("_Art1_Package_To_PackageItem", item_type, \
+                                  item) for (item_type, item) in items]
+
+            if index % 2 == 0:
+                relationships.append(("_Art1_Package_To_PackageItem", \
+                                          "_Art1_Package", \
+                                          packages[index + 1][0]))
+
+            self.Object("_Art1_Package", ident, name, [], relationships)
+
+        # The roles of the associations of a class are only known once all
+        # classes are generated
+        for ident in classes:
+            (name, relationships) = self.classes[ident]
+            relationships.extend([("_Art1_Class_To_Role", "_Art1_Role", role) \
+                                      for role in roles[ident]])
+            self.Object("_Art1_Class", ident, name, [], relationships)
+
+    def Class(self, index, ident, superclass, classes, roles, items):
+        """Adds the attributes, associations, events, and state machine of a
+        class, and records the relationships of the class
+        """
+
+        shape = self.shape
+        name  = "Class " + str(index)
+
+        relationships       = []
+        self.classes[ident] = (name, relationships)
+        items.append(("_Art1_Class", ident))
+
+        for number in range(shape.attributes):
+            attribute = ident + "_A" + str(number)
+            types     = basic_types + [enum_type]
+            (type_ident, _) = types[number % len(types)]
+
+            if type_ident == enum_type[0]:
+                attribute_relationships = \
+                    [("_Art1_TypedAttribute_To_DataType", "_Art1_Typedef", \
+                          type_ident)]
+            else:
+                attribute_relationships = \
+                    [("_Art1_TypedAttribute_To_DataType", \
+                          "_Art1_BasicType", type_ident)]
+
+            # Every other attribute has a default value
+            if number % 2 == 0:
+                default = self.NewIdent("CP")
+                self.Object("_Art1_CustomPropertyTextObject", default, \
+                                "Default Value", \
+                                [("_Art1_CustomPropertyName", \
+                                      ["Default Value"]), \
+                                     ("_Art1_RTF", [OdlRtf(str(number))])])
+                attribute_relationships.append( \
+                    ("_Art1_ModelObject_To_CustomPropertyTextObject", \
+                         "_Art1_CustomPropertyTextObject", default))
+
+            self.Object("_Art1_Attribute", attribute, \
+                            "attribute " + str(number), [], \
+                            attribute_relationships)
+            relationships.append(("_Art1_Class_To_Attribute", \
+                                      "_Art1_Attribute", attribute))
+
+        if superclass != None:
+            generalization = self.NewIdent("G")
+            specialization = self.NewIdent("S")
+            self.Object("_Art1_Generalization", generalization, None, [], \
+                            [("_Art1_Generalization_To_Specialization", \
+                                  "_Art1_Specialization", specialization)])
+            self.Object("_Art1_Specialization", specialization)
+            relationships.append(("_Art1_Class_To_Specialization", \
+                                      "_Art1_Specialization", specialization))
+            self.classes[superclass][1].append( \
+                ("_Art1_Class_To_Generalization", "_Art1_Generalization", \
+                     generalization))
+
+        for number in range(shape.associations):
+            other      = classes[(index + number + 1) % len(classes)]
+            association = self.NewIdent("AS")
+            near       = self.NewIdent("R")
+            far        = self.NewIdent("R")
+            self.Object("_Art1_Association", association, None, \
+                            [("_Art1_EndMultiplicityUml", ["0..1"]), \
+                                 ("_Art1_StartMultiplicityUml", ["*"])])
+            self.Object("_Art1_Role", near, "", \
+                            [("_Art1_AssociationEnd", ["0"])], \
+                            [("_Art1_Role_To_Association", \
+                                  "_Art1_Association", association)])
+            self.Object("_Art1_Role", far, \
+                            "role " + str(index) + "_" + str(number), \
+                            [("_Art1_AssociationEnd", ["1"])], \
+                            [("_Art1_Role_To_Association", \
+                                  "_Art1_Association", association)])
+            roles[ident].append(near)
+            roles[other].append(far)
+
+        events = []
+
+        for number in range(shape.events):
+            event      = ident + "_E" + str(number)
+            parameters = []
+
+            if number == 0:
+                parameter = event + "_P"
+                self.Object("_Art1_Parameter", parameter, "value", [], \
+                                [("_Art1_TypedParameter_To_DataType", \
+                                      "_Art1_BasicType", "BT1")])
+                parameters.append(("_Art1_Event_To_Parameter", \
+                                       "_Art1_Parameter", parameter))
+
+            self.Object("_Art1_Event", event, \
+                            "event " + str(index) + "_" + str(number), [], \
+                            parameters)
+            items.append(("_Art1_Event", event))
+            events.append(event)
+
+        if shape.attributes > 0:
+            attribute = (ident + "_A0", "attribute 0")
+        else:
+            attribute = None
+
+        self.states = {}
+        self.Region(ident, None, shape.depth, events, attribute)
+
+        for state in sorted(self.states):
+            (name, attributes, state_relationships) = self.states[state]
+            self.Object("_Art1_State", state, name, attributes, \
+                            state_relationships)
+
+    def State(self, class_id, superstate, name, state_type = None):
+        """Adds a state of a class, as a substate of the given state unless
+        None, and returns its identifier
+        """
+
+        ident = self.NewIdent("ST")
+
+        if state_type != None:
+            attributes = [("_Art1_StateType", [state_type])]
+        else:
+            attributes = []
+
+        self.states[ident] = (name, attributes, \
+                                  [("_Art1_States_To_Class", "_Art1_Class", \
+                                        class_id)])
+
+        if superstate != None:
+            self.states[superstate][2].append( \
+                ("_Art1_SuperState_To_SubStates", "_Art1_State", ident))
+
+        return ident
+
+    def Block(self, event_type, relationships, event = None, action = "", \
+                  guard = "", expression = "", tokens = []):
+        """Adds an event action block of the given type, with the given
+        relationships, and returns its identifier; the event, action, guard,
+        time or change expression, and the tokens of the action, given as
+        triples of a position, a name, and an attribute, are optional
+        """
+
+        ident      = self.NewIdent("EAB")
+        condition  = self.NewIdent("GC")
+        attributes = [("_Art1_EventType", [event_type])]
+
+        relationships = relationships \
+            + [("_Art1_EventActionBlock_To_GuardCondition", \
+                    "_Art1_GuardCondition", condition)]
+
+        if event != None:
+            relationships.append(("_Art1_EventActionBlock_To_SignalEvent", \
+                                      "_Art1_Event", event))
+
+        if expression != "":
+            change = self.NewIdent("CE")
+            self.Object("_Art1_ChangeEvent", change, None, \
+                            [("_Art1_RTF", [OdlRtf(expression)])])
+            relationships.append(("_Art1_EventActionBlock_To_ChangeEvent", \
+                                      "_Art1_ChangeEvent", change))
+
+        for (position, name, target) in tokens:
+            token = self.NewIdent("TK")
+            self.Object("_Art1_ModelObjectToken", token, None, \
+                            [("_Art1_TokenStart", [str(position)]), \
+                                 ("_Art1_LastNameText", [name + "\x01"])], \
+                            [("_Art1_ModelObjectToken_To_ModelObject", \
+                                  "_Art1_Attribute", target)])
+            relationships.append(("_Art1_TextObject_To_ModelObjectToken", \
+                                      "_Art1_ModelObjectToken", token))
+
+        # Like Artisan, long texts are stored in separate files
+        if len(action) > 100:
+            file_name = "rtf/" + ident + ".rtf"
+            self.files[file_name] = OdlRtf(action) + "\x0c"
+            attributes.append(("_Art1_RTF", [file_name, "x"]))
+        elif action != "":
+            attributes.append(("_Art1_RTF", [OdlRtf(action)]))
+        else:
+            attributes.append(("_Art1_RTF", [""]))
+
+        if guard != "":
+            guard = OdlRtf(guard)
+
+        self.Object("_Art1_EventActionBlock", ident, None, attributes, \
+                        relationships)
+        self.Object("_Art1_GuardCondition", condition, None, \
+                        [("_Art1_RTF", [guard])])
+        return ident
+
+    def Transition(self, source, target, event_type, **details):
+        """Adds a transition between two states, with the details of its
+        event action block as for Block
+        """
+
+        ident = self.NewIdent("T")
+        self.Object("_Art1_Transition", ident, None, [], \
+                        [("_Art1_TransitionEnd_To_EndState", "_Art1_State", \
+                              target)])
+        self.states[source][2].append( \
+            ("_Art1_StartState_To_TransitionStart", "_Art1_Transition", \
+                 ident))
+        self.Block(event_type, [("_Art1_EventActionBlock_To_Transition", \
+                                     "_Art1_Transition", ident)], **details)
+
+    def Behaviour(self, state, event_type, **details):
+        """Adds an entry, exit, or internal behaviour to a state, with the
+        details of its event action block as for Block
+        """
+
+        block = self.Block(event_type, [], **details)
+        self.states[state][2].append(("_Art1_State_To_EventActionBlock", \
+                                          "_Art1_EventActionBlock", block))
+
+    def Action(self, attribute):
+        """Returns an action, incrementing the given attribute if not None,
+        and the tokens for the name of the attribute in the action
+        """
+
+        text = self.Text(self.shape.text_size)
+
+        if attribute == None:
+            return (text, [])
+
+        (ident, name) = attribute
+        tokens = [(0, name, ident), (len(name) + 4, name, ident)]
+        return (name + " := " + name + " + 1;\n" + text, tokens)
+
+    def Region(self, class_id, superstate, depth, events, attribute):
+        """Adds the states of a region of the state machine of a class, the
+        outermost region if the superstate is None, with transitions between
+        them, and the given number of levels of nested regions
+        """
+
+        shape   = self.shape
+        initial = self.State(class_id, superstate, "Initial", "0")
+        states  = [self.State(class_id, superstate, "State " + str(number)) \
+                       for number in range(max(shape.states, 1))]
+
+        self.Transition(initial, states[0], "8")
+
+        for (number, state) in enumerate(states):
+            (action, tokens) = self.Action(attribute)
+
+            if self.random.random() < shape.guards:
+                guard = "value > " + str(self.random.randint(0, 99))
+            else:
+                guard = ""
+
+            following = states[(number + 1) % len(states)]
+
+            if events != []:
+                self.Transition(state, following, "0", \
+                                    event = events[number % len(events)], \
+                                    action = action, guard = guard, \
+                                    tokens = tokens)
+            else:
+                self.Transition(state, following, "8", action = action, \
+                                    guard = guard, tokens = tokens)
+
+        self.Transition(states[-1], states[0], "2", expression = \
+                            str(self.random.randint(1, 100) * 10) + " ms")
+        self.Transition(states[0], states[-1], "3", \
+                            expression = "value = " \
+                            + str(self.random.randint(0, 99)))
+
+        if superstate == None:
+            final = self.State(class_id, None, "Final", "1")
+            self.Transition(states[-1], final, "7")
+
+        self.Behaviour(states[0], "4", action = "enter();")
+        self.Behaviour(states[0], "5", action = "leave();")
+
+        if events != []:
+            self.Behaviour(states[0], "0", event = events[0], \
+                               action = "handle();")
+
+        if depth <= 1:
+            return
+
+        self.Region(class_id, states[0], depth - 1, events, attribute)
+
+        if shape.regions > 1 and len(states) > 1:
+            for number in range(shape.regions):
+                region = self.State(class_id, None, "Region " + str(number))
+                self.states[region][2].append( \
+                    ("_Art1_ConcurrentStates_To_CompositeState", \
+                         "_Art1_State", states[1]))
+                self.Region(class_id, region, depth - 1, events, attribute)
+
+    def Write(self, file_name):
+        """Writes the export as a zip file
+        """
+
+        export = ZipFile(file_name, "w", ZIP_DEFLATED)
+
+        try:
+            export.writestr("Contents.odl", "\n".join(self.entries) + "\n")
+
+            for name in sorted(self.files):
+                export.writestr(name, self.files[name])
+        finally:
+            export.close()
@@ -0,0 +1,82 @@
+# Copyright (c) 2011, 2012, Jeroen Ketema, University of Twente
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+#  * Neither the name of the University of Twente nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Checks that deterministic conversions do not depend on the hash seed of
+Python, which decides the order of dictionaries; run with:
+
+    python test_deterministic.py
+"""
+
+from os         import environ
+from os.path    import abspath, dirname, join
+from shutil     import rmtree
+from subprocess import PIPE, Popen
+from sys        import executable
+from tempfile   import mkdtemp
+from unittest   import main, TestCase
+
+from odl.odl_synthetic import OdlShape, OdlSyntheticExport
+
+script = join(dirname(abspath(__file__)), "xmi_trans.py")
+
+def convert(export, seed):
+    """Converts an export deterministically in a new process with the given
+    hash seed, and returns the XMI
+    """
+
+    env = dict(environ)
+    env["PYTHONHASHSEED"] = str(seed)
+    process = Popen([executable, script, "-d", "generate", export], \
+                        stdout = PIPE, stderr = PIPE, env = env)
+    (xmi, messages) = process.communicate()
+
+    if process.returncode != 0:
+        raise Exception("Conversion failed: " + messages)
+
+    return xmi
+
+class DeterministicTest(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp(prefix = "artisanConvert-")
+        self.export    = join(self.directory, "synthetic.zip")
+        OdlSyntheticExport(OdlShape()).Write(self.export)
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_hash_seed(self):
+        """A synthetic export, which has concurrent regions, is converted
+        into the same XMI under two hash seeds
+        """
+
+        self.assertEqual(convert(self.export, 1), convert(self.export, 2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Copyright (c) 2011, 2012, Jeroen Ketema, University of Twente
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+#  * Neither the name of the University of Twente nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Checks of DecodeSimpleRtf against the decoding by pyth of the RTF samples
+in rtf_samples/, as stored next to them; run with:
+
+    python test_rtf_samples.py
+"""
+
+from os.path  import abspath, dirname, join
+from unittest import main, TestCase
+
+from odl.odl_extract import DecodeSimpleRtf, GetRtfSamples, RtfUnsupported
+
+samples_dir = join(dirname(abspath(__file__)), "rtf_samples")
+
+class RtfSamplesTest(TestCase):
+    def setUp(self):
+        self.samples = GetRtfSamples(samples_dir)
+
+    def test_stored(self):
+        """Every sample has its decoding by pyth stored next to it
+        """
+
+        for (name, _, stored) in self.samples:
+            self.assertNotEqual(stored, None, name)
+
+    def test_simple(self):
+        """The samples named simple-* are decoded by DecodeSimpleRtf as by
+        pyth
+        """
+
+        for (name, data, stored) in self.samples:
+            if name.startswith("simple"):
+                self.assertEqual(DecodeSimpleRtf(data), stored, name)
+
+    def test_pyth(self):
+        """The samples named pyth-* are left to pyth
+        """
+
+        for (name, data, _) in self.samples:
+            if name.startswith("pyth"):
+                self.assertRaises(RtfUnsupported, DecodeSimpleRtf, data)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# Copyright (c) 2011, 2012, Jeroen Ketema, University of Twente
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+#  * Neither the name of the University of Twente nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmarks of the conversion on synthetic exports of growing size, with
+checks of the XMI against golden references; only imported by the
+benchmark mode
+"""
+
+from cStringIO  import StringIO
+from os         import makedirs
+from os.path    import abspath, dirname, exists, getsize, isdir, join
+from re         import compile
+from shutil     import rmtree
+from subprocess import PIPE, Popen
+from sys        import executable, stdout
+from tarfile    import open as open_tar
+from tempfile   import mkdtemp
+
+from odl.odl_messages  import stderr
+from odl.odl_synthetic import OdlSyntheticExport
+
+# Stages of a conversion, as timed by convert_stages
+stages = ["parse", "extract", "rtf", "emit", "total"]
+
+# Identifiers generated for elements without Artisan identifier
+id_regex = compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-" \
+                       + r"[0-9a-f]{12}")
+
+def mask_ids(xmi):
+    """Replaces the generated identifiers in XMI by their position in the
+    order of first use, so that conversions that differ only in these
+    identifiers yield the same text
+    """
+
+    numbers = {}
+
+    def number(match):
+        return "id-" + str(numbers.setdefault(match.group(0), len(numbers)))
+
+    return id_regex.sub(number, xmi)
+
+class Reference(object):
+    """Revision of the tool, given as a git revision of the repository of
+    the tool, that is known to convert correctly; it is checked out in a
+    temporary directory when it is first used
+    """
+
+    def __init__(self, revision):
+        self.revision  = revision
+        self.directory = None
+
+    def Convert(self, export):
+        """Returns the deterministic XMI of an export as converted by the
+        reference
+        """
+
+        if self.directory == None:
+            self.directory = mkdtemp(prefix = "artisanConvert-reference-")
+            archive = Popen(["git", "archive", self.revision], \
+                                cwd = dirname(abspath(__file__)), \
+                                stdout = PIPE)
+            data    = archive.communicate()[0]
+
+            if archive.returncode != 0:
+                raise Exception("Revision " + self.revision \
+                                    + " could not be checked out")
+
+            tar = open_tar(fileobj = StringIO(data))
+            tar.extractall(self.directory)
+            tar.close()
+
+        process = Popen([executable, join(self.directory, "xmi_trans.py"), \
+                             "-d", "generate", export], \
+                            stdout = PIPE, stderr = PIPE)
+        (xmi, messages) = process.communicate()
+
+        if process.returncode != 0:
+            raise Exception("Revision " + self.revision + " failed to " \
+                                + "convert " + export + ": " \
+                                + messages.strip().split("\n")[-1])
+
+        return xmi
+
+    def Remove(self):
+        if self.directory != None:
+            rmtree(self.directory)
+
+def check_golden(golden, name, xmi, export, reference):
+    """Compares XMI with the golden reference of the given name in the
+    directory golden; if the reference does not exist yet, it is first
+    stored as converted from export by the given Reference, if any.
+    Returns False if there is no reference or if the XMI differs from it in
+    more than the generated identifiers, in which case the XMI is stored
+    next to the reference
+    """
+
+    file_name = join(golden, name + ".xmi")
+
+    if not exists(file_name):
+        if reference == None:
+            stderr.write("Error: golden reference " + file_name \
+                             + " does not exist; give a revision known " \
+                             + "to be good with --reference to store it\n")
+            return False
+
+        golden_xmi = reference.Convert(export)
+        f = open(file_name, "wb")
+        f.write(golden_xmi)
+        f.close()
+        stderr.write("Stored golden reference " + file_name \
+                         + " converted by revision " + reference.revision \
+                         + "\n")
+
+    f = open(file_name, "rb")
+    golden_xmi = f.read()
+    f.close()
+
+    if mask_ids(golden_xmi) == mask_ids(xmi):
+        return True
+
+    different = join(golden, name + ".different.xmi")
+    f = open(different, "wb")
+    f.write(xmi)
+    f.close()
+    stderr.write("Error: output differs from golden reference " + file_name \
+                     + ", stored as " + different + "\n")
+    return False
+
+def print_report(out, results):
+    """Prints the seconds taken by every stage at every scale, and how much
+    longer each stage took than at the smallest scale
+    """
+
+    print >> out, "%5s %8s %9s" % ("Scale", "Classes", "Size (MB)") \
+        + "".join(["%9s" % stage for stage in stages])
+
+    for (scale, classes, size, timings) in results:
+        print >> out, "%4dx %8d %9.2f" % (scale, classes, size / 1048576.0) \
+            + "".join(["%9.3f" % timings[stage] for stage in stages])
+
+    if len(results) < 2:
+        return
+
+    (first, _, _, base) = results[0]
+
+    print >> out
+    print >> out, "Growth relative to " + str(first) + "x (linear growth " \
+        + "equals the ratio of the scales):"
+
+    for (scale, _, _, timings) in results[1:]:
+        print >> out, "%4dx %18s" % (scale, "") \
+            + "".join(["%9.2f" % (timings[stage] / max(base[stage], 1e-6)) \
+                           for stage in stages])
+
+def run_benchmarks(convert, golden, scales, repeat, shape, \
+                       reference = None):
+    """Converts synthetic exports of the given shape at each of the given
+    scales with convert_stages, passed as convert, the given number of
+    times both by default and deterministically, reports the fastest time
+    of each stage in both modes, and checks the deterministic XMI against
+    the golden references in the directory golden, storing missing ones
+    as converted by the revision reference; returns the scales at which the
+    XMI differs from its reference
+
+    Only the deterministic XMI is checked, as otherwise the order in which
+    elements are written depends on their generated identifiers
+    """
+
+    if not isdir(golden):
+        makedirs(golden)
+
+    if reference != None:
+        reference = Reference(reference)
+
+    directory = mkdtemp(prefix = "artisanConvert-")
+    results   = {False: [], True: []}
+    failed    = []
+
+    try:
+        for scale in scales:
+            name   = "synthetic-" + str(scale) + "x"
+            export = join(directory, name + ".zip")
+            OdlSyntheticExport(shape.Scaled(scale)).Write(export)
+            stderr.write("Converting " + name + "\n")
+
+            timings = {False: None, True: None}
+            xmi     = None
+
+            for run in range(repeat):
+                for deterministic in [False, True]:
+                    result = convert(export, deterministic)
+
+                    if deterministic:
+                        xmi = result.xmi
+
+                    if timings[deterministic] == None:
+                        timings[deterministic] = result.timings
+                    else:
+                        for stage in stages:
+                            timings[deterministic][stage] = \
+                                min(timings[deterministic][stage], \
+                                        result.timings[stage])
+
+            if not check_golden(golden, name, xmi, export, reference):
+                failed.append(scale)
+
+            for deterministic in [False, True]:
+                results[deterministic].append((scale, \
+                                                   shape.classes * scale, \
+                                                   getsize(export), \
+                                                   timings[deterministic]))
+    finally:
+        rmtree(directory)
+
+        if reference != None:
+            reference.Remove()
+
+    print >> stdout, "Default conversions:"
+    print >> stdout
+    print_report(stdout, results[False])
+    print >> stdout
+    print >> stdout, "Deterministic conversions:"
+    print >> stdout
+    print_report(stdout, results[True])
+    return failed
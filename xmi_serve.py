@@ -0,0 +1,166 @@
+# Copyright (c) 2011, 2012, Jeroen Ketema, University of Twente
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+#  * Neither the name of the University of Twente nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Serving of conversions over HTTP, on a local port or a Unix socket; only
+imported by the serve mode, to keep the startup of other modes fast
+"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler
+from os             import remove, stat
+from os.path        import exists
+from Queue          import Queue
+from SocketServer   import TCPServer, UnixStreamServer
+from stat           import S_ISSOCK
+from threading      import Thread
+from time           import time
+from traceback      import format_exc
+
+from odl.odl_messages import stderr
+
+try:
+    from urlparse import parse_qs
+except ImportError: # Python 2.5
+    from cgi import parse_qs
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """Handler of the requests to a conversion service:
+
+        GET /list?export=PATH
+        GET /generate?export=PATH[&package=NAME][&deterministic=0|1]
+        GET /stats
+
+    where PATH is the path of the export as seen by the server
+    """
+
+    def do_GET(self):
+        start   = time()
+        service = self.server.service
+        (path, _, query) = self.path.partition("?")
+        args    = parse_qs(query)
+        export  = args.get("export", [""])[0]
+        content = "text/plain"
+
+        try:
+            if path == "/stats":
+                (status, body) = (200, service.Stats())
+            elif path not in ["/list", "/generate"]:
+                (status, body) = (404, "Unknown request " + path + "\n")
+            elif export == "":
+                (status, body) = (400, "No export given\n")
+            elif path == "/list":
+                (status, body) = (200, service.List(export))
+            else:
+                deterministic = args.get("deterministic", [None])[0]
+
+                if deterministic != None:
+                    deterministic = deterministic == "1"
+
+                body = service.Generate(export, \
+                                            args.get("package", [None])[0], \
+                                            deterministic)
+                (status, content) = (200, "application/xml")
+        except Exception, error:
+            stderr.write(format_exc())
+            (status, body) = (500, "Error: " + str(error) + "\n")
+
+        self.send_response(status)
+        self.send_header("Content-Type", content)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        service.Report(path[1:], export, status, time() - start)
+
+    def log_message(self, format, *args):
+        pass # Requests are reported by the service
+
+class PooledServerMixIn:
+    """Mix-in for a socket server that handles requests in a fixed pool of
+    worker threads instead of in the thread of the server
+    """
+
+    def start_workers(self, count):
+        self.requests = Queue()
+
+        for i in range(count):
+            worker = Thread(target = self.work)
+            worker.setDaemon(True)
+            worker.start()
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def work(self):
+        while True:
+            (request, client_address) = self.requests.get()
+
+            try:
+                self.finish_request(request, client_address)
+            except:
+                self.handle_error(request, client_address)
+
+            self.close_request(request)
+
+class PooledTcpServer(PooledServerMixIn, TCPServer):
+    allow_reuse_address = True
+
+class PooledUnixServer(PooledServerMixIn, UnixStreamServer):
+    pass
+
+def serve(address, service, workers):
+    """Serves the given conversion service with the given number of worker
+    threads, on a port of the local host if the address is a number, and on
+    a Unix socket with the address as path otherwise
+    """
+
+    if address.isdigit():
+        server = PooledTcpServer(("127.0.0.1", int(address)), \
+                                     ConversionHandler)
+        stderr.write("Serving on http://127.0.0.1:" + address + "/\n")
+    else:
+        if exists(address) and S_ISSOCK(stat(address).st_mode):
+            remove(address) # Left behind by an earlier server
+
+        server = PooledUnixServer(address, ConversionHandler)
+        stderr.write("Serving on " + address + "\n")
+
+    server.service = service
+    server.start_workers(workers)
+
+    try:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    finally:
+        server.server_close()
+
+        if not address.isdigit():
+            remove(address)
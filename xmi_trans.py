@@ -30,575 +30,2450 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from odl.odl_parser  import OdlParseFile
-from odl.odl_extract import GetModel, GetClasses, GetSuperClasses, \
+# Taken before anything else is imported, to report the startup time
+from time import sleep, time
+start_time = time()
+
+if __name__ == "__main__":
+    # When run as a script, use the ply and pyth modules checked out next to
+    # it, if any; importers of this module set up their own path instead
+    from os.path import abspath, dirname, join
+    from sys     import path
+
+    path.append(join(dirname(abspath(__file__)), "ply"))
+    path.append(join(dirname(abspath(__file__)), "pyth"))
+
+from odl.odl_cache    import OdlCache, OdlMemoryCache
+from odl.odl_messages import stderr
+from odl.odl_parser   import OdlParseFile, OdlBenchmarkLexers, \
+    OdlParser, OdlDescriptionSize, OdlRecorder, OdlDigest, OdlHashFile
+from odl.odl_extract  import GetModel, GetClasses, GetSuperClasses, \
     GetAttributes, GetAssociations, GetEvents, GetParameters, GetStates, \
     GetTransitions, GetBasicTypes, GetEnumeratedTypes, GetAliasTypes, \
-    GetSequenceTypes, GetArrayTypes, FindPackageClasses, FindPackageEvents, \
-    GetPackageHierarchy
-
-from cgi     import escape
-from uuid    import uuid4
-from sys     import argv, stderr
-from zipfile import is_zipfile, ZipFile
-
-classes       = None
-super_classes = None
-attributes    = None
-associations  = None
-parameters    = None
-states        = None
-transitions   = None
-basic_types   = None
-enum_types    = None
-
-signals = {}
-times   = {}
-changes = {}
-
-def GatherSignals(odl_data, used_events):
-    events = GetEvents(odl_data, used_events)
-
-    for event in events:
-        signals[event] = (events[event], str(uuid4()))
-
-def GatherTimesAndChanges():
-    for transition in transitions:
-        if transition.event[:7] == "Change/":
-            changes[transition.ident] = str(uuid4())
-
-        if transition.event[:5] == "Time/":
-            times[transition.ident] = str(uuid4())
-
-def PrintHeader(odl_data):
-    (ident, name) = GetModel(odl_data)
-
-    print "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
-    print "<uml:Model xmi:version=\"2.1\" " \
-        + "xmlns:xmi=\"http://schema.omg.org/spec/XMI/2.1\" " \
-        + "xmlns:uml=\"http://www.eclipse.org/uml2/2.1.0/UML\" " \
-        + "xmi:id=\"_" + ident + "\" name=\"" + escape(name, True) + "\">"
-
-def PrintClassHeader(ident, name):
-    print "  <packagedElement xmi:type=\"uml:Class\" " \
-        + "xmi:id=\"_" + ident + "\" " \
-        + "name=\"" + escape(name, True) + "\" " \
-        + "isActive=\"true\">"
-
-def PrintSuperClasses(ident):
-    for general_ident in super_classes[ident]:
-        print "    <generalization xmi:id=\"_" + general_ident + "\" " \
-            + "general=\"_" + super_classes[ident][general_ident] + "\"/>"
-
-def PrintAttributes(class_attributes):
-    for attribute in class_attributes:
-        if attribute.type != None:
-            attribute_type = attribute.type
+    GetSequenceTypes, GetArrayTypes, FindPackageContents, ExtractModelData, \
+    GetPackageHierarchy, GetRtfTexts, RtfDecoder, GetRtfCorpus, \
+    CheckRtfDecoding, GetRtfSamples, CheckRtfSamples, BenchmarkRtfDecoding, \
+    TransitionData
+
+from cgi       import escape
+from cStringIO import StringIO
+from gzip      import GzipFile
+from hashlib   import md5, sha1
+from marshal   import dump, load
+from optparse  import OptionParser
+from os        import close, dup, dup2, listdir, makedirs, remove, rename, \
+    stat, walk
+from os.path   import abspath, basename, dirname, exists, getmtime, isdir, \
+    join, splitext
+from threading import Lock
+from traceback import format_exc, print_exc
+from uuid      import uuid4
+from sys       import stdout
+from zipfile   import BadZipfile, is_zipfile, ZipFile, ZIP_DEFLATED
+
+def temporary_name(file_name):
+    """Returns the name of a new temporary file next to the given file
+    """
+
+    return join(dirname(abspath(file_name)), \
+                    "." + basename(file_name) + "." + uuid4().hex + ".tmp")
+
+class XmiOutput(object):
+    """Buffered output of the generated XMI, either to a stream (standard
+    output by default) or to a file; files ending in .gz are compressed with
+    gzip, and files ending in .zip become a zip archive holding a single XMI
+    file
+
+    Files are first written under a temporary name and only get their own
+    name once complete, so that an output file is never partly written
+    """
+
+    def __init__(self, file_name = None, buffer_size = 1 << 20, \
+                     stream = None):
+        self.file_name   = file_name
+        self.temp_name   = None
+        self.file        = None
+        self.buffer      = []
+        self.size        = 0
+        self.buffer_size = buffer_size
+        self.position    = 0 # Number of bytes of XMI written
+
+        if file_name == None:
+            if stream == None:
+                stream = stdout
+
+            self.target = stream
+            return
+
+        self.temp_name = temporary_name(file_name)
+        self.file      = open(self.temp_name, 'wb')
+
+        if file_name.endswith(".gz"):
+            self.target = GzipFile(file_name, 'wb', 9, self.file)
+        else:
+            # Zip archives cannot be written incrementally, so for these
+            # the XMI is archived once complete
+            self.target = self.file
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.size     += len(data)
+        self.position += len(data)
+
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.target.write("".join(self.buffer))
+        self.buffer = []
+        self.size   = 0
+
+    def close(self):
+        self.flush()
+
+        if self.file_name == None:
+            self.target.flush()
+            return
+
+        self.target.close()
+        self.file.close()
+
+        if self.file_name.endswith(".zip"):
+            archive_name = temporary_name(self.file_name)
+            archive = ZipFile(archive_name, 'w', ZIP_DEFLATED)
+            archive.write(self.temp_name, \
+                              splitext(basename(self.file_name))[0] + ".xmi")
+            archive.close()
+            remove(self.temp_name)
+            self.temp_name = archive_name
+
+        rename(self.temp_name, self.file_name)
+
+    def discard(self):
+        """Closes the output after a failure, removing the partly written
+        file
+        """
+
+        if self.file_name == None:
+            return
+
+        self.target.close()
+        self.file.close()
+        remove(self.temp_name)
+
+class XmiInput(object):
+    """Reader of XMI written to a file by XmiOutput, used to copy parts of
+    a previous conversion; parts are read fastest in the order of the file
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.archive   = None
+        self.source    = None
+        self.position  = 0
+        self.open()
+
+    def open(self):
+        if self.file_name.endswith(".gz"):
+            self.source = GzipFile(self.file_name, 'rb')
+        elif self.file_name.endswith(".zip"):
+            self.archive = ZipFile(self.file_name)
+            self.source  = self.archive.open(self.archive.namelist()[0])
         else:
-            attribute_type = "cD-CwF6WEd-1BtN3LP_f7A"
+            self.source = open(self.file_name, 'rb')
 
-        string = "    <ownedAttribute xmi:id=\"_" + attribute.ident + "\" " \
-            + "name=\"" + escape(attribute.name, True) + "\" " \
-            + "type=\"_" + attribute_type + "\" " \
-            + "isUnique=\"false\""
+        self.position = 0
 
-        if attribute.name[0] == "/":
-            string += " isDerived=\"true\""
+    def read(self, start, end):
+        """Returns the XMI from the given start up to the given end
+        """
 
-        if attribute.default == None:
-            string += "/>"
-            print string
-            continue
+        if start < self.position:
+            self.close()
+            self.open()
 
-        string += ">"
-        print string
-
-        print "      <defaultValue xmi:type=\"uml:OpaqueExpression\" " \
-            + "xmi:id=\"_" + str(uuid4()) + "\">"
-        print "        <language>xuml</language>"
-        print "        <body>" + escape(attribute.default, True) + "</body>"
-        print "      </defaultValue>"
-        print "    </ownedAttribute>"
-
-def PrintValues(upper, lower):
-    print "      <upperValue xmi:type=\"uml:LiteralUnlimitedNatural\" " \
-        + "xmi:id=\"_" + str(uuid4()) + "\" " \
-        + "value=\"" + upper + "\"/>"
-
-    if lower == None:
-        print "      <lowerValue xmi:type=\"uml:LiteralInteger\" " \
-            + "xmi:id=\"_" + str(uuid4()) + "\"/>"
-    else:
-        print "      <lowerValue xmi:type=\"uml:LiteralInteger\" " \
-            + "xmi:id=\"_" + str(uuid4()) + "\" " \
-            + "value=\"" + lower + "\"/>"
-
-def PrintAttributeAssociation(ident, data, index):
-    print "    <ownedAttribute xmi:id=\"_" + data.role[index] +"\" " \
-        + "name=\"" + escape(data.name[index], True) +"\" " \
-        + "type=\"_" + data.owner[index] + "\" " \
-        + "isUnique=\"false\" " \
-        + "association=\"_" + ident + "\">"
-    PrintValues(data.upper[index], data.lower[index])
-    print "    </ownedAttribute>"
-
-def PrintAttributeAssociations(ident):
-    for association_ident in associations:
-        data = associations[association_ident]
-
-        if data.owner[0] == ident and data.name[1] != "":
-            PrintAttributeAssociation(association_ident, data, 1)
-
-        if data.owner[1] == ident and data.name[0] != "":
-            PrintAttributeAssociation(association_ident, data, 0)
-
-def PrintParameters(event_parameters):
-    for parameter in event_parameters:
-        if parameter.type != None:
-            parameter_type = parameter.type
+        while self.position < start:
+            data = self.source.read(min(start - self.position, 1 << 20))
+
+            if data == "":
+                raise IOError("Unexpected end of " + self.file_name)
+
+            self.position += len(data)
+
+        parts = []
+
+        while self.position < end:
+            data = self.source.read(end - self.position)
+
+            if data == "":
+                raise IOError("Unexpected end of " + self.file_name)
+
+            parts.append(data)
+            self.position += len(data)
+
+        return "".join(parts)
+
+    def close(self):
+        self.source.close()
+
+        if self.archive != None:
+            self.archive.close()
+            self.archive = None
+
+class Converter(object):
+    """Conversion of a parsed model, or of some of its packages, to XMI
+
+    All state of a conversion is kept by the converter, so that a process
+    can convert several models or packages, one after another or at the
+    same time
+
+    If the conversion is deterministic, converting the same model twice
+    yields the same XMI: elements without an Artisan identifier get an
+    identifier derived from their owner, role, and position, and elements
+    are written in the order of their identifiers
+    """
+
+    def __init__(self, odl_data, decoder, out, deterministic = False):
+        self.odl_data      = odl_data
+        self.decoder       = decoder
+        self.out           = out
+        self.deterministic = deterministic
+        self.model_id      = GetModel(odl_data)[0]
+
+        # Identifier of the special <<Destroy>> signal
+        self.destroy_event_id = self.NewId("Destroy")
+
+        self.classes       = None
+        self.super_classes = None
+        self.attributes    = None
+        self.associations  = None
+        self.parameters    = None
+        self.states        = None
+        self.transitions   = None
+        self.basic_types   = None
+        self.enum_types    = None
+
+        self.signals = {}
+        self.times   = {}
+        self.changes = {}
+
+        self.outgoing    = {}
+        self.entry_exits = {}
+
+        self.class_associations = {}
+        self.class_states       = {}
+        self.class_events       = {}
+        self.received           = set()
+        self.states_by_class    = {}
+
+    def NewId(self, *parts):
+        """Returns the identifier of an element without Artisan identifier,
+        given the identifier of its owner, its role, and its position
+        """
+
+        if not self.deterministic:
+            return str(uuid4())
+
+        digest = md5("\0".join([self.model_id] \
+                                   + [str(part) for part in parts])) \
+                                   .hexdigest()
+
+        return digest[:8] + "-" + digest[8:12] + "-" + digest[12:16] + "-" \
+            + digest[16:20] + "-" + digest[20:]
+
+    def Ordered(self, idents):
+        """Yields the given identifiers, sorted if the conversion is
+        deterministic
+        """
+
+        if self.deterministic:
+            return sorted(idents)
+
+        return idents
+
+    def GatherSignals(self, used_events):
+        events = GetEvents(self.odl_data, used_events, self.destroy_event_id)
+
+        for event in events:
+            self.signals[event] = (events[event], self.NewId(event, "Signal"))
+
+    def GatherTimesAndChanges(self, transitions):
+        for transition in transitions:
+            if transition.event[:7] == "Change/":
+                self.changes[transition.ident] = \
+                    self.NewId(transition.ident, "ChangeEvent")
+
+            if transition.event[:5] == "Time/":
+                self.times[transition.ident] = \
+                    self.NewId(transition.ident, "TimeEvent")
+
+    def GatherTransitionsByState(self, transitions):
+        """Groups the given transitions by source state, keeping the position
+        of each transition in the list of transitions, and separately groups
+        the entry and exit blocks of each state
+        """
+
+        for (index, transition) in enumerate(transitions):
+            self.outgoing.setdefault(transition.source, []). \
+                append((index, transition))
+
+            if transition.event[:6] == "Entry/" \
+                    or transition.event[:5] == "Exit/":
+                self.entry_exits.setdefault(transition.source, []). \
+                    append(transition)
+
+    def GatherClassViews(self):
+        """Buckets the associations, the outermost states, and the transitions
+        with signal events by class, so that each class can be printed without
+        going through all associations, states, and transitions
+        """
+
+        for association_ident in self.Ordered(self.associations):
+            data = self.associations[association_ident]
+
+            if data.name[1] != "":
+                self.class_associations.setdefault(data.owner[0], []). \
+                    append((association_ident, 1))
+
+            if data.name[0] != "":
+                self.class_associations.setdefault(data.owner[1], []). \
+                    append((association_ident, 0))
+
+        for state_ident in self.Ordered(self.states):
+            state = self.states[state_ident]
+
+            if state.superstate == None:
+                self.class_states.setdefault(state.class_id, []). \
+                    append(state_ident)
+
+        self.GatherClassEvents(self.transitions)
+
+    def GatherClassEvents(self, transitions):
+        """Buckets the given transitions with signal events by class, keeping
+        only the first transition of a class with a given event
+        """
+
+        for transition in transitions:
+            if transition.event[:7] != "signal/" \
+                    and transition.event[:10] != "signal_in/":
+                continue
+
+            class_id = self.states[transition.source].class_id
+
+            if (class_id, transition.event_id) in self.received:
+                continue
+
+            self.received.add((class_id, transition.event_id))
+            self.class_events.setdefault(class_id, []).append(transition)
+
+    def GetRegionTransitions(self, state_idents):
+        """Yields the transitions starting in one of the given states, in the
+        order of the list of all transitions
+        """
+
+        region_transitions = []
+
+        for state_ident in set(state_idents):
+            region_transitions.extend(self.outgoing.get(state_ident, []))
+
+        region_transitions.sort()
+        return [transition for (_, transition) in region_transitions]
+
+    def PrintHeader(self):
+        (ident, name) = GetModel(self.odl_data)
+
+        print >> self.out, "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+        print >> self.out, "<uml:Model xmi:version=\"2.1\" " \
+            + "xmlns:xmi=\"http://schema.omg.org/spec/XMI/2.1\" " \
+            + "xmlns:uml=\"http://www.eclipse.org/uml2/2.1.0/UML\" " \
+            + "xmi:id=\"_" + ident + "\" name=\"" + escape(name, True) + "\">"
+
+    def PrintClassHeader(self, ident, name):
+        print >> self.out, "  <packagedElement xmi:type=\"uml:Class\" " \
+            + "xmi:id=\"_" + ident + "\" " \
+            + "name=\"" + escape(name, True) + "\" " \
+            + "isActive=\"true\">"
+
+    def PrintSuperClasses(self, ident):
+        for general_ident in self.Ordered(self.super_classes[ident]):
+            print >> self.out, "    <generalization " \
+                + "xmi:id=\"_" + general_ident + "\" " \
+                + "general=\"_" + self.super_classes[ident][general_ident] \
+                + "\"/>"
+
+    def PrintAttributes(self, class_attributes):
+        for attribute in class_attributes:
+            if attribute.type != None:
+                attribute_type = attribute.type
+            else:
+                attribute_type = "cD-CwF6WEd-1BtN3LP_f7A"
+
+            string = "    <ownedAttribute " \
+                + "xmi:id=\"_" + attribute.ident + "\" " \
+                + "name=\"" + escape(attribute.name, True) + "\" " \
+                + "type=\"_" + attribute_type + "\" " \
+                + "isUnique=\"false\""
+
+            if attribute.name[0] == "/":
+                string += " isDerived=\"true\""
+
+            if attribute.default == None:
+                string += "/>"
+                print >> self.out, string
+                continue
+
+            string += ">"
+            print >> self.out, string
+
+            print >> self.out, "      <defaultValue " \
+                + "xmi:type=\"uml:OpaqueExpression\" " \
+                + "xmi:id=\"_" + self.NewId(attribute.ident, "DefaultValue") \
+                + "\">"
+            print >> self.out, "        <language>xuml</language>"
+            print >> self.out, "        <body>" \
+                + escape(attribute.default, True) + "</body>"
+            print >> self.out, "      </defaultValue>"
+            print >> self.out, "    </ownedAttribute>"
+
+    def PrintValues(self, owner, upper, lower):
+        print >> self.out, "      <upperValue " \
+            + "xmi:type=\"uml:LiteralUnlimitedNatural\" " \
+            + "xmi:id=\"_" + self.NewId(owner, "UpperValue") + "\" " \
+            + "value=\"" + upper + "\"/>"
+
+        if lower == None:
+            print >> self.out, "      <lowerValue " \
+                + "xmi:type=\"uml:LiteralInteger\" " \
+                + "xmi:id=\"_" + self.NewId(owner, "LowerValue") + "\"/>"
         else:
-            parameter_type = "cD-CwF6WEd-1BtN3LP_f7A"
+            print >> self.out, "      <lowerValue " \
+                + "xmi:type=\"uml:LiteralInteger\" " \
+                + "xmi:id=\"_" + self.NewId(owner, "LowerValue") + "\" " \
+                + "value=\"" + lower + "\"/>"
+
+    def PrintAttributeAssociation(self, ident, data, index):
+        print >> self.out, "    <ownedAttribute " \
+            + "xmi:id=\"_" + data.role[index] +"\" " \
+            + "name=\"" + escape(data.name[index], True) +"\" " \
+            + "type=\"_" + data.owner[index] + "\" " \
+            + "isUnique=\"false\" " \
+            + "association=\"_" + ident + "\">"
+        self.PrintValues(data.role[index], data.upper[index], \
+                             data.lower[index])
+        print >> self.out, "    </ownedAttribute>"
+
+    def PrintAttributeAssociations(self, ident):
+        for (association_ident, index) in \
+                self.class_associations.get(ident, []):
+            self.PrintAttributeAssociation(association_ident, \
+                self.associations[association_ident], index)
+
+    def PrintParameters(self, owner, event_parameters):
+        for (index, parameter) in enumerate(event_parameters):
+            if parameter.type != None:
+                parameter_type = parameter.type
+            else:
+                parameter_type = "cD-CwF6WEd-1BtN3LP_f7A"
+
+            print >> self.out, "      <ownedParameter " \
+                + "xmi:id=\"_" + self.NewId(owner, "Parameter", index) \
+                + "\" " \
+                + "name=\"" + escape(parameter.name, True) + "\" " \
+                + "type=\"_" + parameter_type + "\"/>"
+
+    def AddUnknownSignal(self, event_id, event):
+        """Adds a signal for an event received by a class that is not among
+        the events converted
+        """
+
+        if event[:7] == "signal/":
+            event_name = event[7:]
+        elif event[:10] == "signal_in/":
+            event_name = event[10:]
+
+        stderr.write("Waring: event " + event_name + " not found\n")
+        self.signals[event_id] = (event_name, self.NewId(event_id, "Signal"))
+
+    def PrintOwnedReceptions(self, ident):
+        count = 0
+
+        for transition in self.class_events.get(ident, []):
+            if transition.event_id not in self.signals:
+                self.AddUnknownSignal(transition.event_id, transition.event)
+
+            reception_id = self.NewId(ident, "Reception", transition.event_id)
+
+            string = "    <ownedReception xmi:id=\"_" + reception_id + "\" " \
+                + "name=\"Reception_" + str(count) + "\" " \
+                + "signal=\"_" + self.signals[transition.event_id][1] + "\""
+
+            if self.parameters[transition.event_id] == []:
+                string += "/>"
+                print >> self.out, string
+            else:
+                string += ">"
+                print >> self.out, string
+                self.PrintParameters(reception_id, \
+                                         self.parameters[transition.event_id])
+                print >> self.out, "    </ownedReception>"
 
-        print "      <ownedParameter xmi:id=\"_" + str(uuid4()) + "\" " \
-            + "name=\"" + escape(parameter.name, True) + "\" " \
-            + "type=\"_" + parameter_type + "\"/>"
+            count += 1
 
-def PrintOwnedReceptions(ident):
-    events = []
+    def PrintTransition(self, transition, indent, count):
+        if transition.event == "Entry/" \
+                or transition.event == "Exit/":
+            return
+
+        string = indent \
+            + "        <transition xmi:id=\"_" + transition.ident + "\" " \
+            + "name=\"From_" \
+                + escape(self.states[transition.source].name, True) \
+                + "_to_" \
+                + escape(self.states[transition.target].name, True) \
+                + "_Transition_" \
+                + str(count) + "\" " \
+            + "target=\"_" + transition.target + "\" " \
+            + "source=\"_" + transition.source + "\""
+
+        if transition.event == "None" \
+                and transition.guard == "" \
+                and transition.action == "":
+            string += "/>"
+            print >> self.out, string
+            return
 
-    for transition in transitions:
-        if states[transition.source].class_id != ident:
-            continue
+        if transition.guard != "":
+            string += " guard=\"_" + transition.guard_id + "\""
 
-        if transition.event[:7] != "signal/" \
-                and transition.event[:10] != "signal_in/":
-            continue
+        if transition.event[:10] == "signal_in/":
+            string += " kind=\"internal\""
 
-        if transition.event_id in events:
-            continue
+        string += ">"
+        print >> self.out, string
 
-        if transition.event_id not in signals:
-            if transition.event[:7] == "signal/":
-                event_name = transition.event[7:]
-            elif transition.event[:10] == "signal_in/":
-                event_name = transition.event[10:]
+        if transition.event[:5] == "Time/":
+            transition.event_id = self.times[transition.ident]
 
-            stderr.write("Waring: event " + event_name + " not found\n")
-            signals[transition.event_id] = (event_name, str(uuid4()))
+        if transition.event[:7] == "Change/":
+            transition.event_id = self.changes[transition.ident]
+
+        if transition.event_id != None:
+            print >> self.out, indent \
+                + "          <trigger " \
+                + "xmi:id=\"_" + self.NewId(transition.ident, "Trigger") \
+                + "\" " \
+                + "name=\"Trigger_0\" " \
+                + "event=\"_" + transition.event_id + "\"/>"
+
+        if transition.guard != "":
+            print >> self.out, indent \
+                + "          <ownedRule " \
+                + "xmi:id=\"_" + transition.guard_id + "\" " \
+                + "name=\"Guard\">"
+            print >> self.out, indent \
+                + "            <specification " \
+                + "xmi:type=\"uml:LiteralString\" " \
+                + "xmi:id=\"_" + self.NewId(transition.ident, "Guard") \
+                + "\" " \
+                + "value=\"" + escape(transition.guard, True) + "\"/>"
+            print >> self.out, indent + "          </ownedRule>"
+
+        if transition.action != "":
+            print >> self.out, indent \
+                + "          <effect xmi:type=\"uml:OpaqueBehavior\" " \
+                + "xmi:id=\"_" + self.NewId(transition.ident, "Effect") \
+                + "\" " \
+                + "name=\"Effect\">"
+            print >> self.out, indent + "            <language>xuml</language>"
+            print >> self.out, indent \
+                + "            <body>" \
+                + escape(transition.action, True) \
+                + "</body>"
+            print >> self.out, indent \
+                + "          </effect>"
+
+        print >> self.out, indent + "        </transition>"
+
+    def PrintRegion(self, ident, indent):
+        print >> self.out, indent \
+            + "        <region " \
+            + "xmi:id=\"_" + self.NewId(ident, "Region") + "\" " \
+            + "name=\"" + escape(self.states[ident].name, True) + "\">"
+
+        for state_ident in self.Ordered(self.states[ident].substates):
+            self.PrintState(state_ident, indent + "  ")
+
+        count = 0
+
+        substates = self.states[ident].substates
+
+        for transition in self.GetRegionTransitions(substates):
+            self.PrintTransition(transition, indent + "  ", count)
+            count += 1
 
-        events.append(transition.event_id)
-        string = "    <ownedReception xmi:id=\"_" + str(uuid4()) + "\" " \
-            + "name=\"Reception_" + str(len(events) - 1) + "\" " \
-            + "signal=\"_" + signals[transition.event_id][1] + "\""
+        print >> self.out, indent + "        </region>"
+
+    def PrintSubregions(self, ident, indent):
+        for state_ident in self.Ordered(self.states[ident].substates):
+            self.PrintRegion(state_ident, indent)
+
+    def PrintEntryExit(self, entry_exit, indent):
+        if entry_exit == []:
+            return
+
+        for transition in entry_exit:
+            if transition.event[:6] == "Entry/":
+                print >> self.out, indent \
+                    + "          <entry xmi:type=\"uml:OpaqueBehavior\" " \
+                    + "xmi:id=\"_" + transition.ident + "\" " \
+                    + "name=\"Entry\">"
+            elif transition.event[:5] == "Exit/":
+                print >> self.out, indent \
+                    + "          <exit xmi:type=\"uml:OpaqueBehavior\" " \
+                    + "xmi:id=\"_" + transition.ident + "\" " \
+                    + "name=\"Exit\">"
+
+            print >> self.out, indent + "            <language>xuml</language>"
+            print >> self.out, indent + "            <body>" \
+                + escape(transition.action, True) + "</body>"
+
+            if transition.event[:6] == "Entry/":
+                print >> self.out, indent + "          </entry>"
+            elif transition.event[:5] == "Exit/":
+                print >> self.out, indent + "          </exit>"
+
+    def PrintState(self, ident, indent):
+        entry_exit = self.entry_exits.get(ident, [])
+
+        string = indent \
+            + "        <subvertex " \
+            + "xmi:type=\"" + self.states[ident].vtype + "\" " \
+            + "xmi:id=\"_" + ident + "\" " \
+            + "name=\"" + escape(self.states[ident].name, True) + "\""
 
-        if parameters[transition.event_id] == []:
+        if self.states[ident].substates == [] and entry_exit == []:
             string += "/>"
-            print string
+            print >> self.out, string
+        elif self.states[ident].substates == [] and entry_exit != []:
+            string += ">"
+            print >> self.out, string
+
+            self.PrintEntryExit(entry_exit, indent)
+
+            print >> self.out, indent + "        </subvertex>"
         else:
             string += ">"
-            print string
-            PrintParameters(parameters[transition.event_id])
-            print "    </ownedReception>"
+            print >> self.out, string
 
-def PrintTransition(transition, indent, count):
-    if transition.event == "Entry/" \
-            or transition.event == "Exit/":
-        return
+            if self.states[ident].is_parallel:
+                self.PrintSubregions(ident, indent + "  ")
+            else:
+                self.PrintRegion(ident, indent + "  ")
 
-    string = indent \
-        + "        <transition xmi:id=\"_" + transition.ident + "\" " \
-        + "name=\"From_" + escape(states[transition.source].name, True) \
-            + "_to_" \
-            + escape(states[transition.target].name, True) + "_Transition_" \
-            + str(count) + "\" " \
-        + "target=\"_" + transition.target + "\" " \
-        + "source=\"_" + transition.source + "\""
-
-    if transition.event == "None" \
-            and transition.guard == "" \
-            and transition.action == "":
-        string += "/>"
-        print string
-        return
+            self.PrintEntryExit(entry_exit, indent)
+
+            print >> self.out, indent + "        </subvertex>"
+
+    def PrintStateMachines(self, ident, class_name):
+        outer_states = self.class_states.get(ident, [])
+
+        if outer_states == []:
+            return
 
-    if transition.guard != "":
-        string += " guard=\"_" + transition.guard_id + "\""
-
-    if transition.event[:10] == "signal_in/":
-        string += " kind=\"internal\""
-
-    string += ">"
-    print string
-
-    if transition.event[:5] == "Time/":
-        transition.event_id = times[transition.ident]
-
-    if transition.event[:7] == "Change/":
-        transition.event_id = changes[transition.ident]
-
-    if transition.event_id != None:
-        print indent \
-            + "          <trigger xmi:id=\"_" + str(uuid4()) + "\" " \
-            + "name=\"Trigger_0\" " \
-            + "event=\"_" + transition.event_id + "\"/>"
-
-    if transition.guard != "":
-        print indent \
-            + "          <ownedRule xmi:id=\"_" + transition.guard_id + "\" " \
-            + "name=\"Guard\">"
-        print indent \
-            + "            <specification xmi:type=\"uml:LiteralString\" " \
-            + "xmi:id=\"_" + str(uuid4()) + "\" " \
-            + "value=\"" + escape(transition.guard, True) + "\"/>"
-        print indent + "          </ownedRule>"
-
-    if transition.action != "":
-        print indent \
-            + "          <effect xmi:type=\"uml:OpaqueBehavior\" " \
-            + "xmi:id=\"_" + str(uuid4()) + "\" " \
-            + "name=\"Effect\">"
-        print indent + "            <language>xuml</language>"
-        print indent \
-            + "            <body>" \
-            + escape(transition.action, True) \
-            + "</body>"
-        print indent \
-            + "          </effect>"
-
-    print indent + "        </transition>"
-
-def PrintRegion(ident, indent):
-    print indent \
-        + "        <region xmi:id=\"_" + str(uuid4()) + "\" " \
-        + "name=\"" + escape(states[ident].name, True) + "\">"
-
-    for state_ident in states[ident].substates:
-        PrintState(state_ident, indent + "  ")
-
-    count = 0
-
-    for transition in transitions:
-        if transition.source in states[ident].substates:
-            PrintTransition(transition, indent + "  ", count)
+        print >> self.out, "    <ownedBehavior " \
+            + "xmi:type=\"uml:StateMachine\" " \
+            + "xmi:id=\"_" + self.NewId(ident, "StateMachine") + "\" " \
+            + "name=\"" + escape(class_name, True) + "\">"
+        print >> self.out, "      <region " \
+            + "xmi:id=\"_" + self.NewId(ident, "Region") + "\" " \
+            + "name=\"" + escape(class_name, True) + "\">"
+
+        for state_ident in outer_states:
+            self.PrintState(state_ident, "")
+
+        count = 0
+
+        for transition in self.GetRegionTransitions(outer_states):
+            self.PrintTransition(transition, "", count)
             count += 1
 
-    print indent + "        </region>"
+        print >> self.out, "      </region>"
+        print >> self.out, "    </ownedBehavior>"
+
+    def PrintClassFooter(self):
+        print >> self.out, "  </packagedElement>"
+
+    def PrintClass(self, ident):
+        self.PrintClassHeader(ident, self.classes[ident])
+        self.PrintSuperClasses(ident)
+        self.PrintAttributes(self.attributes[ident])
+        self.PrintAttributeAssociations(ident)
+        self.PrintOwnedReceptions(ident)
+        self.PrintStateMachines(ident, self.classes[ident])
+        self.PrintClassFooter()
+
+    def PrintClasses(self):
+        for ident in self.Ordered(self.classes):
+            self.PrintClass(ident)
+
+    def PrintOwnedEnds(self, data, ident):
+        if data.name[0] == "":
+            print >> self.out, "    <ownedEnd " \
+                + "xmi:id=\"_" + data.role[0] + "\" " \
+                + "name=\"" + escape(self.classes[data.owner[0]], True) \
+                + "\" " \
+                + "type=\"_" + data.owner[0] + "\" " \
+                + "isUnique=\"false\" " \
+                + "association=\"_" + ident + "\">"
+            self.PrintValues(data.role[0], data.upper[0], data.lower[0])
+            print >> self.out, "    </ownedEnd>"
+
+        if data.name[1] == "":
+            print >> self.out, "    <ownedEnd " \
+                + "xmi:id=\"_" + data.role[1] + "\" " \
+                + "name=\"" + escape(self.classes[data.owner[1]], True) \
+                + "\" " \
+                + "type=\"_" + data.owner[1] + "\" " \
+                + "isUnique=\"false\" " \
+                + "association=\"_" + ident + "\">"
+            self.PrintValues(data.role[1], data.upper[1], data.lower[1])
+            print >> self.out, "    </ownedEnd>"
+
+    def PrintAssociations(self):
+        for ident in self.Ordered(self.associations):
+            data = self.associations[ident]
+
+            string = "  <packagedElement xmi:type=\"uml:Association\" " \
+                + "xmi:id=\"_" + ident + "\" " \
+                + "name=\"A_" \
+                        + escape(self.classes[data.owner[0]], True) + "_" \
+                        + escape(self.classes[data.owner[1]], True) + "\" " \
+                + "memberEnd=\"_" + data.role[1] + " _" + data.role[0] + "\""
+
+            if data.name[0] != "" and data.name[1] != "":
+                print >> self.out, string + "/>"
+            else:
+                print >> self.out, string + ">"
+
+            self.PrintOwnedEnds(data, ident)
+
+            if data.name[0] == "" or data.name[1] == "":
+                print >> self.out, "  </packagedElement>"
+
+    def PrintSignals(self):
+        for signal in self.Ordered(self.signals):
+            print >> self.out, "  <packagedElement xmi:type=\"uml:Signal\" " \
+                + "xmi:id=\"_" + self.signals[signal][1] + "\" " \
+                + "name=\"" + escape(self.signals[signal][0], True) + "\"/>"
+
+    def PrintSignalEvents(self):
+        count = 0
+
+        for signal in self.Ordered(self.signals):
+            print >> self.out, "  <packagedElement " \
+                + "xmi:type=\"uml:SignalEvent\" " \
+                + "xmi:id=\"_" + signal + "\" " \
+                + "name=\"SignalEvent_" + str(count) + "\" " \
+                + "signal=\"_" + self.signals[signal][1] + "\"/>"
+            count += 1
 
-def PrintSubregions(ident, indent):
-    for state_ident in states[ident].substates:
-        PrintRegion(state_ident, indent)
+    def PrintTimeEvents(self):
+        count = 0
 
-def PrintEntryExit(entry_exit, indent):
-    if entry_exit == []:
-        return
+        for transition in self.transitions:
+            if transition.event[:5] != "Time/":
+                continue
 
-    for transition in entry_exit:
-        if transition.event[:6] == "Entry/":
-            print indent \
-                + "          <entry xmi:type=\"uml:OpaqueBehavior\" " \
-                + "xmi:id=\"_" + transition.ident + "\" " \
-                + "name=\"Entry\">"
-        elif transition.event[:5] == "Exit/":
-            print indent \
-                + "          <exit xmi:type=\"uml:OpaqueBehavior\" " \
-                + "xmi:id=\"_" + transition.ident + "\" " \
-                + "name=\"Exit\">"
-
-        print indent + "            <language>xuml</language>"
-        print indent + "            <body>" \
-            + escape(transition.action, True) + "</body>"
-
-        if transition.event[:6] == "Entry/":
-            print indent + "          </entry>"
-        elif transition.event[:5] == "Exit/":
-            print indent + "          </exit>"
-
-def PrintState(ident, indent):
-    entry_exit = []
-
-    for transition in transitions:
-        if transition.source != ident:
-            continue
-
-        if transition.event[:6] != "Entry/" \
-                and transition.event[:5] != "Exit/":
-            continue
-
-        entry_exit.append(transition)
-
-    string = indent \
-        + "        <subvertex xmi:type=\"" + states[ident].vtype + "\" " \
-        + "xmi:id=\"_" + ident + "\" " \
-        + "name=\"" + escape(states[ident].name, True) + "\""
-
-    if states[ident].substates == [] and entry_exit == []:
-        string += "/>"
-        print string
-    elif states[ident].substates == [] and entry_exit != []:
-        string += ">"
-        print string
+            when_id = self.NewId(transition.ident, "When")
+
+            print >> self.out, "  <packagedElement " \
+                + "xmi:type=\"uml:TimeEvent\" " \
+                + "xmi:id=\"_" + self.times[transition.ident] + "\" " \
+                + "name=\"TimeEvent_" + str(count) + "\">"
+
+            print >> self.out, "    <when xmi:id=\"_" + when_id + "\">"
+
+            print >> self.out, "      <expr xmi:type=\"uml:LiteralString\" " \
+                + "xmi:id=\"_" + when_id +"\" " \
+                + "value=\"after( " + escape(transition.event[5:], True) \
+                + " )\"/>"
+
+            print >> self.out, "    </when>"
+
+            print >> self.out, "  </packagedElement>"
+
+            count += 1
+
+    def PrintChangeEvents(self):
+        count = 1
 
-        PrintEntryExit(entry_exit, indent)
+        for transition in self.transitions:
+            if transition.event[:7] != "Change/":
+                continue
 
-        print indent + "        </subvertex>"
+            print >> self.out, "  <packagedElement " \
+                + "xmi:type=\"uml:ChangeEvent\" " \
+                + "xmi:id=\"_" + self.changes[transition.ident] + "\" " \
+                + "name=\"ChangeEvent_" + str(count) + "\">"
+
+            print >> self.out, "    <changeExpression " \
+                + "xmi:type=\"uml:LiteralString\" " \
+                + "xmi:id=\"_" \
+                + self.NewId(transition.ident, "ChangeExpression") + "\" " \
+                + "value=\"" + escape(transition.event[7:], True) + "\"/>"
+
+            print >> self.out, "  </packagedElement>"
+
+            count += 1
+
+    def PrintEnumTypes(self):
+        for ident in self.Ordered(self.enum_types):
+            print >> self.out, "  <packagedElement " \
+                + "xmi:type=\"uml:Enumeration\" " \
+                + "xmi:id=\"_" + ident + "\" " \
+                + "name=\"" + escape(self.enum_types[ident].name, True) + "\">"
+
+            for literal in self.enum_types[ident].literals:
+                print >> self.out, "    <ownedLiteral " \
+                    + "xmi:id=\"_" + literal.ident + "\" " \
+                    + "name=\"" + escape(literal.name, True) + "\"/>"
+
+            print >> self.out, "  </packagedElement>"
+
+    def PrintBasicTypes(self):
+        for ident in self.Ordered(self.basic_types):
+            print >> self.out, "  <packagedElement " \
+                + "xmi:type=\"uml:PrimitiveType\" " \
+                + "xmi:id=\"_" + ident + "\" name=\"" \
+                + escape(self.basic_types[ident], True) + "\"/>"
+
+    def PrintFooter(self):
+        print >> self.out, "  <packagedElement " \
+            + "xmi:type=\"uml:PrimitiveType\" " \
+            + "xmi:id=\"_cD-CwF6WEd-1BtN3LP_f7A\" name=\"UndefinedType\"/>"
+        print >> self.out, "</uml:Model>"
+
+    def Generate(self, used_classes, used_events, jobs = 1):
+        """Converts the given classes and events, or all of them if None,
+        decoding RTF texts in the given number of processes
+        """
+
+        self.Extract(used_classes, jobs)
+        self.Write(used_events)
+
+    def Extract(self, used_classes, jobs = 1):
+        """Extracts the data of the given classes, or of all classes if None,
+        from the model, decoding RTF texts in the given number of processes
+        """
+
+        odl_data = self.odl_data
+        decoder  = self.decoder
+
+        self.classes       = GetClasses(odl_data, used_classes)
+        self.states        = GetStates(odl_data, self.classes)
+
+        if jobs > 1:
+            decoder.Prefetch(GetRtfTexts(odl_data, self.classes, \
+                                             self.states), jobs)
+
+        self.super_classes = GetSuperClasses(odl_data, self.classes)
+        self.attributes    = GetAttributes(odl_data, self.classes, decoder)
+        self.associations  = GetAssociations(odl_data, self.classes)
+        self.parameters    = GetParameters(odl_data, self.destroy_event_id)
+        self.transitions   = GetTransitions(odl_data, decoder, self.states, \
+                                                self.destroy_event_id)
+
+        if self.deterministic:
+            self.transitions.sort(key = lambda transition: transition.ident)
+
+        self.basic_types   = GetBasicTypes(odl_data)
+        self.enum_types    = GetEnumeratedTypes(odl_data)
+        GetAliasTypes(odl_data)
+        GetSequenceTypes(odl_data)
+        GetArrayTypes(odl_data)
+
+    def Write(self, used_events):
+        """Writes the XMI of the extracted classes and of the given events,
+        or of all events if None
+        """
+
+        stderr.write("Writing output\n")
+        self.GatherSignals(used_events)
+        self.GatherTimesAndChanges(self.transitions)
+        self.GatherTransitionsByState(self.transitions)
+        self.GatherClassViews()
+
+        self.PrintHeader()
+        self.PrintClasses()
+        self.PrintAssociations()
+        self.PrintSignals()
+        self.PrintSignalEvents()
+        self.PrintTimeEvents()
+        self.PrintChangeEvents()
+        self.PrintEnumTypes()
+        self.PrintBasicTypes()
+        self.PrintFooter()
+        stderr.write("Done!\n")
+
+    def ReadsDigest(self, objects, sources, types):
+        """Returns the digest of the given reads of the model, including the
+        RTF texts in separate files that the objects read refer to
+        """
+
+        digest = sha1(OdlDigest(self.odl_data, objects, sources, types))
+
+        for ident in objects:
+            if ident not in self.odl_data:
+                continue
+
+            rtf = self.odl_data[ident].attributes.get("_Art1_RTF")
+
+            if rtf != None and len(rtf) == 2:
+                try:
+                    digest.update(sha1(self.decoder.Read(rtf)).digest())
+                except (IOError, KeyError):
+                    digest.update("-")
+
+        return digest.hexdigest()
+
+    def ViewDigest(self, ident, events):
+        """Returns the digest of the parts of the model the XMI of a class
+        depends on, other than those read when extracting its attributes and
+        transitions: its name, super classes, associations, and states, and
+        the parameters of the given events it receives
+        """
+
+        super_classes = self.super_classes[ident].items()
+        super_classes.sort()
+
+        associations = []
+
+        for (association_ident, index) in \
+                self.class_associations.get(ident, []):
+            data = self.associations[association_ident]
+            associations.append((association_ident, index, data.name, \
+                                     data.role, data.owner, data.upper, \
+                                     data.lower))
+
+        states = []
+
+        for state_ident in self.Ordered(self.states_by_class.get(ident, {})):
+            data = self.states[state_ident]
+            states.append((state_ident, data.name, data.vtype, \
+                               data.substates, data.superstate, \
+                               data.is_parallel))
+
+        parameters = []
+
+        for (event_id, _) in events:
+            if event_id in self.parameters:
+                parameters.append([(parameter.name, parameter.kind, \
+                                        parameter.type) for parameter \
+                                       in self.parameters[event_id]])
+            else:
+                parameters.append(None)
+
+        return sha1(repr((self.model_id, self.classes[ident], super_classes, \
+                              associations, states, events, parameters))) \
+                              .hexdigest()
+
+    def ConvertClass(self, ident):
+        """Extracts and prints a single class, yielding its record for the
+        manifest of the conversion
+        """
+
+        recorder    = OdlRecorder(self.odl_data)
+        attributes  = GetAttributes(recorder, \
+                                        { ident : self.classes[ident] }, \
+                                        self.decoder)
+        transitions = GetTransitions(recorder, self.decoder, \
+                                         self.states_by_class.get(ident, {}), \
+                                         self.destroy_event_id)
+        transitions.sort(key = lambda transition: transition.ident)
+
+        self.attributes[ident] = attributes[ident]
+        self.GatherTimesAndChanges(transitions)
+        self.GatherTransitionsByState(transitions)
+        self.GatherClassEvents(transitions)
+
+        start = self.out.position
+        self.PrintClass(ident)
+
+        objects = list(recorder.objects)
+        objects.sort()
+        sources = list(recorder.sources)
+        sources.sort()
+        types   = list(recorder.types)
+        types.sort()
+
+        events = [(transition.event_id, transition.event) \
+                      for transition in self.class_events.get(ident, [])]
+        timed  = [(transition.ident, transition.event) \
+                      for transition in transitions \
+                      if transition.event[:5] == "Time/" \
+                          or transition.event[:7] == "Change/"]
+
+        return (start, self.out.position, objects, sources, types, \
+                    self.ReadsDigest(objects, sources, types), \
+                    self.ViewDigest(ident, events), events, timed)
+
+    def ReuseClass(self, ident, record, previous):
+        """Copies the XMI of a class from a previous conversion, given the
+        record of the class in the manifest of that conversion, if the class
+        did not change; yields the record of the class for the manifest of
+        this conversion, or None if the class changed
+        """
+
+        (start, end, objects, sources, types, reads, view, events, timed) \
+            = record
+
+        if self.ReadsDigest(objects, sources, types) != reads \
+                or self.ViewDigest(ident, events) != view:
+            return None
+
+        position = self.out.position
+        self.out.write(previous.read(start, end))
+
+        for (event_id, event) in events:
+            if event_id not in self.signals:
+                self.AddUnknownSignal(event_id, event)
+
+        return (position, self.out.position) + record[2:]
+
+    def GenerateIncremental(self, used_classes, used_events, previous, \
+                                records):
+        """Converts the given classes and events like Generate, but copies
+        the XMI of the classes that did not change since a previous
+        conversion from the output of that conversion, given the records of
+        the classes in its manifest
+
+        Yields the records of the classes for the manifest of this
+        conversion, or None if the classes cannot be converted separately
+        """
+
+        odl_data = self.odl_data
+
+        self.classes = GetClasses(odl_data, used_classes)
+        self.states  = GetStates(odl_data, self.classes)
+
+        for state_ident in self.states:
+            class_id = self.states[state_ident].class_id
+            self.states_by_class.setdefault(class_id, {})[state_ident] = \
+                self.states[state_ident]
+
+        # The states printed for a class are its outermost states and their
+        # substates, which normally are all states of the class
+        for state_ident in self.states:
+            class_id = self.states[state_ident].class_id
+
+            for substate_ident in self.states[state_ident].substates:
+                if substate_ident not in self.states_by_class[class_id]:
+                    stderr.write("Warning: states of several classes are " \
+                                     + "nested, converting all classes\n")
+                    self.Generate(used_classes, used_events)
+                    return None
+
+        self.super_classes = GetSuperClasses(odl_data, self.classes)
+        self.attributes    = {}
+        self.associations  = GetAssociations(odl_data, self.classes)
+        self.parameters    = GetParameters(odl_data, self.destroy_event_id)
+        self.transitions   = []
+        self.basic_types   = GetBasicTypes(odl_data)
+        self.enum_types    = GetEnumeratedTypes(odl_data)
+        GetAliasTypes(odl_data)
+        GetSequenceTypes(odl_data)
+        GetArrayTypes(odl_data)
+
+        stderr.write("Writing output\n")
+        self.GatherSignals(used_events)
+        self.GatherClassViews()
+
+        self.PrintHeader()
+
+        result = {}
+        copied = 0
+
+        for ident in self.Ordered(self.classes):
+            record = None
+
+            if ident in records:
+                record = self.ReuseClass(ident, records[ident], previous)
+
+            if record == None:
+                record = self.ConvertClass(ident)
+            else:
+                copied += 1
+
+            result[ident] = record
+
+            for (transition_ident, event) in record[8]:
+                data       = TransitionData()
+                data.ident = transition_ident
+                data.event = event
+                self.transitions.append(data)
+
+        self.transitions.sort(key = lambda transition: transition.ident)
+        self.GatherTimesAndChanges(self.transitions)
+
+        self.PrintAssociations()
+        self.PrintSignals()
+        self.PrintSignalEvents()
+        self.PrintTimeEvents()
+        self.PrintChangeEvents()
+        self.PrintEnumTypes()
+        self.PrintBasicTypes()
+        self.PrintFooter()
+        stderr.write("Classes: " + str(len(result) - copied) + " converted, " \
+                         + str(copied) + " copied\n")
+        stderr.write("Done!\n")
+
+        return result
+
+def generate_package(odl_data, package, source, cache, jobs, out, \
+                         deterministic = False):
+    if package != []:
+        (used_classes, used_events) = FindPackageContents(package[0], odl_data)
+        stderr.write("Using package " + package[0] + "\n")
     else:
-        string += ">"
-        print string
+        used_classes = None
+        used_events  = None
+
+    decoder = RtfDecoder(source, cache)
+    Converter(odl_data, decoder, out, deterministic) \
+        .Generate(used_classes, used_events, jobs)
+    decoder.Report()
+
+# Version of the manifests of incremental conversions; increase when the XMI
+# of a class or the records of the classes change
+manifest_version = "1"
+
+def load_manifest(file_name):
+    """Returns the records of the classes in the manifest of a previous
+    conversion to the given file, or None if there is no usable manifest
+    """
+
+    manifest_name = file_name + ".manifest"
+
+    if not exists(file_name) or not exists(manifest_name):
+        return None
+
+    try:
+        f = open(manifest_name, 'rb')
+
+        try:
+            (version, size, mtime, records) = load(f)
+        finally:
+            f.close()
+    except (EOFError, ValueError, TypeError):
+        stderr.write("Warning: ignoring corrupt manifest " + manifest_name \
+                         + "\n")
+        return None
+
+    info = stat(file_name)
+
+    # The manifest only describes the file written together with it
+    if version != manifest_version \
+            or size != info.st_size or mtime != info.st_mtime:
+        stderr.write("Warning: ignoring outdated manifest " + manifest_name \
+                         + "\n")
+        return None
+
+    return records
+
+def save_manifest(file_name, records):
+    """Writes the manifest of a conversion to the given file next to it
+    """
+
+    info          = stat(file_name)
+    manifest_name = file_name + ".manifest"
+    temp_name     = temporary_name(manifest_name)
+
+    f = open(temp_name, 'wb')
+    dump((manifest_version, info.st_size, info.st_mtime, records), f, 2)
+    f.close()
+    rename(temp_name, manifest_name)
+
+def generate_incremental(odl_data, package, source, cache, file_name, \
+                             previous_name):
+    """Converts a model, or one of its packages, to the given file like
+    generate_package with deterministic identifiers, but copies the XMI of
+    the classes that did not change from a previous conversion, and writes
+    the manifest of the conversion next to the file
+    """
+
+    if package != []:
+        (used_classes, used_events) = FindPackageContents(package[0], odl_data)
+        stderr.write("Using package " + package[0] + "\n")
+    else:
+        used_classes = None
+        used_events  = None
+
+    records  = load_manifest(previous_name)
+    previous = None
+
+    if records != None:
+        previous = XmiInput(previous_name)
+    else:
+        records = {}
+
+    decoder = RtfDecoder(source, cache)
+    out     = XmiOutput(file_name)
+
+    try:
+        try:
+            records = Converter(odl_data, decoder, out, True) \
+                .GenerateIncremental(used_classes, used_events, previous, \
+                                         records)
+        except:
+            out.discard()
+            raise
+    finally:
+        if previous != None:
+            previous.close()
+
+    out.close()
+
+    if records != None:
+        save_manifest(file_name, records)
+    elif exists(file_name + ".manifest"):
+        remove(file_name + ".manifest")
+
+    decoder.Report()
+
+def convert_package(odl_data, decoder, task):
+    """Converts the classes and events of a single package to XMI, writing
+    the output to the file given by the task
+    """
+
+    (package, used_classes, used_events, file_name, deterministic) = task
+    out = XmiOutput(file_name)
+
+    stderr.write("Using package " + package + "\n")
+
+    try:
+        Converter(odl_data, decoder, out, deterministic) \
+            .Generate(used_classes, used_events)
+    except:
+        out.discard()
+        raise
+
+    out.close()
+
+# Model and RTF decoder of a worker process converting packages
+worker_data = None
+
+def init_package_worker(odl_data, file_name, cache):
+    global worker_data
+
+    # The worker reads RTF texts through its own handle on the export, as
+    # the file offset of the handle of the parent is shared with it
+    if is_zipfile(file_name):
+        source = ZipFile(file_name)
+    else:
+        source = file_name
+
+    worker_data = (odl_data, RtfDecoder(source, cache))
 
-        if states[ident].is_parallel:
-            PrintSubregions(ident, indent + "  ")
+def convert_package_task(task):
+    (odl_data, decoder) = worker_data
+    counts = (decoder.misses, decoder.hits, decoder.cache_hits)
+
+    try:
+        convert_package(odl_data, decoder, task)
+    except Exception:
+        print_exc()
+        return None
+
+    return (decoder.misses - counts[0], decoder.hits - counts[1], \
+                decoder.cache_hits - counts[2])
+
+def generate_packages(odl_data, packages, source, file_name, cache, jobs, \
+                          directory, deterministic = False):
+    """Converts each of the given packages to its own XMI file in the given
+    directory, from a single parse of the export and using the given number
+    of worker processes
+
+    A package that cannot be converted does not stop the conversion of the
+    other packages; the names of such packages are returned
+    """
+
+    tasks = []
+
+    # All packages are looked up before converting any of them, so that a
+    # misspelled package is reported at once
+    for package in packages:
+        (used_classes, used_events) = FindPackageContents(package, odl_data)
+        output = join(directory, package.replace("/", "_") + ".xmi")
+        tasks.append((package, used_classes, used_events, output, \
+                          deterministic))
+
+    if not isdir(directory):
+        makedirs(directory)
+
+    ExtractModelData(odl_data)
+    decoder = RtfDecoder(source, cache)
+    failed  = []
+
+    if jobs > 1 and len(tasks) > 1:
+        from multiprocessing import Pool
+
+        pool = Pool(min(jobs, len(tasks)), init_package_worker, \
+                        (odl_data, file_name, cache))
+
+        try:
+            counts = pool.map(convert_package_task, tasks, 1)
+        finally:
+            pool.terminate()
+
+        for (task, count) in zip(tasks, counts):
+            if count == None:
+                failed.append(task[0])
+                continue
+
+            decoder.misses     += count[0]
+            decoder.hits       += count[1]
+            decoder.cache_hits += count[2]
+    else:
+        for task in tasks:
+            try:
+                convert_package(odl_data, decoder, task)
+            except Exception:
+                print_exc()
+                failed.append(task[0])
+
+    decoder.Report()
+    return failed
+
+def find_exports(path):
+    """Yields the exports in a directory, being the zip files and the
+    directories holding a Contents.odl file, or the exports listed in a
+    manifest file, one on each line and relative to the manifest
+    """
+
+    if isdir(path):
+        exports = []
+
+        for name in sorted(listdir(path)):
+            export = join(path, name)
+
+            if name.endswith(".zip") \
+                    or exists(join(export, "Contents.odl")):
+                exports.append(export)
+
+        return exports
+
+    exports = []
+    f = open(path, 'r')
+
+    for line in f:
+        line = line.strip()
+
+        if line != "" and not line.startswith("#"):
+            exports.append(join(dirname(path), line))
+
+    f.close()
+    return exports
+
+def export_size(export):
+    """Returns the size of the odl description of an export, or 0 if it
+    cannot be determined
+    """
+
+    try:
+        if is_zipfile(export):
+            source = ZipFile(export)
+
+            try:
+                return OdlDescriptionSize(source)
+            finally:
+                source.close()
         else:
-            PrintRegion(ident, indent + "  ")
+            return OdlDescriptionSize(export)
+    except (BadZipfile, KeyError, IOError, OSError):
+        return 0
 
-        PrintEntryExit(entry_exit, indent)
+def export_time(export):
+    """Returns the modification time of an export, being the newest
+    modification time of its directories and files when it is a directory,
+    so that a change to any file, including the files of its RTF texts,
+    counts as a change to the export
+    """
 
-        print indent + "        </subvertex>"
+    if not isdir(export):
+        return getmtime(export)
 
-def PrintStateMachines(ident, class_name):
-    outer_states = []
+    newest = 0
 
-    for state_ident in states:
-        state = states[state_ident]
+    for (directory, _, files) in walk(export):
+        newest = max([newest, getmtime(directory)] \
+                         + [getmtime(join(directory, name)) \
+                                for name in files])
 
-        if state.class_id == ident and state.superstate == None:
-            outer_states.append(state_ident)
+    return newest
 
-    if outer_states == []:
-        return
+def open_export(export):
+    """Opens an export, being a zip file or a directory
+    """
 
-    print "    <ownedBehavior xmi:type=\"uml:StateMachine\" " \
-        + "xmi:id=\"_" + str(uuid4()) + "\" " \
-        + "name=\"" + escape(class_name, True) + "\">"
-    print "      <region xmi:id=\"_" + str(uuid4()) + "\" " \
-        + "name=\"" + escape(class_name, True) + "\">"
+    if is_zipfile(export):
+        return ZipFile(export)
+    elif isdir(export):
+        return export
+    else:
+        raise Exception(export + " is neither a zip file nor a directory")
 
-    for state_ident in outer_states:
-        PrintState(state_ident, "")
+def export_digest(export):
+    """Returns the SHA-1 digest of the complete contents of an export, so
+    that any change to it, including to the files of its RTF texts, yields
+    a different digest
+    """
 
-    count = 0
+    digest = sha1()
 
-    for transition in transitions:
-        if transition.source in outer_states:
-            PrintTransition(transition, "", count)
-            count += 1
+    if isdir(export):
+        names = []
 
-    print "      </region>"
-    print "    </ownedBehavior>"
-
-def PrintClassFooter():
-    print "  </packagedElement>"
-
-def PrintClasses():
-    for ident in classes:
-        PrintClassHeader(ident, classes[ident])
-        PrintSuperClasses(ident)
-        PrintAttributes(attributes[ident])
-        PrintAttributeAssociations(ident)
-        PrintOwnedReceptions(ident)
-        PrintStateMachines(ident, classes[ident])
-        PrintClassFooter()
-
-def PrintOwnedEnds(data, ident):
-    if data.name[0] == "":
-        print "    <ownedEnd xmi:id=\"_" + data.role[0] + "\" " \
-            + "name=\"" + escape(classes[data.owner[0]], True) + "\" " \
-            + "type=\"_" + data.owner[0] + "\" " \
-            + "isUnique=\"false\" " \
-            + "association=\"_" + ident + "\">"
-        PrintValues(data.upper[0], data.lower[0])
-        print "    </ownedEnd>"
+        for (directory, _, files) in walk(export):
+            for name in files:
+                names.append(join(directory, name))
 
-    if data.name[1] == "":
-        print "    <ownedEnd xmi:id=\"_" + data.role[1] + "\" " \
-            + "name=\"" + escape(classes[data.owner[1]], True) + "\" " \
-            + "type=\"_" + data.owner[1] + "\" " \
-            + "isUnique=\"false\" " \
-            + "association=\"_" + ident + "\">"
-        PrintValues(data.upper[1], data.lower[1])
-        print "    </ownedEnd>"
+        names.sort()
+    else:
+        names = [export]
 
-def PrintAssociations():
-    for ident in associations:
-        data = associations[ident]
+    for name in names:
+        digest.update(name[len(export):] + "\0")
+        f = open(name, 'rb')
 
-        string = "  <packagedElement xmi:type=\"uml:Association\" " \
-            + "xmi:id=\"_" + ident + "\" " \
-            + "name=\"A_" + escape(classes[data.owner[0]], True) + "_" \
-                    + escape(classes[data.owner[1]], True) + "\" " \
-            + "memberEnd=\"_" + data.role[1] + " _" + data.role[0] + "\""
+        while True:
+            chunk = f.read(1 << 20)
+
+            if chunk == "":
+                break
+
+            digest.update(chunk)
+
+        f.close()
+
+    return digest.hexdigest()
+
+def convert_export(task):
+    """Converts all packages of a single export of a batch, writing the
+    messages of the conversion to the log file of the export
+
+    Yields the export, the time taken, and the error that stopped the
+    conversion, if any
+    """
+
+    (export, output, log, cache, deterministic, blocks) = task
+    start = time()
+    error = None
+
+    # The log replaces the standard error of the process, so that it also
+    # receives the messages of the parser and of the RTF decoders
+    stderr.flush()
+    saved    = dup(2)
+    log_file = open(log, 'w')
+    dup2(log_file.fileno(), 2)
+
+    source = None
+
+    try:
+        try:
+            source = open_export(export)
+            stderr.write("Parsing input\n")
+            odl_data = OdlParseFile(source, cache = cache, blocks = blocks)
+
+            if odl_data == None:
+                raise Exception("Input could not be parsed")
+
+            stderr.write("Finding relevant data\n")
+            out = XmiOutput(output)
+
+            try:
+                generate_package(odl_data, [], source, cache, 1, out, \
+                                     deterministic)
+            except:
+                out.discard()
+                raise
+
+            out.close()
+        except Exception:
+            print_exc()
+            error = format_exc().strip().split("\n")[-1]
+    finally:
+        if isinstance(source, ZipFile):
+            source.close()
+
+        stderr.flush()
+        dup2(saved, 2)
+        close(saved)
+        log_file.close()
+
+    return (export, time() - start, error)
+
+def run_batch(path, directory, cache, jobs, deterministic = False, \
+                  blocks = False):
+    """Converts all exports in a directory or manifest, each to an XMI file
+    and a log file in the given directory, using the given number of worker
+    processes, and prints a summary
+
+    Exports with an output newer than the export itself are skipped, so
+    that an interrupted batch can be resumed. The largest exports are
+    converted first, so that they do not hold up the end of the batch.
+    Returns the number of exports that could not be converted
+    """
+
+    exports = find_exports(path)
+    names   = {}
+    tasks   = []
+    results = {}
+
+    for export in exports:
+        name = splitext(basename(export.rstrip("/")))[0]
+
+        if name in names:
+            raise Exception("Exports " + names[name] + " and " + export \
+                                + " have the same name")
 
-        if data.name[0] != "" and data.name[1] != "":
-            print string + "/>"
+        names[name] = export
+        output = join(directory, name + ".xmi")
+        log    = join(directory, name + ".log")
+
+        if exists(output) and getmtime(output) >= export_time(export):
+            results[export] = (None, None)
         else:
-            print string + ">"
+            tasks.append((export_size(export), \
+                              (export, output, log, cache, deterministic, \
+                                   blocks)))
+
+    if not isdir(directory):
+        makedirs(directory)
+
+    tasks.sort(reverse = True)
+    tasks = [task for (_, task) in tasks]
+    start = time()
+    done  = 0
+
+    def report(result):
+        (export, seconds, error) = result
+        results[export] = (seconds, error)
 
-        PrintOwnedEnds(data, ident)
+        if error == None:
+            stderr.write("[%d/%d] Converted %s in %.1f s\n" \
+                             % (done, len(tasks), export, seconds))
+        else:
+            stderr.write("[%d/%d] Failed %s: %s\n" \
+                             % (done, len(tasks), export, error))
 
-        if data.name[0] == "" or data.name[1] == "":
-            print "  </packagedElement>"
+    if jobs > 1 and len(tasks) > 1:
+        from multiprocessing import Pool
 
-def PrintSignals():
-    for signal in signals:
-        print "  <packagedElement xmi:type=\"uml:Signal\" " \
-            + "xmi:id=\"_" + signals[signal][1] + "\" " \
-            + "name=\"" + escape(signals[signal][0], True) + "\"/>"
+        pool = Pool(min(jobs, len(tasks)))
 
-def PrintSignalEvents():
-    count = 0
+        try:
+            for result in pool.imap_unordered(convert_export, tasks, 1):
+                done += 1
+                report(result)
+        finally:
+            pool.terminate()
+    else:
+        for task in tasks:
+            result = convert_export(task)
+            done += 1
+            report(result)
 
-    for signal in signals:
-        print "  <packagedElement xmi:type=\"uml:SignalEvent\" " \
-            + "xmi:id=\"_" + signal + "\" " \
-            + "name=\"SignalEvent_" + str(count) + "\" " \
-            + "signal=\"_" + signals[signal][1] + "\"/>"
-        count += 1
+    failed = 0
 
-def PrintTimeEvents():
-    count = 0
+    for export in exports:
+        (seconds, error) = results[export]
 
-    for transition in transitions:
-        if transition.event[:5] != "Time/":
-            continue
+        if seconds == None:
+            print "%9s  %-10s %s" % ("", "up to date", export)
+        elif error == None:
+            print "%7.1f s  %-10s %s" % (seconds, "converted", export)
+        else:
+            print "%7.1f s  %-10s %s: %s" % (seconds, "failed", export, error)
+            failed += 1
+
+    print "%d exports: %d converted, %d up to date, %d failed in %.1f s" \
+        % (len(exports), len(tasks) - failed, len(exports) - len(tasks), \
+               failed, time() - start)
+
+    return failed
+
+def export_signature(export):
+    """Returns the sizes and modification times of the files of an export,
+    which change whenever the export is written, or None if the export does
+    not exist
+    """
+
+    try:
+        if not isdir(export):
+            info = stat(export)
+            return [("", info.st_size, info.st_mtime)]
+
+        signature = []
+
+        for (directory, _, files) in walk(export):
+            for name in files:
+                info = stat(join(directory, name))
+                signature.append((join(directory, name)[len(export):], \
+                                      info.st_size, info.st_mtime))
+
+        signature.sort()
+        return signature
+    except OSError:
+        return None
+
+def watch_export(export, package, cache, file_name, settle, interval = 0.5):
+    """Converts an export, or one of its packages, to the given file like
+    generate_incremental whenever the export changes, once it did not change
+    for the given number of seconds, so that a burst of writes leads to a
+    single conversion
+
+    The parsed model is kept between conversions, and when the odl
+    description changed only the changed blocks are parsed again; together
+    with the XMI of the unchanged classes, which is copied from the previous
+    conversion, this limits every conversion to what the change affects
+    """
+
+    seen      = None # Signature of the export at the previous poll
+    since     = time()
+    converted = None # Signature of the export when last converted
+    contents  = None # Digest of the odl description of the model
+    odl_data  = None
+
+    stderr.write("Watching " + export + "\n")
+
+    while True:
+        signature = export_signature(export)
+
+        if signature != seen:
+            seen  = signature
+            since = time()
+        elif signature != None and signature != converted \
+                and time() - since >= settle:
+            start = time()
+
+            try:
+                source = open_export(export)
+
+                try:
+                    digest = OdlHashFile(source)
+
+                    if digest != contents:
+                        stderr.write("Parsing " + export + "\n")
+                        odl_data = OdlParseFile(source, cache = cache, \
+                                                    blocks = True)
+                        contents = digest
+
+                        if odl_data == None:
+                            raise Exception("Input could not be parsed")
+
+                    generate_incremental(odl_data, package, source, cache, \
+                                             file_name, file_name)
+                finally:
+                    if isinstance(source, ZipFile):
+                        source.close()
+
+                stderr.write("Converted %s to %s in %.1f s\n" \
+                                 % (export, file_name, time() - start))
+            except Exception:
+                print_exc()
+                stderr.write("Error: " + export + " could not be converted; " \
+                                 + "waiting for the next change\n")
+
+            converted = signature
+
+        sleep(interval)
+
+class ServedExport(object):
+    """Export kept in memory by a ConversionService: its parsed model, the
+    list of its packages once requested, and the XMI generated for it so
+    far, with the time each was last used
+    """
+
+    def __init__(self, odl_data):
+        self.odl_data = odl_data
+        self.packages = None
+        self.outputs  = {}
+        self.used     = 0
+
+class ConversionService(object):
+    """Lists and converts exports on request, as in the serve mode; the
+    parsed models of the most recently used exports are kept in memory,
+    identified by the digest of the complete export, together with the most
+    recently used XMI generated for them, up to a total size
+
+    The digest of an export is only computed when the sizes and
+    modification times of its files changed since it was last requested,
+    so that a repeated request for an unchanged export does not read it.
+
+    Requests may come from several threads at once; different exports are
+    parsed at the same time, but an export requested by several threads at
+    once is parsed only once
+    """
+
+    def __init__(self, cache, max_exports, deterministic = False, \
+                     blocks = False, max_output_size = 64 << 20):
+        self.cache           = cache
+        self.max_exports     = max_exports
+        self.max_output_size = max_output_size
+        self.deterministic   = deterministic
+        self.blocks          = blocks
+        self.exports         = {}
+        self.signatures      = {}     # Signature and digest of every path
+        self.output_size     = 0
+        self.clock           = 0
+        self.lock            = Lock() # Guards the exports, the outputs,
+                                      # the parse locks, and the counters
+        self.parse_locks     = {}     # Locks of the exports being parsed
+        self.requests          = 0
+        self.exports_requested = 0
+        self.export_hits       = 0
+        self.outputs_requested = 0
+        self.output_hits       = 0
+
+    def Lookup(self, digest):
+        """Returns the export with the given digest if it is kept in memory,
+        marking it as recently used
+        """
+
+        self.lock.acquire()
+
+        try:
+            served = self.exports.get(digest)
+
+            if served != None:
+                self.clock += 1
+                served.used = self.clock
+
+            return served
+        finally:
+            self.lock.release()
+
+    def Digest(self, export):
+        """Returns the digest of an export, computing it only when the
+        signature of the export changed since it was last computed
+        """
+
+        path      = abspath(export)
+        signature = export_signature(export)
+
+        self.lock.acquire()
+        known = self.signatures.get(path)
+        self.lock.release()
+
+        if signature != None and known != None and known[0] == signature:
+            return known[1]
+
+        digest = export_digest(export)
+
+        if signature != None:
+            self.lock.acquire()
+            self.signatures[path] = (signature, digest)
+            self.lock.release()
+
+        return digest
+
+    def Export(self, export):
+        """Returns the in-memory data of an export, parsing the export if it
+        is not kept in memory
+        """
+
+        digest = self.Digest(export)
+        served = self.Lookup(digest)
+
+        self.lock.acquire()
+        self.exports_requested += 1
+
+        if served != None:
+            self.export_hits += 1
+
+        self.lock.release()
+
+        if served != None:
+            return served
+
+        self.lock.acquire()
+        parse_lock = self.parse_locks.setdefault(digest, Lock())
+        self.lock.release()
+
+        parse_lock.acquire()
+
+        try:
+            served = self.Lookup(digest) # Parsed while waiting for the lock
+
+            if served == None:
+                stderr.write("Parsing " + export + "\n")
+                source = open_export(export)
+
+                try:
+                    odl_data = OdlParseFile(source, cache = self.cache, \
+                                                blocks = self.blocks)
+                finally:
+                    if isinstance(source, ZipFile):
+                        source.close()
+
+                if odl_data == None:
+                    raise Exception("Input could not be parsed")
+
+                ExtractModelData(odl_data)
+                served = ServedExport(odl_data)
+                self.Store(digest, served)
+        finally:
+            self.lock.acquire()
+            self.parse_locks.pop(digest, None)
+            self.lock.release()
+            parse_lock.release()
 
-        when_id = str(uuid4())
+        return served
 
-        print "  <packagedElement xmi:type=\"uml:TimeEvent\" " \
-            + "xmi:id=\"_" + times[transition.ident] + "\" " \
-            + "name=\"TimeEvent_" + str(count) + "\">"
+    def Store(self, digest, served):
+        """Keeps an export in memory, removing the least recently used
+        exports, with their XMI, when too many are kept
+        """
 
-        print "    <when xmi:id=\"_" + when_id + "\">"
+        self.lock.acquire()
 
-        print "      <expr xmi:type=\"uml:LiteralString\" " \
-            + "xmi:id=\"_" + when_id +"\" " \
-            + "value=\"after( " + escape(transition.event[5:], True) + " )\"/>"
+        try:
+            self.clock += 1
+            served.used = self.clock
+            self.exports[digest] = served
 
-        print "    </when>"
+            while len(self.exports) > self.max_exports:
+                oldest = min([(self.exports[key].used, key) \
+                                  for key in self.exports])[1]
 
-        print "  </packagedElement>"
+                for (output, _) in self.exports[oldest].outputs.values():
+                    self.output_size -= len(output)
 
-        count += 1
+                del self.exports[oldest]
 
-def PrintChangeEvents():
-    count = 1
+                for path in self.signatures.keys():
+                    if self.signatures[path][1] == oldest:
+                        del self.signatures[path]
+        finally:
+            self.lock.release()
 
-    for transition in transitions:
-        if transition.event[:7] != "Change/":
-            continue
+    def StoreOutput(self, served, key, output):
+        """Keeps the XMI generated for an export in memory, removing the
+        least recently used XMI of all exports when the total size of the
+        XMI kept grows beyond the maximum
+        """
 
-        print "  <packagedElement xmi:type=\"uml:ChangeEvent\" " \
-            + "xmi:id=\"_" + changes[transition.ident] + "\" " \
-            + "name=\"ChangeEvent_" + str(count) + "\">"
+        if len(output) > self.max_output_size:
+            return
 
-        print "    <changeExpression xmi:type=\"uml:LiteralString\" " \
-            + "xmi:id=\"_" + str(uuid4()) + "\" " \
-            + "value=\"" + escape(transition.event[7:], True) + "\"/>"
+        self.lock.acquire()
 
-        print "  </packagedElement>"
+        try:
+            # The export may have been removed from memory, or the XMI
+            # been generated by another thread, in the meantime
+            if served not in self.exports.values() or key in served.outputs:
+                return
 
-        count += 1
+            self.clock += 1
+            served.outputs[key] = (output, self.clock)
+            self.output_size   += len(output)
 
-def PrintEnumTypes():
-    for ident in enum_types:
-        print "  <packagedElement xmi:type=\"uml:Enumeration\" " \
-            + "xmi:id=\"_" + ident + "\" " \
-            + "name=\"" + escape(enum_types[ident].name, True) + "\">"
-
-        for literal in enum_types[ident].literals:
-            print "    <ownedLiteral xmi:id=\"_" + literal.ident + "\" " \
-                + "name=\"" + escape(literal.name, True) + "\"/>"
-
-        print "  </packagedElement>"
-
-def PrintBasicTypes():
-    for ident in basic_types:
-        print "  <packagedElement xmi:type=\"uml:PrimitiveType\" " \
-            + "xmi:id=\"_" + ident + "\" name=\"" \
-            + escape(basic_types[ident], True) + "\"/>"
-
-def PrintFooter():
-    print "  <packagedElement xmi:type=\"uml:PrimitiveType\" " \
-        + "xmi:id=\"_cD-CwF6WEd-1BtN3LP_f7A\" name=\"UndefinedType\"/>"
-    print "</uml:Model>"
-
-def generate(odl_data, used_classes, used_events, directory):
-    global classes, super_classes, attributes, associations, parameters, \
-        states, transitions, basic_types, enum_types
-
-    classes       = GetClasses(odl_data, used_classes)
-    super_classes = GetSuperClasses(odl_data, classes)
-    attributes    = GetAttributes(odl_data, classes, directory)
-    associations  = GetAssociations(odl_data, classes)
-    parameters    = GetParameters(odl_data)
-    states        = GetStates(odl_data, classes)
-    transitions   = GetTransitions(odl_data, directory, states)
-    basic_types   = GetBasicTypes(odl_data)
-    enum_types    = GetEnumeratedTypes(odl_data)
-    GetAliasTypes(odl_data)
-    GetSequenceTypes(odl_data)
-    GetArrayTypes(odl_data)
-
-    stderr.write("Writing output\n")
-    GatherSignals(odl_data, used_events)
-    GatherTimesAndChanges()
-
-    PrintHeader(odl_data)
-    PrintClasses()
-    PrintAssociations()
-    PrintSignals()
-    PrintSignalEvents()
-    PrintTimeEvents()
-    PrintChangeEvents()
-    PrintEnumTypes()
-    PrintBasicTypes()
-    PrintFooter()
-    stderr.write("Done!\n")
-
-def print_packages(packages, name):
+            while self.output_size > self.max_output_size:
+                (_, digest, oldest) = \
+                    min([(used, digest, other_key) \
+                             for (digest, other) in self.exports.items() \
+                             for (other_key, (_, used)) \
+                             in other.outputs.items()])
+                output = self.exports[digest].outputs.pop(oldest)[0]
+                self.output_size -= len(output)
+        finally:
+            self.lock.release()
+
+    def List(self, export):
+        """Returns the packages of an export, as printed by the list mode
+        """
+
+        served = self.Export(export)
+
+        if served.packages == None:
+            out = StringIO()
+            print_packages(out, GetPackageHierarchy(served.odl_data), "")
+            served.packages = out.getvalue()
+
+        return served.packages
+
+    def Generate(self, export, package = None, deterministic = None):
+        """Returns the XMI of an export, or of the given package of it
+        """
+
+        if deterministic == None:
+            deterministic = self.deterministic
+
+        served = self.Export(export)
+        key    = (package, deterministic)
+
+        self.lock.acquire()
+
+        try:
+            self.outputs_requested += 1
+            output = served.outputs.get(key)
+
+            if output != None:
+                self.output_hits += 1
+                self.clock += 1
+                output = output[0]
+                served.outputs[key] = (output, self.clock)
+        finally:
+            self.lock.release()
+
+        if output != None:
+            return output
+
+        if package != None:
+            package = [package]
+        else:
+            package = []
+
+        buffer = StringIO()
+        out    = XmiOutput(stream = buffer)
+        source = open_export(export)
+
+        try:
+            generate_package(served.odl_data, package, source, self.cache, \
+                                 1, out, deterministic)
+        finally:
+            if isinstance(source, ZipFile):
+                source.close()
+
+        out.close()
+
+        output = buffer.getvalue()
+        self.StoreOutput(served, key, output)
+        return output
+
+    def Report(self, request, export, status, duration):
+        """Reports a request, with its latency and the hit rates so far
+        """
+
+        self.lock.acquire()
+
+        try:
+            self.requests += 1
+            stderr.write("Request %d: %s: %d in %.3f s " \
+                             % (self.requests, \
+                                    (request + " " + export).strip(), \
+                                    status, duration) \
+                             + "(" + self.HitRates() + ")\n")
+        finally:
+            self.lock.release()
+
+    def HitRates(self):
+        exports = self.export_hits * 100 / max(self.exports_requested, 1)
+        outputs = self.output_hits * 100 / max(self.outputs_requested, 1)
+        return "exports %d%% in memory, XMI %d%% in memory" \
+            % (exports, outputs)
+
+    def Stats(self):
+        """Returns a description of the requests served so far
+        """
+
+        self.lock.acquire()
+
+        try:
+            return "Requests: " + str(self.requests) + "\n" \
+                + "Exports in memory: " + str(len(self.exports)) + "\n" \
+                + "XMI in memory: " + str(self.output_size) + " bytes\n" \
+                + "Hit rates: " + self.HitRates() + "\n"
+        finally:
+            self.lock.release()
+
+def print_packages(out, packages, name):
     for package in packages:
-        print name + package.name
+        print >> out, name + package.name
 
         new_name = name[:] + package.name + "/"
-        print_packages(package.children, new_name)
+        print_packages(out, package.children, new_name)
+
+def report_time(name, start):
+    stderr.write("%-10s %7.3f s\n" % (name + ":", time() - start))
+    return time()
+
+# Library interface, for converting exports from other Python programs
+
+class ConversionResult(object):
+    """Outcome of convert, convert_stages, or list_packages: the generated
+    XMI, unless it was written to a file or stream, or the names of the
+    packages; the seconds taken by each stage and in total; and the
+    messages written meanwhile, of which the warnings are also given
+    separately
+    """
+
+    def __init__(self):
+        self.xmi      = None
+        self.packages = None
+        self.timings  = {}
+        self.messages = []
+        self.warnings = []
+
+    def Collect(self, collected):
+        self.messages = "".join(collected).splitlines()
+        self.warnings = [message[len("Warning: "):] \
+                             for message in self.messages \
+                             if message.startswith("Warning: ")]
+
+def open_source(source):
+    """Opens an export given as a path, a ZipFile, or the contents of a zip
+    file
+    """
 
-def usage():
-    stderr.write("Usage: " + argv[0] + \
-                     " <generate|list> <input> " + "[package]\n")
-    exit(1)
+    if isinstance(source, ZipFile):
+        return source
+    elif isinstance(source, str) and source.startswith("PK\x03\x04"):
+        return ZipFile(StringIO(source))
+    else:
+        return open_export(source)
+
+def close_source(source, export):
+    """Closes an export opened by open_source, unless it was given open
+    """
+
+    if export is not source and isinstance(export, ZipFile):
+        export.close()
+
+def parse_source(source, cache, result):
+    """Parses an export for convert or list_packages
+    """
+
+    start    = time()
+    odl_data = OdlParseFile(source, cache = cache)
+
+    if odl_data == None:
+        raise Exception("Input could not be parsed")
+
+    result.timings["parse"] = time() - start
+    return odl_data
+
+def convert(source, package = None, out = None, deterministic = False, \
+                cache = None):
+    """Converts an export, or the given package of it, to XMI, and returns a
+    ConversionResult; the export is given as for open_source
+
+    The XMI is written to out if it is a file name, as with the option -o,
+    or a stream, and otherwise kept in the result. A cache, such as an
+    OdlCache, avoids parsing the same export and decoding the same RTF texts
+    again in later conversions
+    """
+
+    result    = ConversionResult()
+    collected = stderr.StartCollecting()
+    start     = time()
+    export    = None
+
+    try:
+        export   = open_source(source)
+        odl_data = parse_source(export, cache, result)
+        phase    = time()
+
+        if isinstance(out, str):
+            output = XmiOutput(out)
+        elif out != None:
+            output = XmiOutput(stream = out)
+        else:
+            buffer = StringIO()
+            output = XmiOutput(stream = buffer)
+
+        if package != None:
+            package = [package]
+        else:
+            package = []
+
+        try:
+            generate_package(odl_data, package, export, cache, 1, output, \
+                                 deterministic)
+        except:
+            output.discard()
+            raise
+
+        output.close()
+
+        if out == None:
+            result.xmi = buffer.getvalue()
+
+        result.timings["generate"] = time() - phase
+        result.timings["total"]    = time() - start
+    finally:
+        stderr.StopCollecting()
+        result.Collect(collected)
+        close_source(source, export)
+
+    return result
+
+def list_packages(source, cache = None):
+    """Lists the packages of an export, given as for open_source, and
+    returns a ConversionResult with the names of the packages, as printed
+    by the list mode
+    """
+
+    result    = ConversionResult()
+    collected = stderr.StartCollecting()
+    start     = time()
+    export    = None
+
+    try:
+        export   = open_source(source)
+        odl_data = parse_source(export, cache, result)
+        phase    = time()
+        buffer   = StringIO()
+        print_packages(buffer, GetPackageHierarchy(odl_data), "")
+
+        result.packages = buffer.getvalue().splitlines()
+        result.timings["list"]  = time() - phase
+        result.timings["total"] = time() - start
+    finally:
+        stderr.StopCollecting()
+        result.Collect(collected)
+        close_source(source, export)
+
+    return result
+
+def convert_stages(source, deterministic = False):
+    """Converts an export, given as for open_source, as a whole like
+    convert, but times the stages of the conversion separately; returns a
+    ConversionResult with the XMI and the seconds taken to parse the export,
+    to extract the data of the model, to decode the RTF texts, and to write
+    the XMI
+    """
+
+    result    = ConversionResult()
+    collected = stderr.StartCollecting()
+    start     = time()
+    export    = None
+
+    try:
+        export   = open_source(source)
+        odl_data = parse_source(export, None, result)
+        phase    = time()
+
+        ExtractModelData(odl_data)
+        classes = GetClasses(odl_data, None)
+        states  = GetStates(odl_data, classes)
+        result.timings["extract"] = time() - phase
+        phase = time()
+
+        # Decoded now, so that the extraction below finds the texts decoded
+        decoder = RtfDecoder(export)
+
+        for rtf in GetRtfTexts(odl_data, classes, states):
+            decoder.Decode(rtf)
+
+        result.timings["rtf"] = time() - phase
+        phase = time()
+
+        buffer    = StringIO()
+        output    = XmiOutput(stream = buffer)
+        converter = Converter(odl_data, decoder, output, deterministic)
+        converter.Extract(None)
+        result.timings["extract"] += time() - phase
+        phase = time()
+
+        converter.Write(None)
+        output.close()
+
+        result.xmi = buffer.getvalue()
+        result.timings["emit"]  = time() - phase
+        result.timings["total"] = time() - start
+    finally:
+        stderr.StopCollecting()
+        result.Collect(collected)
+        close_source(source, export)
+
+    return result
 
 def main():
-    if len(argv) < 3 \
-            or len(argv) > 4 \
-            or (argv[1] == "list" and len(argv) != 3) \
-            or (argv[1] != "list" and argv[1] != "generate"):
-        usage()
+    parser = OptionParser(usage = "%prog <generate|list|batch|serve|" \
+                              + "watch|benchmark|synthetic|" \
+                              + "benchmark-lexer|benchmark-rtf|" \
+                              + "check-rtf> <input> [package...]")
+    parser.add_option("-t", "--timings", action = "store_true", \
+                          default = False, \
+                          help = "report the time taken to start up, " \
+                          + "to parse the input, and to list or generate")
+    parser.add_option("-o", "--output", metavar = "FILE", \
+                          help = "write the output to FILE instead of to " \
+                          + "standard output; FILE is compressed with gzip " \
+                          + "if it ends in .gz, and becomes a zip archive " \
+                          + "if it ends in .zip; when generating several " \
+                          + "packages or a batch, FILE is the directory " \
+                          + "to write an XMI file for each package or " \
+                          + "export to")
+    parser.add_option("-c", "--cache", metavar = "DIR", \
+                          help = "keep parsed models in the cache " \
+                          + "directory DIR, to avoid parsing the same " \
+                          + "input again")
+    parser.add_option("--cache-size", metavar = "MB", type = "int", \
+                          default = 256, \
+                          help = "remove the least recently used entries " \
+                          + "once the cache grows beyond MB megabytes " \
+                          + "[default: %default]")
+    parser.add_option("-j", "--jobs", metavar = "N", type = "int", \
+                          default = 1, \
+                          help = "decode RTF texts, or convert packages " \
+                          + "when generating several, or exports in a " \
+                          + "batch, in N processes, or serve requests in " \
+                          + "N threads [default: %default]")
+    parser.add_option("-d", "--deterministic", action = "store_true", \
+                          default = False, \
+                          help = "derive the identifiers of generated " \
+                          + "elements from the model and write elements " \
+                          + "in a fixed order, so that converting the same " \
+                          + "input twice yields the same output")
+    parser.add_option("-i", "--incremental", metavar = "PREVIOUS", \
+                          help = "copy the XMI of the classes that did not " \
+                          + "change from PREVIOUS, the output of an " \
+                          + "earlier conversion with this option (which " \
+                          + "may be the output file itself), and write a " \
+                          + "manifest next to the output; implies -d")
+    parser.add_option("--incremental-parse", action = "store_true", \
+                          default = False, \
+                          help = "keep the parsed blocks of the input in " \
+                          + "the cache, and only parse the blocks that " \
+                          + "changed since the same input was last parsed; " \
+                          + "needs -c")
+    parser.add_option("--models", metavar = "N", type = "int", \
+                          default = 4, \
+                          help = "when serving, keep the models of the N " \
+                          + "most recently used exports in memory " \
+                          + "[default: %default]")
+    parser.add_option("--outputs", metavar = "MB", type = "int", \
+                          default = 64, \
+                          help = "when serving, keep at most MB megabytes " \
+                          + "of generated XMI in memory [default: %default]")
+    parser.add_option("--settle", metavar = "SECONDS", type = "float", \
+                          default = 2, \
+                          help = "when watching, convert the input once it " \
+                          + "did not change for SECONDS seconds " \
+                          + "[default: %default]")
+    parser.add_option("--shape", metavar = "SETTINGS", \
+                          help = "generate synthetic exports of the shape " \
+                          + "given by SETTINGS, a comma-separated list " \
+                          + "such as classes=100,depth=3 of the packages, " \
+                          + "classes, attributes, associations, events, " \
+                          + "states, depth, regions, guards, and text_size " \
+                          + "of the export")
+    parser.add_option("--scales", metavar = "LIST", default = "1,2,4,8", \
+                          help = "when benchmarking, convert synthetic " \
+                          + "exports of the comma-separated scales in " \
+                          + "LIST [default: %default]")
+    parser.add_option("--repeat", metavar = "N", type = "int", \
+                          default = 3, \
+                          help = "when benchmarking, convert every export " \
+                          + "N times and report the fastest time of each " \
+                          + "stage [default: %default]")
+    parser.add_option("--reference", metavar = "REVISION", \
+                          help = "when benchmarking, store missing golden " \
+                          + "references as converted by REVISION, a git " \
+                          + "revision of the tool known to be good")
+    parser.add_option("--all-top-level", action = "store_true", \
+                          default = False, \
+                          help = "generate every package that is not part " \
+                          + "of another package")
+    (options, args) = parser.parse_args()
+
+    # Modes that do not take a package
+    modes = ["list", "batch", "serve", "benchmark", "synthetic", \
+                 "benchmark-lexer", "benchmark-rtf", "check-rtf"]
+
+    if len(args) < 2 \
+            or (args[0] in modes and len(args) != 2) \
+            or (args[0] not in modes \
+                    and args[0] not in ["generate", "watch"]) \
+            or (options.all_top_level \
+                    and (args[0] != "generate" or len(args) != 2)):
+        parser.print_usage(stderr)
+        exit(1)
+
+    several = options.all_top_level or len(args) > 3
+
+    if several and options.output == None:
+        parser.error("an output directory is needed to generate several " \
+                         + "packages")
+
+    if options.incremental != None \
+            and (args[0] != "generate" or several or options.output == None):
+        parser.error("an incremental conversion needs an output file and " \
+                         + "at most one package")
+
+    if options.incremental_parse and options.cache == None:
+        parser.error("an incremental parse needs a cache directory")
+
+    if args[0] == "batch" and options.output == None:
+        parser.error("an output directory is needed for a batch")
+
+    if args[0] == "watch" and (len(args) > 3 or options.output == None):
+        parser.error("watching needs an output file and at most one package")
+
+    if args[0] == "synthetic" and options.output == None:
+        parser.error("a synthetic export needs an output file")
+
+    if args[0] in ["benchmark", "synthetic"]:
+        from odl.odl_synthetic import OdlShape, OdlParseShape
+
+        try:
+            if options.shape != None:
+                shape = OdlParseShape(options.shape)
+            else:
+                shape = OdlShape()
+
+            scales = [int(scale) for scale in options.scales.split(",")]
+
+            if args[0] == "synthetic":
+                scales = [int(args[1])]
+
+            if min(scales) < 1:
+                raise ValueError("invalid scale " + str(min(scales)))
+        except ValueError, error:
+            parser.error(str(error))
+
+    if args[0] == "check-rtf" and isdir(args[1]) \
+            and not exists(join(args[1], "Contents.odl")):
+        # A directory of RTF samples rather than an export
+        if CheckRtfSamples(GetRtfSamples(args[1])) != 0:
+            exit(1)
 
-    file_name = argv[2]
+        return
+
+    if options.cache != None:
+        cache = OdlCache(options.cache, options.cache_size << 20)
+    elif args[0] == "watch":
+        # Keeps the parsed blocks and decoded RTF texts between conversions
+        cache = OdlMemoryCache(options.cache_size << 20)
+    else:
+        cache = None
+
+    if args[0] == "watch":
+        try:
+            watch_export(args[1], args[2:], cache, options.output, \
+                             options.settle)
+        except KeyboardInterrupt:
+            pass
+
+        return
+
+    if args[0] == "serve":
+        from xmi_serve import serve
+
+        # Build the parser, and load pyth, before the first request
+        OdlParser()
+
+        try:
+            import pyth.plugins.rtf15.reader
+        except ImportError:
+            pass
+
+        serve(args[1], ConversionService(cache, options.models, \
+                                             options.deterministic, \
+                                             options.incremental_parse, \
+                                             options.outputs << 20), \
+                  options.jobs)
+        return
+
+    if args[0] == "synthetic":
+        from odl.odl_synthetic import OdlSyntheticExport
+
+        OdlSyntheticExport(shape.Scaled(scales[0])).Write(options.output)
+        return
+
+    if args[0] == "benchmark":
+        from xmi_bench import run_benchmarks
+
+        if run_benchmarks(convert_stages, args[1], scales, options.repeat, \
+                              shape, options.reference) != []:
+            exit(1)
+
+        return
+
+    if args[0] == "batch":
+        if run_batch(args[1], options.output, cache, options.jobs, \
+                         options.deterministic, \
+                         options.incremental_parse) != 0:
+            exit(1)
+
+        return
+
+    file_name = args[1]
 
     if is_zipfile(file_name):
         source = ZipFile(file_name)
     else:
         source = file_name
 
+    if args[0] == "benchmark-lexer":
+        OdlBenchmarkLexers(source)
+        return
+
+    if options.timings:
+        # Build the parser now, so that its construction is counted as
+        # part of the startup time
+        OdlParser()
+        phase_start = report_time("Startup", start_time)
+
     stderr.write("Parsing input\n")
-    odl_data = OdlParseFile(source)
+    odl_data = OdlParseFile(source, cache = cache, \
+                                blocks = options.incremental_parse)
+
+    if options.timings:
+        phase_start = report_time("Parsing", phase_start)
 
     stderr.write("Finding relevant data\n")
 
-    if argv[1] == "list":
-        packages = GetPackageHierarchy(odl_data)
-        print_packages(packages, "")
-    elif argv[1] == "generate":
-        if len(argv) == 4:
-            used_classes = FindPackageClasses(argv[3], odl_data)
-            used_events  = FindPackageEvents(argv[3], odl_data)
-            stderr.write("Using package " + argv[3] + "\n")
+    if args[0] == "generate" and several:
+        if options.all_top_level:
+            packages = [package.name for package \
+                            in GetPackageHierarchy(odl_data)]
+            packages.sort()
         else:
-            used_classes = None
-            used_events  = None
-
-        generate(odl_data, used_classes, used_events, source)
+            packages = args[2:]
+
+        failed = generate_packages(odl_data, packages, source, file_name, \
+                                       cache, options.jobs, options.output, \
+                                       options.deterministic)
+
+        if failed != []:
+            stderr.write("Error: packages " + ", ".join(failed) \
+                             + " could not be generated\n")
+            exit(1)
+    elif args[0] == "generate" and options.incremental != None:
+        generate_incremental(odl_data, args[2:], source, cache, \
+                                 options.output, options.incremental)
+    elif args[0] == "list" or args[0] == "generate":
+        out = XmiOutput(options.output)
+
+        try:
+            if args[0] == "list":
+                packages = GetPackageHierarchy(odl_data)
+                print_packages(out, packages, "")
+            else:
+                generate_package(odl_data, args[2:], source, cache, \
+                                     options.jobs, out, options.deterministic)
+        except:
+            out.discard()
+            raise
+
+        out.close()
+    elif args[0] == "benchmark-rtf":
+        BenchmarkRtfDecoding(GetRtfCorpus(odl_data, source))
+    elif args[0] == "check-rtf":
+        (_, _, different) = CheckRtfDecoding(GetRtfCorpus(odl_data, source))
+
+        if different != 0:
+            exit(1)
 
     if isinstance(source, ZipFile):
         source.close()
 
-main()
+    if options.timings:
+        report_time(args[0].capitalize(), phase_start)
+        report_time("Total", start_time)
+
+if __name__ == "__main__":
+    main()